@@ -0,0 +1,352 @@
+"""
+Stable-Baselines3 callbacks used by the training scripts.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import zipfile
+
+import numpy as np
+import stable_baselines3 as sb3
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import data_to_json, recursive_getattr
+from stable_baselines3.common.utils import get_system_info
+
+from env_timings import collect_timings
+
+INDEX_FILE = "checkpoints.json"  # Written by AsyncCheckpointCallback next to the checkpoints it keeps
+REPLAY_FIELDS = ("observations", "next_observations", "actions", "rewards", "dones", "timeouts")
+
+logger = logging.getLogger(__name__)
+
+
+class EnvTimingCallback(BaseCallback):
+    """
+    Forward the environments' phase timings (see env_timings.py) to the model's logger, and so to TensorBoard.
+
+    Every log_freq calls it collects and clears the counters of all environments of the training env, which must
+    have been created with profile=True, and records for each phase the mean time per call in microseconds
+    ("env_timings/<phase>_us"), the number of calls and, for the phases inside step(), their share of the step time.
+    """
+
+    def __init__(self, log_freq=10000, verbose=0):
+        """
+        Parameters:
+        - log_freq (int): Number of env.step() calls (of the whole vectorized env) between two reports.
+        - verbose (int): Print the timings as well when > 0.
+        """
+        super().__init__(verbose)
+        self.log_freq = log_freq
+
+    def _on_training_start(self):
+        collect_timings(self.training_env, reset=True)  # Leave out setup and evaluation before training
+
+    def _on_step(self):
+        if self.n_calls % self.log_freq == 0:
+            self.record_timings()
+        return True
+
+    def record_timings(self):
+        """
+        Record the timings gathered since the last report and clear them.
+        """
+        timings = collect_timings(self.training_env, reset=True)
+        step_seconds = timings.get("step", {}).get("seconds", 0.0)
+        for phase, counts in timings.items():
+            if not counts["calls"]:
+                continue
+            self.logger.record(f"env_timings/{phase}_us", 1e6 * counts["seconds"] / counts["calls"])
+            self.logger.record(f"env_timings/{phase}_calls", counts["calls"])
+            if step_seconds and phase not in ("step", "reset"):
+                self.logger.record(f"env_timings/{phase}_share", counts["seconds"] / step_seconds)
+            if self.verbose > 0:
+                print(f"{phase:>16}: {counts['calls']:>10} calls, {1e6 * counts['seconds'] / counts['calls']:>9.2f} us")
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Save checkpoints without stalling training, keeping only the most recent ones and the best one.
+
+    Every save_freq calls the model's weights, optimizer state and other attributes are copied in memory, which
+    takes a few milliseconds, and a background thread writes them to "<name_prefix>_<steps>_steps.zip", which loads
+    with PPO.load()/DQN.load() like CheckpointCallback's files. Only the keep_last most recent checkpoints are kept.
+    With eval_episodes > 0 the writer thread also evaluates each snapshot against the heuristic players (see
+    evaluate.evaluate_policy), with a copy of the policy loaded with the snapshot's weights, and the one with the
+    best win rate so far is also kept as "<name_prefix>_best.zip". checkpoints.json in save_path lists the kept
+    checkpoints and their win rates; a new run starts a new index, and only a resumed one (resume=True) carries on
+    rotating the checkpoints it lists.
+
+    With save_replay_buffer, the replay buffer of an off-policy model (DQN) is kept in save_path/replay_buffer as one
+    .npy file per field, memory-mappable, and only the rows added since the previous save are copied and written
+    each time. load_replay_buffer() restores it.
+    """
+
+    def __init__(self, save_freq, save_path, name_prefix="ashtachamma_model", keep_last=5, eval_episodes=0,
+                 eval_kwargs=None, save_replay_buffer=False, max_pending=2, resume=False, verbose=0):
+        """
+        Parameters:
+        - save_freq (int): Number of env.step() calls (of the whole vectorized env) between two checkpoints.
+        - save_path (str): Directory receiving the checkpoints, created if needed.
+        - name_prefix (str): Start of the checkpoint file names.
+        - keep_last (int): Most recent checkpoints to keep; older ones are deleted (the best one is kept apart).
+        - eval_episodes (int): Episodes to evaluate each snapshot on; 0 doesn't evaluate.
+        - eval_kwargs (dict): Options of evaluate.evaluate_policy(), e.g. the environment options of training.
+        - save_replay_buffer (bool): Also save the replay buffer of an off-policy model.
+        - max_pending (int): Snapshots waiting to be written before a save waits for the writer thread, which
+          bounds the memory they take.
+        - resume (bool): Continue the checkpoints.json of the run being resumed, so that its checkpoints are rotated
+          and its best checkpoint is only replaced by a better one. Without it the index starts empty, and files of
+          an earlier run in save_path are left alone (those with the same names are overwritten).
+        - verbose (int): Log every checkpoint written when > 0.
+        """
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.eval_episodes = eval_episodes
+        self.eval_kwargs = dict(eval_kwargs or {})
+        self.save_replay_buffer = save_replay_buffer
+        self.max_pending = max_pending
+        self.resume = resume
+        self.checkpoints = []  # Kept checkpoints, oldest first, as {"path", "timesteps", "win_rate"} entries
+        self.best = None  # Entry of the best checkpoint
+        self._buffer_timesteps = None  # Timesteps when the replay buffer was last saved
+        self._buffer_pos = None  # And its position then
+        self._eval_policy = None  # Copy of the model's policy, loaded with each snapshot's weights to evaluate it
+        self._win_rates = queue.SimpleQueue()  # (timesteps, win rate) of the snapshots evaluated by the writer
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        index_path = os.path.join(self.save_path, INDEX_FILE)
+        if self.resume and not self.checkpoints and os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)  # Keep rotating the checkpoints of the resumed run
+            self.checkpoints, self.best = index["checkpoints"], index["best"]
+        if self.eval_episodes > 0 and self._eval_policy is None:
+            self._eval_policy = copy.deepcopy(self.model.policy)
+        if self._thread is None:
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._thread = threading.Thread(target=self._write_snapshots, name="AsyncCheckpoint", daemon=True)
+            self._thread.start()
+
+    def _on_step(self):
+        self._record_win_rates()
+        if self.n_calls % self.save_freq == 0:
+            self.save()
+        return True
+
+    def _on_training_end(self):
+        self.wait()
+        self._record_win_rates()
+
+    def _record_win_rates(self):
+        """
+        Log the win rates the writer thread found since the last call.
+        """
+        while not self._win_rates.empty():
+            _, win_rate = self._win_rates.get()
+            self.logger.record("eval/win_rate", win_rate)
+
+    def save(self):
+        """
+        Snapshot the model and queue it for writing (and evaluating, if configured).
+        """
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
+        timesteps = self.model.num_timesteps
+        snapshot = {"timesteps": timesteps, "model": _snapshot_model(self.model)}
+        if self.save_replay_buffer and getattr(self.model, "replay_buffer", None) is not None:
+            snapshot["replay_buffer"] = self._snapshot_replay_buffer()
+        self._queue.put(snapshot)  # Waits while max_pending snapshots are queued
+
+    def wait(self):
+        """
+        Block until every queued snapshot is written.
+        """
+        if self._queue is not None:
+            self._queue.join()
+        if self._error is not None:
+            raise RuntimeError("Writing a checkpoint failed") from self._error
+
+    def _snapshot_replay_buffer(self):
+        """
+        Copy the replay buffer rows added since the previous save.
+        """
+        buffer = self.model.replay_buffer
+        timesteps = self.model.num_timesteps
+        steps = None if self._buffer_timesteps is None else (timesteps - self._buffer_timesteps) // buffer.n_envs
+        if steps is None or steps + 1 >= buffer.buffer_size:
+            rows = np.arange(buffer.buffer_size if buffer.full else buffer.pos)  # First save, or the ring went round
+        else:
+            # Timesteps are counted before the step's transition is stored, so the rows added are found from pos
+            added = (buffer.pos - self._buffer_pos) % buffer.buffer_size
+            rows = (buffer.pos - added + np.arange(added)) % buffer.buffer_size  # The ring's most recent rows
+        self._buffer_timesteps, self._buffer_pos = timesteps, buffer.pos
+        arrays = {}
+        for field in REPLAY_FIELDS:
+            array = getattr(buffer, field, None)
+            if array is not None:
+                arrays[field] = (array.shape, array[rows])  # Fancy indexing copies the rows
+        return {"rows": rows, "arrays": arrays, "pos": int(buffer.pos), "full": bool(buffer.full),
+                "timesteps": timesteps}
+
+    def _write_snapshots(self):
+        """
+        Writer thread: write (and evaluate) queued snapshots, rotate old checkpoints and update checkpoints.json.
+        """
+        while True:
+            snapshot = self._queue.get()
+            try:
+                if self._error is None:
+                    self._write(snapshot)
+            except Exception as error:  # Reported by the next save() or wait() in the training thread
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshot):
+        path = os.path.join(self.save_path, f"{self.name_prefix}_{snapshot['timesteps']}_steps.zip")
+        _write_model(path, snapshot["model"])
+        entry = {"path": path, "timesteps": snapshot["timesteps"], "win_rate": None}
+        if self._eval_policy is not None:
+            entry["win_rate"] = self._evaluate(snapshot["model"][1]["policy"])
+            self._win_rates.put((snapshot["timesteps"], entry["win_rate"]))
+        self.checkpoints.append(entry)
+
+        if entry["win_rate"] is not None and (self.best is None or entry["win_rate"] > self.best["win_rate"]):
+            best_path = os.path.join(self.save_path, f"{self.name_prefix}_best.zip")
+            shutil.copyfile(path, best_path + ".tmp")
+            os.replace(best_path + ".tmp", best_path)
+            self.best = dict(entry, path=best_path, source=path)
+        while len(self.checkpoints) > self.keep_last:
+            old = self.checkpoints.pop(0)
+            if os.path.exists(old["path"]):
+                os.remove(old["path"])
+
+        if "replay_buffer" in snapshot:
+            _write_replay_rows(os.path.join(self.save_path, "replay_buffer"), snapshot["replay_buffer"])
+        index = {"checkpoints": self.checkpoints, "best": self.best}
+        with open(os.path.join(self.save_path, INDEX_FILE + ".tmp"), "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(os.path.join(self.save_path, INDEX_FILE + ".tmp"), os.path.join(self.save_path, INDEX_FILE))
+        if self.verbose > 0:
+            if entry["win_rate"] is None:
+                logger.info("Saved %s", path)
+            else:
+                logger.info("Saved %s (win rate %.3f)", path, entry["win_rate"])
+
+    def _evaluate(self, policy_state):
+        """
+        Win rate of the policy with some weights against the heuristic players.
+        """
+        from evaluate import evaluate_policy
+
+        self._eval_policy.load_state_dict(policy_state)
+        kwargs = dict(episodes=self.eval_episodes, num_envs=min(64, self.eval_episodes),
+                      min_episodes=self.eval_episodes, **self.eval_kwargs)
+        return evaluate_policy(self._eval_policy, **kwargs)["win_rate"]
+
+
+def _snapshot_model(model):
+    """
+    Copy what BaseAlgorithm.save() writes, so that it can be written later while training goes on.
+
+    Returns:
+    - (serialized attributes, state dicts, torch variables)
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dict_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dict_names + torch_variable_names:
+        exclude.add(name.split(".")[0])  # Saved with torch rather than as attributes
+    for name in exclude:
+        data.pop(name, None)
+    params = copy.deepcopy(model.get_parameters())  # Clones the tensors, which training keeps updating
+    variables = {name: copy.deepcopy(recursive_getattr(model, name)) for name in torch_variable_names}
+    return data_to_json(data), params, variables or None
+
+
+def _write_model(path, snapshot):
+    """
+    Write a model snapshot to a zip file laid out like stable_baselines3.common.save_util.save_to_zip_file().
+    """
+    serialized_data, params, variables = snapshot
+    with zipfile.ZipFile(path + ".tmp", mode="w") as archive:
+        archive.writestr("data", serialized_data)
+        if variables is not None:
+            with archive.open("pytorch_variables.pth", mode="w", force_zip64=True) as f:
+                torch.save(variables, f)
+        for name, state in params.items():
+            with archive.open(name + ".pth", mode="w", force_zip64=True) as f:
+                torch.save(state, f)
+        archive.writestr("_stable_baselines3_version", sb3.__version__)
+        archive.writestr("system_info.txt", get_system_info(print_info=False)[1])
+    os.replace(path + ".tmp", path)
+
+
+def _write_replay_rows(directory, snapshot):
+    """
+    Write replay buffer rows into the memory-mapped .npy files of a directory, creating them on first use.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for field, (shape, rows) in snapshot["arrays"].items():
+        path = os.path.join(directory, field + ".npy")
+        array = None
+        if os.path.exists(path):
+            array = np.load(path, mmap_mode="r+")
+            if array.shape != shape or array.dtype != rows.dtype:
+                array = None
+        if array is None:
+            array = np.lib.format.open_memmap(path, mode="w+", dtype=rows.dtype, shape=shape)
+        array[snapshot["rows"]] = rows
+        array.flush()
+        del array
+    meta = {"pos": snapshot["pos"], "full": snapshot["full"], "timesteps": snapshot["timesteps"]}
+    with open(os.path.join(directory, "buffer.json.tmp"), "w") as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(directory, "buffer.json.tmp"), os.path.join(directory, "buffer.json"))
+
+
+def load_replay_buffer(model, directory):
+    """
+    Restore a replay buffer saved by AsyncCheckpointCallback(save_replay_buffer=True) into a model's buffer, which
+    must have the same size and number of envs.
+
+    Returns:
+    - int: The timesteps the buffer was saved at.
+    """
+    with open(os.path.join(directory, "buffer.json")) as f:
+        meta = json.load(f)
+    buffer = model.replay_buffer
+    for field in REPLAY_FIELDS:
+        array = getattr(buffer, field, None)
+        path = os.path.join(directory, field + ".npy")
+        if array is not None and os.path.exists(path):
+            np.copyto(array, np.load(path, mmap_mode="r"))
+    buffer.pos = meta["pos"]
+    buffer.full = meta["full"]
+    return meta["timesteps"]
+
+
+def latest_checkpoint(save_path):
+    """
+    Find the most recent checkpoint listed in save_path/checkpoints.json.
+
+    Returns:
+    - dict entry with "path", "timesteps" and "win_rate", or None if there is none.
+    """
+    path = os.path.join(save_path, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoints = json.load(f)["checkpoints"]
+    return checkpoints[-1] if checkpoints else None
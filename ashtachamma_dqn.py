@@ -1,22 +1,104 @@
 # Import necessary libraries
+import argparse
+import functools
+import logging
+import os
+
 from stable_baselines3 import DQN
-from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.vec_env import DummyVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback
+from ashtachamma_callbacks import AsyncCheckpointCallback, latest_checkpoint, load_replay_buffer
 from ashtachamma_env import AshtachammaEnv
-from torch.utils.tensorboard import SummaryWriter
+from ashtachamma_obs import OBS_FORMATS
+from ashtachamma_subproc_env import SharedMemoryVecEnv
+from ashtachamma_vec_env import AshtachammaVecEnv
+from dice import DICE
+import numpy as np
+
+# Parse command line options
+parser = argparse.ArgumentParser(description="Train a DQN agent to play Ashta Chamma")
+parser.add_argument("--num-envs", type=int, default=0,
+                    help="Train on this many games simulated in one NumPy AshtachammaVecEnv (default: a single env)")
+parser.add_argument("--num-workers", type=int, default=0,
+                    help="Collect rollouts from this many worker processes through shared memory (default: none)")
+parser.add_argument("--envs-per-worker", type=int, default=1,
+                    help="Number of AshtachammaEnv instances stepped by each worker process")
+parser.add_argument("--obs-format", choices=OBS_FORMATS, default="padded",
+                    help="Observation encoding; 'compact' shrinks each observation from 800 to 8 bytes")
+parser.add_argument("--roll-first", action="store_true",
+                    help="Show the agent its dice roll before it picks a pawn (uses the 'features' observation)")
+parser.add_argument("--fast-forward", action="store_true",
+                    help="Play the opponents' turns inside each step, so every timestep is a decision of the agent")
+parser.add_argument("--extra-turns", action="store_true",
+                    help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+parser.add_argument("--dice", choices=DICE, default="d6",
+                    help="Dice outcomes: a six-sided die, equally likely cowrie outcomes or four thrown shells")
+parser.add_argument("--eval-envs", type=int, default=64,
+                    help="Play this many evaluation games at once, batching the policy's forward passes")
+parser.add_argument("--check-env", action="store_true",
+                    help="Validate the environment with Stable-Baselines3's check_env before training")
+parser.add_argument("--profile-env", action="store_true",
+                    help="Time each phase of the environments' step() and reset() and log the timings to TensorBoard")
+parser.add_argument("--pretrain", default=None,
+                    help="Pretrain by behavior cloning on a dataset written by offline_dataset.py before training")
+parser.add_argument("--pretrain-epochs", type=int, default=1, help="Passes over the --pretrain dataset")
+parser.add_argument("--opponents", nargs=3, default=None, choices=["random", "aggressive", "defensive", "pool"],
+                    help="Strategies of seats 1 to 3 in training games; 'pool' draws them from --opponent-pool")
+parser.add_argument("--opponent-pool", nargs="+", default=None,
+                    help="Self-play opponents: ALGORITHM:PATH checkpoints (PATH may be a glob pattern, polled for new "
+                         "files) and heuristic strategies; implies --opponents pool pool pool")
+parser.add_argument("--pool-cache", type=int, default=16, help="Opponent checkpoints kept loaded at once")
+parser.add_argument("--keep-checkpoints", type=int, default=5,
+                    help="Most recent checkpoints to keep in ./checkpoints/, next to the best one")
+parser.add_argument("--checkpoint-eval-episodes", type=int, default=0,
+                    help="Games to evaluate each checkpoint on, keeping the best one as ashtachamma_model_best.zip")
+parser.add_argument("--save-replay-buffer", action="store_true",
+                    help="Keep the replay buffer in ./checkpoints/replay_buffer/ with the checkpoints")
+parser.add_argument("--resume", action="store_true",
+                    help="Resume from the latest checkpoint in ./checkpoints/ (and its replay buffer, if saved)")
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+if args.num_envs > 0 and args.num_workers > 0:
+    parser.error("--num-envs and --num-workers cannot be combined")
+if args.opponents and "pool" in args.opponents and not args.opponent_pool:
+    parser.error("--opponents pool needs --opponent-pool")
+if args.roll_first:
+    args.obs_format = "features"  # The only observation format that includes the dice roll
+env_kwargs = dict(obs_format=args.obs_format, roll_first=args.roll_first, fast_forward=args.fast_forward,
+                  extra_turns=args.extra_turns, dice=args.dice, profile=args.profile_env)
 
-# Create and check the environment
-env = AshtachammaEnv(render_mode="human")  # Custom environment
-check_env(env)  # Ensure environment is valid
+# Opponents of the training games, which evaluation leaves out to keep playing the heuristic players
+opponent_kwargs = {}
+if args.opponent_pool:
+    from opponent_pool import OpponentPool
+    opponent_kwargs["opponent_pool"] = OpponentPool(args.opponent_pool, capacity=args.pool_cache)
+if args.opponent_pool or args.opponents:
+    opponent_kwargs["strategies"] = ["RL"] + (args.opponents or ["pool"] * 3)
+
+# Create the environment, and check it if requested
+env = AshtachammaEnv(render_mode="human", **env_kwargs, **opponent_kwargs)  # Custom environment
+if args.check_env:
+    from stable_baselines3.common.env_checker import check_env
+    check_env(env)  # Ensure environment is valid
 
 # Wrap the environment for batch processing
 env = DummyVecEnv([lambda: env])
 
+# Batch many games into one vectorized environment, or spread them across worker processes, if requested
+if args.num_envs > 0:
+    train_env = AshtachammaVecEnv(num_envs=args.num_envs, **env_kwargs, **opponent_kwargs)
+elif args.num_workers > 0:
+    # The workers copy each observation into shared memory at once, so the envs can reuse their buffers
+    train_env = SharedMemoryVecEnv(functools.partial(AshtachammaEnv, reuse_obs=True, **env_kwargs, **opponent_kwargs),
+                                   num_workers=args.num_workers,
+                                   envs_per_worker=args.envs_per_worker)
+else:
+    train_env = env
+
 # Define and configure the DQN model
 model = DQN(
     "MlpPolicy",
-    env,
+    train_env,
     verbose=1,
     learning_rate=4.5030982985412456e-05,
     buffer_size=1000000,
@@ -29,39 +111,74 @@ model = DQN(
     tensorboard_log="./dqn_tensorboard/"
 )
 
-# Checkpoint callback to save model periodically
-checkpoint_callback = CheckpointCallback(save_freq=10000, save_path="./checkpoints/", name_prefix="ashtachamma_model")
+# Imitate the heuristic moves of an offline dataset first, if requested
+if args.pretrain:
+    from offline_dataset import OfflineDataset, behavior_clone
+    dataset = OfflineDataset(args.pretrain)
+    dataset.check_options(roll_first=args.roll_first, extra_turns=args.extra_turns, dice=args.dice)
+    behavior_clone(model, dataset, epochs=args.pretrain_epochs,
+                   learning_rate=1e-3)  # Training resets the learning rate to the model's own afterwards
 
-# Initialize TensorBoard writer for logging
-writer = SummaryWriter(log_dir="./dqn_ashtachamma_tensorboard/")
+# Checkpoint callback to save model periodically, from a background thread
+checkpoint_callback = AsyncCheckpointCallback(
+    save_freq=10000, save_path="./checkpoints/", name_prefix="ashtachamma_model", keep_last=args.keep_checkpoints,
+    eval_episodes=args.checkpoint_eval_episodes, save_replay_buffer=args.save_replay_buffer,
+    eval_kwargs=dict(roll_first=args.roll_first, fast_forward=args.fast_forward, extra_turns=args.extra_turns,
+                     dice=args.dice),
+    resume=args.resume)  # Carry on rotating the checkpoints of the resumed run
+
+# Pick up where the latest checkpoint left off, if requested
+total_timesteps = 8000000
+if args.resume and latest_checkpoint("./checkpoints/") is not None:
+    checkpoint = latest_checkpoint("./checkpoints/")
+    model.set_parameters(checkpoint["path"])
+    model.num_timesteps = checkpoint["timesteps"]
+    if os.path.exists("./checkpoints/replay_buffer/buffer.json"):
+        load_replay_buffer(model, "./checkpoints/replay_buffer/")
+    logger.info("Resuming from %s", checkpoint["path"])
+
+callbacks = [checkpoint_callback]
+if args.profile_env:
+    from ashtachamma_callbacks import EnvTimingCallback
+    callbacks.append(EnvTimingCallback(log_freq=10000))  # Where the environment time goes, per phase
 
 # Start training
-print("Training the model...")
-model.learn(total_timesteps=8000000, callback=checkpoint_callback)
-print("Training completed!")
+logger.info("Training the model...")
+model.learn(total_timesteps=total_timesteps - model.num_timesteps, callback=callbacks,
+            reset_num_timesteps=not args.resume)
+logger.info("Training completed!")
 
 # Save and load the trained model
 model.save("ashtachamma_dqn_agent")
 model = DQN.load("ashtachamma_dqn_agent")
 
-# Evaluate the policy over multiple episodes
-print("Evaluating the policy...")
-obs = env.reset()
-n_eval_episodes = 100
-for episode in range(n_eval_episodes):
-    done = False
-    episode_reward = 0
-    while not done:
-        action, _ = model.predict(obs, deterministic=True)  # Use deterministic policy
-        obs, reward, done, info = env.step(action)
-        episode_reward += reward
-        if done:
-            obs = env.reset()
-            print(f"Episode {episode + 1} finished with reward: {episode_reward}")
-    writer.add_scalar("Episode Reward", episode_reward, episode)
+# Evaluate the policy, playing --eval-envs games at once so that every step is one batched forward pass
+logger.info("Evaluating the policy...")
+from torch.utils.tensorboard import SummaryWriter  # Only needed for the evaluation logs
+writer = SummaryWriter(log_dir="./dqn_ashtachamma_tensorboard/")  # Initialize TensorBoard writer for logging
+n_eval_episodes = 100  # Number of episodes for evaluation
+eval_env = AshtachammaVecEnv(num_envs=min(args.eval_envs, n_eval_episodes), **env_kwargs)
+# Each game plays an equal share of the episodes, so that short episodes aren't over-represented
+targets = [(n_eval_episodes + i) // eval_env.num_envs for i in range(eval_env.num_envs)]
+counts = [0] * eval_env.num_envs
+episode_rewards = np.zeros(eval_env.num_envs)
+episode = 0
+obs = eval_env.reset()
+while episode < n_eval_episodes:
+    action, _ = model.predict(obs, deterministic=True)  # Deterministic policy, one forward pass for all games
+    obs, reward, done, info = eval_env.step(action)
+    episode_rewards += reward  # Accumulate the rewards
+    for i in np.flatnonzero(done):  # Finished games have already been reset by the vectorized env
+        if counts[i] < targets[i]:
+            counts[i] += 1
+            logger.info("Episode %s finished with reward: %s", episode + 1, episode_rewards[i])
+            writer.add_scalar("Episode Reward", episode_rewards[i], episode)  # Log the episode reward to TensorBoard
+            episode += 1
+        episode_rewards[i] = 0
+eval_env.close()
 
 # Play a single game using the trained agent
-print("Playing a single game...")
+logger.info("Playing a single game...")
 obs = env.reset()
 done = False
 
@@ -71,8 +188,8 @@ while not done:
     env.render()  # Render the environment
 
     if done:
-        print("Game over! Resetting environment...")
+        logger.info("Game over! Resetting environment...")
         obs = env.reset()
 
 env.close()  # Clean up environment after game
-print("Game finished, resources cleaned up!")
+logger.info("Game finished, resources cleaned up!")
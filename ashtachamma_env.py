@@ -1,9 +1,31 @@
+import logging
+import random
+from time import perf_counter
+
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame
-from board_updated import Board
+from ashtachamma_obs import ObservationBuilder
+from ashtachamma_vec_games import STRATEGIES
+from dice import Dice
+from env_timings import PhaseTimings
+from board_updated import (Board, CELL_DISTANCE, CENTRE_DISTANCE, EXTRA_TURN_ROLLS, HOME_INDEX, PATH_CELLS, PATH_INDEX,
+                           SAFE_CELLS)
 from feat_StrategicPlayers_updated import StrategicPlayer
+from game_records import GameLog
+
+logger = logging.getLogger(__name__)
+
+# Phases timed with profile=True; "step" and "reset" cover the whole calls, the other phases are parts of them
+TIMED_PHASES = ("step", "reset", "dice", "board", "opponents", "reward", "observation")
+DEFAULT_STRATEGIES = ("RL", "random", "defensive", "aggressive")  # The seats reset() has always dealt
+START_POSITIONS = [
+    [(0, 4), (1, 4)],
+    [(4, 0), (4, 1)],
+    [(8, 4), (7, 4)],
+    [(4, 8), (4, 7)]
+]
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]  # Red, Green, Blue, Yellow
 
 class AshtachammaEnv(gym.Env):
     """
@@ -11,48 +33,93 @@ class AshtachammaEnv(gym.Env):
     This environment allows reinforcement learning agents to interact with the game.
     """
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, log_moves=False, render_size=None, reuse_frame=False, reuse_obs=False,
+                 obs_format="padded", roll_first=False, fast_forward=False, extra_turns=False, dice="d6",
+                 recorder=None, profile=False, strategies=DEFAULT_STRATEGIES, opponent_pool=None):
         """
         Initialize the Ashtachamma environment.
 
         Parameters:
-        - render_mode (str): The rendering mode. 'human' for visual rendering, or None for no rendering.
+        - render_mode (str): The rendering mode. 'human' for visual rendering, 'rgb_array' for image frames,
+          or None for no rendering.
+        - log_moves (bool): Log every move and decision at DEBUG level. When False (the default) step() and the
+          heuristic players skip logging entirely, so training pays nothing for it.
+        - render_size (int): Side length in pixels of 'rgb_array' frames; None keeps the full board resolution.
+        - reuse_frame (bool): Return the renderer's frame buffer from render() in 'rgb_array' mode instead of a
+          copy. It is overwritten by the next render() call, so only use this when each frame is consumed at once.
+        - reuse_obs (bool): Write observations into two preallocated buffers used in turn instead of a new array
+          each time. An observation then stays valid only until the environment produces its second observation
+          after it, so only use this when each observation is copied at once, as vectorized envs do.
+        - obs_format (str): Observation encoding, one of ashtachamma_obs.OBS_FORMATS: "padded" (the original
+          (4, 50) int32 layout), "compact", "occupancy" or "features".
+        - roll_first (bool): Roll the dice for the next turn before the observation is emitted, so the agent
+          sees its roll before choosing a pawn. The roll is part of the "features" observation, which this mode
+          requires, and step() plays the roll that was observed instead of rolling after the action is chosen.
+        - fast_forward (bool): After the agent's move, play the opponents' turns inside the same step() call and
+          only return once the agent has to act again or the game is over, so every step is an agent decision.
+        - extra_turns (bool): Give a player another turn after rolling a 4 or 8 or capturing a pawn.
+        - dice (str or tuple): Outcome distribution of the dice, the name of one of dice.DICE ("d6", "cowries",
+          "shells") or a (faces, weights) pair. Rolls and the random player's choices are reproducible once
+          reset() is given a seed.
+        - recorder (game_records.GameRecorder): Record every turn of every game to it, so that games can be
+          replayed later; games cut short by reset() are recorded without a winner.
+        - profile (bool): Count the calls of each phase of step() and reset() (see TIMED_PHASES) and the time
+          spent in them, reported by get_timings(). When False the phases are not timed at all.
+        - strategies (sequence of str): Strategy of each seat. Seat 0 is the RL agent ("RL"); the other seats use
+          "random", "aggressive" or "defensive", or "pool" for an opponent drawn from opponent_pool at every reset.
+        - opponent_pool (opponent_pool.OpponentPool): Opponents of the "pool" seats, frozen checkpoints playing
+          from their seat's point of view or heuristic strategies.
         """
+        if roll_first and obs_format != "features":
+            raise ValueError(f"roll_first needs an observation that includes the roll, use obs_format='features' "
+                             f"instead of {obs_format!r}")
+        unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown strategies {unknown}, expected some of {STRATEGIES}")
+        if len(strategies) != len(START_POSITIONS) or strategies[0] != "RL" or "RL" in strategies[1:]:
+            raise ValueError(f"Seat 0, and only seat 0, must be played by the RL agent, got strategies {strategies}")
+        if "pool" in strategies and opponent_pool is None:
+            raise ValueError(f"Seats with the 'pool' strategy need an opponent_pool, got strategies {strategies}")
         super(AshtachammaEnv, self).__init__()
+        self.log_moves = log_moves and logger.isEnabledFor(logging.DEBUG)
 
-        # Rendering setup
+        # Rendering setup; the renderer (and pygame) is only created on the first render() call
         self.render_mode = render_mode
-        if render_mode == "human":
-            pygame.init()  # Initialize pygame if rendering to a screen
-            self.screen = None  # Screen will be initialized later when rendering starts
+        self.render_size = render_size
+        self.reuse_frame = reuse_frame
+        self.reuse_obs = reuse_obs
+        self.renderer = None
+
+        # Dice and random player choices are drawn from self.np_random, which reset(seed=...) reseeds
+        self.dice = Dice(dice, rng=self.np_random)
+        self._player_rng = random.Random(int(self.np_random.integers(2 ** 63)))
 
         # Initialize the game board
-        self.board = Board()
+        self.board = Board(dice=self.dice)
         self.players = []  # List to hold players
         self.current_player_index = 0  # Index of the current player
-
-        # Define starting positions, colors, and strategies for players
-        start_positions = [
-            [(0, 4), (1, 4)],
-            [(4, 0), (4, 1)],
-            [(8, 4), (7, 4)],
-            [(4, 8), (4, 7)]
-        ]
-        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]  # Red, Green, Blue, Yellow
-        strategies = ["RL", "random", "aggressive", "defensive"]  # RL, random, and heuristic strategies
+        self.roll_first = roll_first
+        self.fast_forward = fast_forward
+        self.extra_turns = extra_turns
+        self.last_roll = 0  # Dice roll of the most recent turn (of the next turn with roll_first), see "features"
+        self.recorder = recorder
+        self._game_log = None  # Turns of the game being played, when recording
+        self.timings = PhaseTimings(TIMED_PHASES) if profile else None
+        self.strategies = tuple(strategies)
+        self.opponent_pool = opponent_pool
+        self._pool_seats = [seat for seat, strategy in enumerate(strategies) if strategy == "pool"]
+        self._opponent_ids = {}  # Seat -> pool opponent drawn for the current game
+        self._seat_policies = {}  # Seat -> frozen checkpoint playing it in the current game
+        self._seat_builders = {}  # Observation format -> builder of the frozen checkpoints' observations
 
         # Initialize players with their attributes
-        for i in range(len(start_positions)):
-            player = StrategicPlayer(player_id=i, start_positions=start_positions[i], color=colors[i],
-                                     strategy=strategies[i])
-            player.pawns = list(start_positions[i])  # Set initial pawn positions
-            self.players.append(player)
-
-        self.board.players = self.players  # Add players to the board
+        self._create_players()
 
         # Define action and observation spaces for RL
         self.action_space = spaces.Discrete(2)  # RL agents can select one of two actions
-        self.observation_space = spaces.Box(low=0, high=49, shape=(4, 50), dtype=np.int32)
+        self._obs_builder = ObservationBuilder(obs_format, max_roll=self.dice.max_roll)
+        self._pawn_offsets = np.empty((4, 2), dtype=np.int16)  # Scratch array handed to the observation builder
+        self.observation_space = self._obs_builder.observation_space
 
     def reset(self, seed=None, options=None):
         """
@@ -66,37 +133,98 @@ class AshtachammaEnv(gym.Env):
         - state (np.ndarray): The initial observation/state.
         - info (dict): Additional reset information.
         """
+        timings = self.timings
+        if timings is not None:
+            start = perf_counter()
         super().reset(seed=seed)
-
-        # Reinitialize the board and players
-        self.board = Board()
+        if seed is not None:
+            self.dice.seed(self.np_random)
+            self._player_rng.seed(int(self.np_random.integers(2 ** 63)))
+
+        # Reinitialize the board and players, drawing the opponents of the "pool" seats
+        self.board = Board(dice=self.dice)
+        self._create_players()
+        if self._pool_seats:
+            self._draw_opponents()
+        self.current_player_index = 0
+        if self.recorder is not None:
+            if self._game_log is not None and len(self._game_log):
+                self.recorder.add(self._game_log)  # The previous game was cut short
+            self._game_log = GameLog(self.extra_turns, self.roll_first, self.dice.max_roll)
+        self.last_roll = self.board.diceRoll() if self.roll_first else 0
+        if self.fast_forward:
+            self._play_opponents()
+
+        state = self._get_state()
+        if timings is not None:
+            timings.lap("reset", start)
+        return state, {}
+
+    def _create_players(self):
+        """
+        Create the players with their start positions, colors and strategies, and seat them at the board.
+        """
         self.players = []
-
-        # Reset starting positions, colors, and strategies
-        start_positions = [
-            [(0, 4), (1, 4)],
-            [(4, 0), (4, 1)],
-            [(8, 4), (7, 4)],
-            [(4, 8), (4, 7)]
-        ]
-        colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
-        strategies = ["RL", "random", "defensive", "aggressive"]
-
-        # Reinitialize players
-        for i in range(len(start_positions)):
-            player = StrategicPlayer(player_id=i, start_positions=start_positions[i], color=colors[i],
-                                     strategy=strategies[i])
-            player.pawns = list(start_positions[i])
+        for i in range(len(START_POSITIONS)):
+            player = StrategicPlayer(player_id=i, start_positions=START_POSITIONS[i], color=COLORS[i],
+                                     strategy=self.strategies[i], log_moves=self.log_moves, rng=self._player_rng)
+            player.pawns = [PATH_INDEX[i][position] for position in START_POSITIONS[i]]  # Initial path offsets
             self.players.append(player)
+        self.board.players = self.players  # Add players to the board
 
-        self.board.players = self.players
-        self.current_player_index = 0
+    def _draw_opponents(self):
+        """
+        Draw the opponents of the "pool" seats for a new game. A heuristic opponent plays its strategy, a frozen
+        checkpoint keeps the "pool" strategy and picks its pawns in _pool_move().
+        """
+        opponent_ids = self.opponent_pool.sample(len(self._pool_seats), rng=self.np_random)
+        self._seat_policies = {}
+        for seat, opponent_id in zip(self._pool_seats, opponent_ids):
+            opponent = self.opponent_pool.get(opponent_id)
+            if isinstance(opponent, str):
+                self.players[seat].strategy = opponent
+            else:
+                self._seat_policies[seat] = opponent
+            self._opponent_ids[seat] = opponent_id
+
+    def _pool_move(self, player, possible_moves, shown_roll):
+        """
+        Let the frozen checkpoint playing a seat pick a pawn, as the agent would from seat 0.
+
+        Parameters:
+        - player (StrategicPlayer): The player to move.
+        - possible_moves (list): Its legal moves.
+        - shown_roll (int): The roll its observation shows, as the agent's would.
 
-        return self._get_state(), {}
+        Returns:
+        - The chosen move, or None when the chosen pawn cannot move (the turn is lost, as for the agent).
+        """
+        policy = self._seat_policies[player.player_id]
+        builder = self._seat_builders.get(policy.obs_format)
+        if builder is None:
+            builder = self._seat_builders[policy.obs_format] = ObservationBuilder(policy.obs_format,
+                                                                                 max_roll=self.dice.max_roll)
+        offsets = self._fill_offsets()
+        seats = np.roll(offsets, -player.player_id, axis=0)  # The moving seat first, as seat 0 sees the board
+        obs = builder.build(seats, 0, shown_roll)
+        mask = np.zeros(self.action_space.n, dtype=bool)
+        if self.roll_first:
+            for move in possible_moves:
+                mask[move[2]] = True
+        else:
+            mask[:] = [pawn is not None for pawn in player.pawns]
+        pawn_index = int(policy.act(obs[None], mask[None])[0])
+        if player.pawns[pawn_index] is None:
+            pawn_index = 1 - pawn_index  # Home pawns can't be chosen
+        for move in possible_moves:
+            if move[2] == pawn_index:
+                return move
+        return None
 
     def step(self, action):
         """
         Perform a step in the environment for the current player based on the action.
+        With fast_forward, the opponents' turns that follow are played as part of the same step.
 
         Parameters:
         - action (int): The action selected by the agent.
@@ -108,12 +236,58 @@ class AshtachammaEnv(gym.Env):
         - truncated (bool): Whether the episode is truncated.
         - info (dict): Additional information.
         """
+        timings = self.timings
+        if timings is not None:
+            start = perf_counter()
+        reward, terminated = self._play_turn(action)
+        if self.fast_forward and not terminated:
+            terminated = self._play_opponents()
+        state = self._get_state()
+        if timings is not None:
+            timings.lap("step", start)
+        return state, reward, terminated, False, {}
+
+    def _play_opponents(self):
+        """
+        Play the heuristic players' turns until the RL player is to move or the game is over.
+
+        Returns:
+        - bool: Whether an opponent won the game.
+        """
+        while self.players[self.current_player_index].strategy != "RL":
+            _, terminated = self._play_turn(None)
+            if terminated:
+                return True
+        return False
+
+    def _play_turn(self, action):
+        """
+        Play the current player's turn: the agent's action for the RL player, its strategy for anyone else.
+
+        Parameters:
+        - action (int): The pawn chosen by the agent; ignored on the other players' turns.
+
+        Returns:
+        - reward (float): The RL agent's reward for the turn (0 on the other players' turns).
+        - terminated (bool): Whether the player won the game.
+        """
+        timings = self.timings
+        if timings is not None:
+            start = perf_counter()
         current_player = self.players[self.current_player_index]  # Get the current player
-        roll = self.board.diceRoll()  # Roll the dice
+        shown_roll = self.last_roll  # The roll the current observation shows
+        if self.roll_first:
+            roll = self.last_roll  # Rolled when the previous observation was emitted
+        else:
+            roll = self.board.diceRoll()  # Roll the dice
+            self.last_roll = roll
+        if timings is not None:
+            start = timings.lap("dice", start)
+        if self.log_moves:
+            logger.debug("Player %s rolled a %s", current_player.player_id, roll)
 
         reward = 0  # Initialize reward
         terminated = False
-        truncated = False
 
         # Handle RL player's action
         if current_player.strategy == "RL":
@@ -121,9 +295,11 @@ class AshtachammaEnv(gym.Env):
 
             # Validate pawn index
             if pawn_index is not None and pawn_index >= len(current_player.pawns):
-                print(f"Invalid pawn index: {pawn_index} for Player {current_player.player_id}")
+                logger.warning("Invalid pawn index: %s for Player %s", pawn_index, current_player.player_id)
+                if self._game_log is not None:
+                    self._game_log.record(current_player.player_id, roll)
                 self._next_player()
-                return self._get_state(), -1, False, False, {}
+                return -1, False
 
             # Handle None pawns
             if current_player.pawns[pawn_index] is None:
@@ -132,51 +308,87 @@ class AshtachammaEnv(gym.Env):
                         pawn_index = i
                         break
 
-            # Get the current pawn's position and move it
-            current_position = current_player.pawns[pawn_index]
-            new_position = self.board.move(current_player, pawn_index, roll)
+            # Get the current pawn's path offset and move it
+            current_offset = current_player.pawns[pawn_index]
+            chosen_move = None
+            for move in self.board.legal_moves(current_player, roll):
+                if move[2] == pawn_index:
+                    chosen_move = move
+                    break
 
-            if new_position == current_position:
+            if chosen_move is None:
                 # No valid move
-                self._next_player()
-                return self._get_state(), -0.1, False, False, {}
+                if self._game_log is not None:
+                    self._game_log.record(current_player.player_id, roll)
+                if timings is not None:
+                    timings.lap("board", start)
+                self._next_player(self._extra_turn(roll))
+                return -0.1, False
 
             # Update pawn's position and calculate rewards
-            current_player.pawns[pawn_index] = new_position
-            old_distance = abs(current_position[0] - 4) + abs(current_position[1] - 4)
-            new_distance = abs(new_position[0] - 4) + abs(new_position[1] - 4)
-
-            if new_distance < old_distance:
+            if self._game_log is not None:
+                self._game_log.record(current_player.player_id, roll, chosen_move, current_offset)
+            new_position = self.board.apply_move(chosen_move)
+            if timings is not None:
+                start = timings.lap("board", start, count=False)
+            cells = PATH_CELLS[current_player.player_id]
+            new_cell = cells[new_position]
+
+            if CENTRE_DISTANCE[new_cell] < CENTRE_DISTANCE[cells[current_offset]]:
                 reward += 1.5  # Progress reward
 
-            if new_position == (4, 4):
-                print(f"Player {current_player.player_id}'s pawn {pawn_index} reached home!")
+            if new_position == HOME_INDEX:
+                if self.log_moves:
+                    logger.debug("Player %s's pawn %s reached home!", current_player.player_id, pawn_index)
                 current_player.pawns[pawn_index] = None
                 reward += 5  # Home reward
                 current_player.score += 1
 
-            if new_position in self.board.safe_places:
+            if SAFE_CELLS[new_cell]:
                 reward += 1  # Safe zone reward
 
+            distances = CELL_DISTANCE[new_cell]
             for opponent in self.players:
                 if opponent != current_player:
+                    opponent_cells = PATH_CELLS[opponent.player_id]
                     for opp_pawn in opponent.pawns:
-                        if opp_pawn and abs(opp_pawn[0] - new_position[0]) + abs(opp_pawn[1] - new_position[1]) == 6:
+                        if opp_pawn is not None and distances[opponent_cells[opp_pawn]] == 6:
                             reward -= 0.8  # Risk penalty
 
             if current_player.kill:
                 reward += 2  # Kill reward
+            if timings is not None:
+                start = timings.lap("reward", start)
 
         else:
             # Handle non-RL players using strategies
             possible_moves = self.get_possible_moves(current_player, roll)
             if not possible_moves:
-                self._next_player()
-                return self._get_state(), 0, False, False, {}
-
-            chosen_move = current_player.decide_move(possible_moves, self.players)
+                if self._game_log is not None:
+                    self._game_log.record(current_player.player_id, roll)
+                if timings is not None:
+                    timings.lap("board", start)
+                self._next_player(self._extra_turn(roll))
+                return 0, False
+
+            if timings is not None:
+                start = timings.lap("board", start, count=False)
+            if current_player.strategy == "pool":
+                chosen_move = self._pool_move(current_player, possible_moves, shown_roll)
+            else:
+                chosen_move = current_player.decide_move(possible_moves, self.players, roll)
+            if timings is not None:
+                start = timings.lap("opponents", start)
+            if chosen_move is None:
+                # The frozen checkpoint picked a pawn that can't move
+                if self._game_log is not None:
+                    self._game_log.record(current_player.player_id, roll)
+                self._next_player(self._extra_turn(roll))
+                return 0, False
             _, _, pawn_index, new_position = chosen_move
-            current_player.update_position(pawn_index, new_position)
+            if self._game_log is not None:
+                self._game_log.record(current_player.player_id, roll, chosen_move, current_player.pawns[pawn_index])
+            self.board.apply_move(chosen_move)
 
         # Check for winning conditions
         win, winner = self.board.check_winner((current_player.player_id, False, pawn_index, new_position))
@@ -184,70 +396,131 @@ class AshtachammaEnv(gym.Env):
             if current_player.strategy == "RL":
                 reward += 10  # Winning reward for RL agent
             terminated = True
+            if self._pool_seats:
+                self.opponent_pool.update([self._opponent_ids[seat] for seat in self._pool_seats],
+                                          current_player.player_id == 0)
+            if self._game_log is not None:
+                self.recorder.add(self._game_log, current_player.player_id)
+                self._game_log = None
+        if timings is not None:
+            timings.lap("board", start)
+
+        self._next_player(self._extra_turn(roll, chosen_move[1]))
+        return reward, terminated
+
+    def _extra_turn(self, roll, kill=False):
+        """
+        Check whether a turn earns the player another one, when extra_turns is enabled.
+        """
+        return self.extra_turns and (kill or roll in EXTRA_TURN_ROLLS)
 
-        self._next_player()
-        return self._get_state(), reward, terminated, truncated, {}
-
-    def _next_player(self):
+    def _next_player(self, extra_turn=False):
         """
         Advance to the next player, skipping players with no active pawns.
+        With roll_first, also roll the dice for that player's turn.
+
+        Parameters:
+        - extra_turn (bool): Keep the current player, who earned another turn.
         """
         if any(player.score == 2 for player in self.players):
             return
 
-        self.current_player_index = (self.current_player_index + 1) % len(self.players)
-        while all(pawn is None for pawn in self.players[self.current_player_index].pawns):
+        if not extra_turn:
             self.current_player_index = (self.current_player_index + 1) % len(self.players)
+            while all(pawn is None for pawn in self.players[self.current_player_index].pawns):
+                self.current_player_index = (self.current_player_index + 1) % len(self.players)
+        if self.roll_first:
+            if self.timings is not None:
+                start = perf_counter()
+                self.last_roll = self.board.diceRoll()
+                self.timings.lap("dice", start)
+            else:
+                self.last_roll = self.board.diceRoll()
+
+    def action_masks(self):
+        """
+        Get the actions (pawn indices) the agent can legally choose, as sb3-contrib's MaskablePPO expects.
+
+        With roll_first a pawn is valid when it can move by the observed roll; otherwise the roll is not known
+        yet and every pawn that has not reached home is valid. When the action is ignored (an opponent's turn)
+        or no pawn can move, every action is marked valid, since the mask must allow at least one action.
+
+        Returns:
+        - np.ndarray of shape (2,) with True for valid actions.
+        """
+        player = self.players[self.current_player_index]
+        mask = np.zeros(self.action_space.n, dtype=bool)
+        if player.strategy == "RL":
+            if self.roll_first:
+                for move in self.board.legal_moves(player, self.last_roll):
+                    mask[move[2]] = True
+            else:
+                mask[:] = [pawn is not None for pawn in player.pawns]
+        if not mask.any():
+            mask[:] = True
+        return mask
 
     def _get_state(self):
         """
-        Generate the current state as an observation for RL.
+        Generate the current state as an observation for RL: a new array, or a shared buffer with reuse_obs.
+        """
+        if self.timings is not None:
+            start = perf_counter()
+        offsets = self._fill_offsets()
+        out = None
+        if not self.reuse_obs:
+            out = np.empty(self.observation_space.shape, dtype=self.observation_space.dtype)
+        state = self._obs_builder.build(offsets, self.current_player_index, self.last_roll, out=out)
+        if self.timings is not None:
+            self.timings.lap("observation", start)
+        return state
+
+    def _fill_offsets(self):
+        """
+        Write the path offsets of every pawn, HOME_INDEX once home, into the (4, 2) scratch array and return it.
         """
-        state = np.full((4, 50), 49, dtype=np.int32)
+        offsets = self._pawn_offsets
         for i, player in enumerate(self.players):
             for j, pawn in enumerate(player.pawns):
-                if pawn is not None:
-                    state[i][j] = self.board.paths[i].index(pawn)
-        return state
+                offsets[i, j] = HOME_INDEX if pawn is None else pawn  # Pawns are already stored as path offsets
+        return offsets
+
+    def get_timings(self, reset=False):
+        """
+        Get the time spent in each phase of step() and reset() since profiling started or was last reset.
+
+        Parameters:
+        - reset (bool): Clear the counters after reading them.
+
+        Returns:
+        - dict of phase -> {"calls": int, "seconds": float}, or None when the env was created without profile=True.
+        """
+        return None if self.timings is None else self.timings.snapshot(reset)
 
     def get_possible_moves(self, player, roll):
         """
         Get all valid moves for the given player and dice roll.
+        This does not change the game; use self.board.apply_move() to play one of them.
         """
-        possible_moves = []
-        for pawn_index, pawn in enumerate(player.pawns):
-            if pawn is None:
-                continue
-            new_position = self.board.move(player, pawn_index, roll)
-            if new_position != pawn:
-                possible_moves.append((player.player_id, player.kill, pawn_index, new_position))
-        return possible_moves
+        return self.board.legal_moves(player, roll)
 
     def render(self):
         """
         Render the game based on the selected render mode.
         """
-        if self.render_mode == "human":
-            if not hasattr(self, "screen") or self.screen is None:
-                screen_width = self.board.board_size * self.board.cell_size + 2 * self.board.padding
-                screen_height = self.board.board_size * self.board.cell_size + 2 * self.board.padding
-                self.screen = pygame.display.set_mode((screen_width, screen_height))
-                pygame.display.set_caption("Ashtachamma RL Environment")
+        if self.render_mode in ("human", "rgb_array") and self.renderer is None:
+            from board_renderer import BoardRenderer
+            self.renderer = BoardRenderer(caption="Ashtachamma RL Environment", size=self.render_size)
 
-            self.screen.fill((255, 255, 255))
-            self.board.render(self.screen)
-            pygame.display.flip()
+        if self.render_mode == "human":
+            self.renderer.show(self.board)
 
         elif self.render_mode == "rgb_array":
-            screen_width = self.board.board_size * self.board.cell_size + 2 * self.board.padding
-            screen_height = self.board.board_size * self.board.cell_size + 2 * self.board.padding
-            surface = pygame.Surface((screen_width, screen_height))
-            surface.fill((255, 255, 255))
-            self.board.render(surface)
-            return np.array(pygame.surfarray.array3d(surface))
+            frame = self.renderer.rgb_array(self.board)
+            return frame if self.reuse_frame else frame.copy()
 
         elif self.render_mode == "ansi":
-            print("Rendering in ANSI mode is not yet implemented.")
+            logger.warning("Rendering in ANSI mode is not yet implemented.")
 
         else:
             raise ValueError(f"Unsupported render_mode: {self.render_mode}")
@@ -256,6 +529,6 @@ class AshtachammaEnv(gym.Env):
         """
         Clean up resources when the environment is closed.
         """
-        if self.render_mode == "human" and hasattr(self, "screen"):
-            pygame.quit()
-            del self.screen
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
@@ -0,0 +1,120 @@
+import numpy as np
+from gymnasium import spaces
+
+from board_updated import HOME_INDEX, PATH_LENGTH
+
+NUM_PLAYERS = 4
+NUM_PAWNS = 2
+MAX_ROLL = 6  # Highest roll of the default six-sided die
+
+# Observation formats understood by ObservationBuilder:
+# - "padded":    (4, 50) int32 path offsets of each player's pawns, padded with 49 (the original layout)
+# - "compact":   (4, 2) uint8 path offsets of each player's pawns, 49 once a pawn is home
+# - "occupancy": (4, 50) uint8 count of each player's pawns on each offset of their path
+# - "features":  (13,) float32 vector of the 8 offsets scaled to [0, 1], the current player one-hot
+#                and the dice roll scaled to [0, 1] by the highest roll of the dice
+OBS_FORMATS = ("padded", "compact", "occupancy", "features")
+FEATURE_SIZE = NUM_PLAYERS * NUM_PAWNS + NUM_PLAYERS + 1
+
+
+def observation_space(obs_format):
+    """
+    Get the gymnasium observation space for an observation format.
+
+    Parameters:
+    - obs_format (str): One of OBS_FORMATS.
+
+    Returns:
+    - spaces.Box describing a single observation.
+    """
+    if obs_format == "padded":
+        return spaces.Box(low=0, high=HOME_INDEX, shape=(NUM_PLAYERS, PATH_LENGTH), dtype=np.int32)
+    if obs_format == "compact":
+        return spaces.Box(low=0, high=HOME_INDEX, shape=(NUM_PLAYERS, NUM_PAWNS), dtype=np.uint8)
+    if obs_format == "occupancy":
+        return spaces.Box(low=0, high=NUM_PAWNS, shape=(NUM_PLAYERS, PATH_LENGTH), dtype=np.uint8)
+    if obs_format == "features":
+        return spaces.Box(low=0.0, high=1.0, shape=(FEATURE_SIZE,), dtype=np.float32)
+    raise ValueError(f"Unknown observation format {obs_format!r}, expected one of {OBS_FORMATS}")
+
+
+def find_obs_format(space):
+    """
+    Find the observation format whose observation space matches `space`, e.g. that of a trained model.
+
+    Returns:
+    - str: One of OBS_FORMATS.
+    """
+    for obs_format in OBS_FORMATS:
+        if observation_space(obs_format) == space:
+            return obs_format
+    raise ValueError(f"No observation format matches {space}")
+
+
+class ObservationBuilder:
+    """
+    Encode pawn positions into observations of a chosen format without allocating per call.
+
+    Observations are written into two preallocated buffers used in turn, so an observation stays valid
+    until the second build() call after it. That is long enough for vectorized envs to hand out a terminal
+    observation and the reset observation that follows it in the same step.
+    """
+
+    def __init__(self, obs_format="padded", batch_shape=(), max_roll=MAX_ROLL):
+        """
+        Initialize the builder.
+
+        Parameters:
+        - obs_format (str): One of OBS_FORMATS.
+        - batch_shape (tuple): Leading dimensions of the inputs, e.g. () for one game or (N,) for N games.
+        - max_roll (int): Highest possible dice roll, which the "features" format scales to 1.
+        """
+        self.obs_format = obs_format
+        self.observation_space = observation_space(obs_format)
+        self.batch_shape = tuple(batch_shape)
+        shape = self.batch_shape + self.observation_space.shape
+        self._buffers = [np.full(shape, HOME_INDEX if obs_format == "padded" else 0,
+                                 dtype=self.observation_space.dtype) for _ in range(2)]
+        self._next = 0
+        self._seats = np.arange(NUM_PLAYERS)
+        self._indices = {}  # Batch shape -> index arrays used to scatter pawns into occupancy planes
+        self._feature_scale = np.float32(1.0 / HOME_INDEX)
+        self._roll_scale = 1.0 / max_roll
+
+    def build(self, pawns, current_player, roll, out=None):
+        """
+        Encode one observation (or one per game for a batch).
+
+        Parameters:
+        - pawns (np.ndarray): Path offsets of shape batch_shape + (4, 2), with HOME_INDEX for pawns that are home.
+        - current_player (int or np.ndarray): Seat to play next, of shape batch_shape.
+        - roll (int or np.ndarray): Dice roll to report, 0 if none, of shape batch_shape.
+        - out (np.ndarray): Optional array to write into instead of the builder's buffers, e.g. for a subset
+          of the games in a batch.
+
+        Returns:
+        - The observation, either `out` or one of the builder's buffers.
+        """
+        if out is None:
+            out = self._buffers[self._next]  # Padding of the builder's own buffers was filled in once
+            self._next ^= 1
+        elif self.obs_format == "padded":
+            out[..., NUM_PAWNS:] = HOME_INDEX
+
+        if self.obs_format == "padded":
+            out[..., :NUM_PAWNS] = pawns
+        elif self.obs_format == "compact":
+            out[...] = pawns
+        elif self.obs_format == "occupancy":
+            index = self._indices.get(pawns.shape)
+            if index is None:
+                index = self._indices[pawns.shape] = tuple(np.indices(pawns.shape[:-1]))
+            out.fill(0)
+            out[(*index, pawns[..., 0])] = 1
+            out[(*index, pawns[..., 1])] += 1
+        else:
+            offsets = NUM_PLAYERS * NUM_PAWNS
+            np.multiply(pawns.reshape(pawns.shape[:-2] + (offsets,)), self._feature_scale, out=out[..., :offsets])
+            out[..., offsets:offsets + NUM_PLAYERS] = self._seats == np.asarray(current_player)[..., None]
+            out[..., -1] = np.asarray(roll) * self._roll_scale
+        return out
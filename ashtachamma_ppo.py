@@ -1,25 +1,107 @@
+import argparse
+import functools
+import logging
+
 from stable_baselines3 import PPO
-from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.vec_env import DummyVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback
+from ashtachamma_callbacks import AsyncCheckpointCallback
 from ashtachamma_env import AshtachammaEnv
-from torch.utils.tensorboard import SummaryWriter
-import pygame
+from ashtachamma_obs import OBS_FORMATS
+from ashtachamma_subproc_env import SharedMemoryVecEnv
+from ashtachamma_vec_env import AshtachammaVecEnv
+from dice import DICE
+import numpy as np
+
+# Parse command line options
+parser = argparse.ArgumentParser(description="Train a PPO agent to play Ashta Chamma")
+parser.add_argument("--num-envs", type=int, default=0,
+                    help="Train on this many games simulated in one NumPy AshtachammaVecEnv (default: a single env)")
+parser.add_argument("--num-workers", type=int, default=0,
+                    help="Collect rollouts from this many worker processes through shared memory (default: none)")
+parser.add_argument("--envs-per-worker", type=int, default=1,
+                    help="Number of AshtachammaEnv instances stepped by each worker process")
+parser.add_argument("--obs-format", choices=OBS_FORMATS, default="padded",
+                    help="Observation encoding; 'compact' shrinks each observation from 800 to 8 bytes")
+parser.add_argument("--roll-first", action="store_true",
+                    help="Show the agent its dice roll before it picks a pawn (uses the 'features' observation)")
+parser.add_argument("--fast-forward", action="store_true",
+                    help="Play the opponents' turns inside each step, so every timestep is a decision of the agent")
+parser.add_argument("--extra-turns", action="store_true",
+                    help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+parser.add_argument("--dice", choices=DICE, default="d6",
+                    help="Dice outcomes: a six-sided die, equally likely cowrie outcomes or four thrown shells")
+parser.add_argument("--maskable", action="store_true",
+                    help="Train sb3-contrib's MaskablePPO, which never picks a pawn that cannot move")
+parser.add_argument("--eval-envs", type=int, default=64,
+                    help="Play this many evaluation games at once, batching the policy's forward passes")
+parser.add_argument("--check-env", action="store_true",
+                    help="Validate the environment with Stable-Baselines3's check_env before training")
+parser.add_argument("--profile-env", action="store_true",
+                    help="Time each phase of the environments' step() and reset() and log the timings to TensorBoard")
+parser.add_argument("--pretrain", default=None,
+                    help="Pretrain by behavior cloning on a dataset written by offline_dataset.py before training")
+parser.add_argument("--pretrain-epochs", type=int, default=1, help="Passes over the --pretrain dataset")
+parser.add_argument("--opponents", nargs=3, default=None, choices=["random", "aggressive", "defensive", "pool"],
+                    help="Strategies of seats 1 to 3 in training games; 'pool' draws them from --opponent-pool")
+parser.add_argument("--opponent-pool", nargs="+", default=None,
+                    help="Self-play opponents: ALGORITHM:PATH checkpoints (PATH may be a glob pattern, polled for new "
+                         "files) and heuristic strategies; implies --opponents pool pool pool")
+parser.add_argument("--pool-cache", type=int, default=16, help="Opponent checkpoints kept loaded at once")
+parser.add_argument("--keep-checkpoints", type=int, default=5,
+                    help="Most recent checkpoints to keep in ./checkpoints/, next to the best one")
+parser.add_argument("--checkpoint-eval-episodes", type=int, default=0,
+                    help="Games to evaluate each checkpoint on, keeping the best one as ashtachamma_model_best.zip")
+args = parser.parse_args()
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+if args.num_envs > 0 and args.num_workers > 0:
+    parser.error("--num-envs and --num-workers cannot be combined")
+if args.opponents and "pool" in args.opponents and not args.opponent_pool:
+    parser.error("--opponents pool needs --opponent-pool")
+if args.roll_first:
+    args.obs_format = "features"  # The only observation format that includes the dice roll
+env_kwargs = dict(obs_format=args.obs_format, roll_first=args.roll_first, fast_forward=args.fast_forward,
+                  extra_turns=args.extra_turns, dice=args.dice, profile=args.profile_env)
 
-# Create and check the environment
-env = AshtachammaEnv(render_mode="human")  # Initialize the custom environment with human-rendering mode
-check_env(env)  # Validate the environment for compatibility with Stable-Baselines3
+# Opponents of the training games, which evaluation leaves out to keep playing the heuristic players
+opponent_kwargs = {}
+if args.opponent_pool:
+    from opponent_pool import OpponentPool
+    opponent_kwargs["opponent_pool"] = OpponentPool(args.opponent_pool, capacity=args.pool_cache)
+if args.opponent_pool or args.opponents:
+    opponent_kwargs["strategies"] = ["RL"] + (args.opponents or ["pool"] * 3)
+if args.maskable:
+    # Same API as PPO, but reads the valid pawns from the env's action_masks() (pip install sb3-contrib)
+    from sb3_contrib import MaskablePPO as PPO
+    from sb3_contrib.common.maskable.utils import get_action_masks
+
+# Create the environment (with human-rendering mode), and check it if requested
+env = AshtachammaEnv(render_mode="human", **env_kwargs, **opponent_kwargs)
+if args.check_env:
+    from stable_baselines3.common.env_checker import check_env
+    check_env(env)  # Validate the environment for compatibility with Stable-Baselines3
 
 # Wrap the environment
 env = DummyVecEnv([lambda: env])  # Wrap the environment to make it compatible with vectorized operations
 
+# Batch many games into one vectorized environment, or spread them across worker processes, if requested
+if args.num_envs > 0:
+    train_env = AshtachammaVecEnv(num_envs=args.num_envs, **env_kwargs, **opponent_kwargs)
+elif args.num_workers > 0:
+    # The workers copy each observation into shared memory at once, so the envs can reuse their buffers
+    train_env = SharedMemoryVecEnv(functools.partial(AshtachammaEnv, reuse_obs=True, **env_kwargs, **opponent_kwargs),
+                                   num_workers=args.num_workers,
+                                   envs_per_worker=args.envs_per_worker)
+else:
+    train_env = env
+
 # Create the model with custom hyperparameters
 model = PPO(
     "MlpPolicy",  # Use a multi-layer perceptron policy
-    env,  # Pass the environment
+    train_env,  # Pass the environment
     verbose=1,  # Enable verbose logging
     learning_rate=1.4401226335484468e-05,  # Learning rate for the optimizer
-    n_steps=6144,  # Number of steps per update
+    n_steps=max(6144 // train_env.num_envs, 1),  # Number of steps per env per update (6144 in total)
     batch_size=128,  # Batch size for optimization
     n_epochs=10,  # Number of epochs per update
     gamma=0.96,  # Discount factor for future rewards
@@ -29,58 +111,90 @@ model = PPO(
     tensorboard_log="./ppo_tensorboard/"  # Path for tensorboard logs
 )
 
-# Define checkpoint callback
-checkpoint_callback = CheckpointCallback(
+# Imitate the heuristic moves of an offline dataset first, if requested
+if args.pretrain:
+    from offline_dataset import OfflineDataset, behavior_clone
+    dataset = OfflineDataset(args.pretrain)
+    dataset.check_options(roll_first=args.roll_first, extra_turns=args.extra_turns, dice=args.dice)
+    behavior_clone(model, dataset, epochs=args.pretrain_epochs,
+                   learning_rate=1e-3)  # Training resets the learning rate to the model's own afterwards
+
+# Define checkpoint callback, which writes the checkpoints from a background thread
+checkpoint_callback = AsyncCheckpointCallback(
     save_freq=10000,  # Save model every 10,000 steps
     save_path="./checkpoints/",  # Directory to save checkpoints
-    name_prefix="ashtachamma_model"  # Prefix for checkpoint filenames
+    name_prefix="ashtachamma_model",  # Prefix for checkpoint filenames
+    keep_last=args.keep_checkpoints,  # Delete older checkpoints
+    eval_episodes=args.checkpoint_eval_episodes,  # Games played to find the best checkpoint
+    eval_kwargs=dict(roll_first=args.roll_first, fast_forward=args.fast_forward, extra_turns=args.extra_turns,
+                     dice=args.dice)
 )
 
-# Initialize TensorBoard writer
-writer = SummaryWriter(log_dir="./ppo_ashtachamma_tensorboard/")
+callbacks = [checkpoint_callback]
+if args.profile_env:
+    from ashtachamma_callbacks import EnvTimingCallback
+    callbacks.append(EnvTimingCallback(log_freq=10000))  # Where the environment time goes, per phase
 
 # Train the agent
-print("Training the model...")
-model.learn(total_timesteps=7500000, callback=checkpoint_callback)  # Train the model for 7.5M timesteps
-print("Training completed!")
+logger.info("Training the model...")
+model.learn(total_timesteps=7500000, callback=callbacks)  # Train the model for 7.5M timesteps
+logger.info("Training completed!")
+
+def predict(obs, deterministic, vec_env=env):
+    """
+    Predict the agent's action in every game of `vec_env`, only considering pawns that can move when training
+    with --maskable.
+    """
+    if args.maskable:
+        return model.predict(obs, deterministic=deterministic, action_masks=get_action_masks(vec_env))
+    return model.predict(obs, deterministic=deterministic)
+
 
 # Save and load the model
 model.save("ashtachamma_ppo_agent")  # Save the trained model to disk
 model = PPO.load("ashtachamma_ppo_agent")  # Load the model back for evaluation
 
-# Evaluate the policy
-print("Evaluating the policy...")
-obs = env.reset()  # Reset the environment
+# Evaluate the policy, playing --eval-envs games at once so that every step is one batched forward pass
+logger.info("Evaluating the policy...")
+from torch.utils.tensorboard import SummaryWriter  # Only needed for the evaluation logs
+writer = SummaryWriter(log_dir="./ppo_ashtachamma_tensorboard/")  # Initialize TensorBoard writer
 n_eval_episodes = 500  # Number of episodes for evaluation
-for episode in range(n_eval_episodes):
-    done = False
-    episode_reward = 0
-    while not done:
-        action, _ = model.predict(obs, deterministic=False)  # Predict action using the model (non-deterministic)
-        obs, reward, done, info = env.step(action)  # Take a step in the environment
-        episode_reward += reward  # Accumulate the reward
-        if done:
-            obs = env.reset()  # Reset the environment for the next episode
-            print(f"Episode {episode + 1} finished with reward: {episode_reward}")
-
-    # Log the episode reward to TensorBoard
-    writer.add_scalar("Episode Reward", episode_reward, episode)
+eval_env = AshtachammaVecEnv(num_envs=min(args.eval_envs, n_eval_episodes), **env_kwargs)
+# Each game plays an equal share of the episodes, so that short episodes aren't over-represented
+targets = [(n_eval_episodes + i) // eval_env.num_envs for i in range(eval_env.num_envs)]
+counts = [0] * eval_env.num_envs
+episode_rewards = np.zeros(eval_env.num_envs)
+episode = 0
+obs = eval_env.reset()
+while episode < n_eval_episodes:
+    action, _ = predict(obs, deterministic=False, vec_env=eval_env)  # One forward pass for all games
+    obs, reward, done, info = eval_env.step(action)
+    episode_rewards += reward  # Accumulate the rewards
+    for i in np.flatnonzero(done):  # Finished games have already been reset by the vectorized env
+        if counts[i] < targets[i]:
+            counts[i] += 1
+            logger.info("Episode %s finished with reward: %s", episode + 1, episode_rewards[i])
+            writer.add_scalar("Episode Reward", episode_rewards[i], episode)  # Log the episode reward to TensorBoard
+            episode += 1
+        episode_rewards[i] = 0
+eval_env.close()
 
 # Play a single game
-print("Playing a single game...")
+logger.info("Playing a single game...")
+import pygame  # Only needed to slow down the rendered game
 obs = env.reset()  # Reset the environment
 done = False
 
 while not done:
-    action, _ = model.predict(obs, deterministic=False)  # Predict action (non-deterministic)
+    action, _ = predict(obs, deterministic=False)  # Predict action (non-deterministic)
     obs, reward, done, _ = env.step(action)  # Step through the environment
     env.render()  # Render the environment
     pygame.time.delay(500)  # Delay for better visual effect
 
     if done:
-        print("Game over! Resetting environment...")
+        logger.info("Game over! Resetting environment...")
         obs = env.reset()  # Reset the environment when the game is over
 
 # Close the environment
 env.close()  # Clean up resources
-print("Game finished, resources cleaned up!")
+logger.info("Game finished, resources cleaned up!")
@@ -0,0 +1,150 @@
+import functools
+import multiprocessing as mp
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from ashtachamma_env import AshtachammaEnv
+from ashtachamma_subproc_worker import CloudpickleWrapper, view, worker
+
+
+def _shared_array(shape, dtype):
+    """
+    Allocate a zeroed NumPy array in shared memory that child processes inherit.
+
+    Returns:
+    - (raw, array) where raw is the multiprocessing buffer to hand to workers and array is a view of it.
+    """
+    dtype = np.dtype(dtype)
+    raw = mp.RawArray("b", int(np.prod(shape)) * dtype.itemsize)
+    return raw, view(raw, shape, dtype)
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Multi-process VecEnv, like stable-baselines3's SubprocVecEnv, that returns observations through shared memory.
+
+    Each worker process runs `envs_per_worker` environments one after the other. Actions, observations, rewards
+    and done flags live in shared NumPy buffers, so the (4, 50) observations are never pickled through a pipe.
+    The workers copy every observation into shared memory as soon as their environment returns it, so the
+    environments can write their observations into reused buffers (AshtachammaEnv(reuse_obs=True), the default).
+    """
+
+    def __init__(self, env_fn=functools.partial(AshtachammaEnv, reuse_obs=True), num_workers=2, envs_per_worker=1,
+                 start_method=None):
+        """
+        Start the worker processes.
+
+        Parameters:
+        - env_fn (callable): Picklable function or class creating one environment.
+        - num_workers (int): Number of worker processes.
+        - envs_per_worker (int): Number of environments stepped by each worker.
+        - start_method (str): multiprocessing start method; defaults to "fork" where available, else "spawn"
+          (which re-imports the main script, so training scripts would need an `if __name__ == "__main__"` guard).
+        """
+        probe = env_fn()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        self.render_mode = probe.render_mode
+        probe.close()
+
+        self.envs_per_worker = envs_per_worker
+        num_envs = num_workers * envs_per_worker
+        obs_shape, obs_dtype = observation_space.shape, observation_space.dtype
+        buffers = {}
+        buffers["obs"], self._obs = _shared_array((num_envs,) + obs_shape, obs_dtype)
+        buffers["terminal_obs"], self._terminal_obs = _shared_array((num_envs,) + obs_shape, obs_dtype)
+        buffers["rewards"], self._rewards = _shared_array((num_envs,), np.float32)
+        buffers["dones"], self._dones = _shared_array((num_envs,), np.bool_)
+        buffers["actions"], self._actions = _shared_array((num_envs,), np.int64)
+
+        if start_method is None:
+            start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.waiting = False
+        self.closed = False
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for worker_index, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), worker_index * envs_per_worker,
+                    envs_per_worker, num_envs, buffers, obs_shape, obs_dtype)
+            process = ctx.Process(target=worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(num_envs, observation_space, action_space)
+
+    def _local(self, indices):
+        """
+        Group env indices by worker, as {worker_index: [local env indices]}.
+        """
+        if indices is None:
+            indices = range(self.num_envs)
+        elif isinstance(indices, int):
+            indices = [indices]
+        groups = {}
+        for i in indices:
+            groups.setdefault(i // self.envs_per_worker, []).append(i % self.envs_per_worker)
+        return groups
+
+    def reset(self):
+        per_worker = self.envs_per_worker
+        for worker_index, remote in enumerate(self.remotes):
+            span = slice(worker_index * per_worker, (worker_index + 1) * per_worker)
+            remote.send(("reset", (self._seeds[span], self._options[span])))
+        self.reset_infos = [info for remote in self.remotes for info in remote.recv()]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs.copy()
+
+    def step_async(self, actions):
+        self._actions[:] = actions
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [{} for _ in range(self.num_envs)]
+        for worker_index, remote in enumerate(self.remotes):
+            for k, info in remote.recv():
+                infos[worker_index * self.envs_per_worker + k] = info
+        self.waiting = False
+        for i in np.flatnonzero(self._dones):
+            infos[i]["terminal_observation"] = self._terminal_obs[i].copy()
+        # Copy out of shared memory, since the workers overwrite it on the next step
+        return self._obs.copy(), self._rewards.copy(), self._dones.copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        groups = self._local(indices)
+        for worker_index, local_indices in groups.items():
+            self.remotes[worker_index].send(("get_attr", (local_indices, attr_name)))
+        return [value for worker_index in groups for value in self.remotes[worker_index].recv()]
+
+    def set_attr(self, attr_name, value, indices=None):
+        groups = self._local(indices)
+        for worker_index, local_indices in groups.items():
+            self.remotes[worker_index].send(("set_attr", (local_indices, attr_name, value)))
+        for worker_index in groups:
+            self.remotes[worker_index].recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        groups = self._local(indices)
+        for worker_index, local_indices in groups.items():
+            self.remotes[worker_index].send(("env_method", (local_indices, method_name, method_args, method_kwargs)))
+        return [value for worker_index in groups for value in self.remotes[worker_index].recv()]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for local_indices in self._local(indices).values() for _ in local_indices]
@@ -0,0 +1,92 @@
+import pickle
+
+import cloudpickle
+import numpy as np
+
+
+class CloudpickleWrapper:
+    """
+    Pickle a callable with cloudpickle, so that environment factories such as lambdas can be sent to workers.
+
+    Same as stable-baselines3's CloudpickleWrapper, which can't be unpickled without importing stable_baselines3
+    (and so torch) in every worker process.
+    """
+
+    def __init__(self, var):
+        self.var = var
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.var)
+
+    def __setstate__(self, var):
+        self.var = pickle.loads(var)
+
+
+def view(raw, shape, dtype):
+    """
+    View a shared multiprocessing buffer as a NumPy array without copying.
+    """
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def worker(remote, parent_remote, env_fn_wrapper, start, count, num_envs, buffers, obs_shape, obs_dtype):
+    """
+    Run `count` environments in a child process, writing step results straight into shared memory.
+
+    Only small messages travel through the pipe: the command, and the info dicts that are not empty.
+    """
+    parent_remote.close()
+    envs = [env_fn_wrapper.var() for _ in range(count)]
+    obs = view(buffers["obs"], (num_envs,) + obs_shape, obs_dtype)[start:start + count]
+    terminal_obs = view(buffers["terminal_obs"], (num_envs,) + obs_shape, obs_dtype)[start:start + count]
+    rewards = view(buffers["rewards"], (num_envs,), np.float32)[start:start + count]
+    dones = view(buffers["dones"], (num_envs,), np.bool_)[start:start + count]
+    actions = view(buffers["actions"], (num_envs,), np.int64)[start:start + count]
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                infos = []
+                for k, env in enumerate(envs):
+                    observation, reward, terminated, truncated, info = env.step(int(actions[k]))
+                    done = terminated or truncated
+                    if done:
+                        # Save the final observation where the parent can find it, then reset
+                        terminal_obs[k] = observation
+                        info["TimeLimit.truncated"] = truncated and not terminated
+                        observation, _ = env.reset()
+                    obs[k] = observation
+                    rewards[k] = reward
+                    dones[k] = done
+                    if info:
+                        infos.append((k, info))
+                remote.send(infos)
+            elif cmd == "reset":
+                seeds, options = data
+                reset_infos = []
+                for k, env in enumerate(envs):
+                    maybe_options = {"options": options[k]} if options[k] else {}
+                    obs[k], reset_info = env.reset(seed=seeds[k], **maybe_options)
+                    reset_infos.append(reset_info)
+                remote.send(reset_infos)
+            elif cmd == "env_method":
+                local_indices, name, args, kwargs = data
+                remote.send([getattr(envs[k], name)(*args, **kwargs) for k in local_indices])
+            elif cmd == "get_attr":
+                local_indices, name = data
+                remote.send([getattr(envs[k], name) for k in local_indices])
+            elif cmd == "set_attr":
+                local_indices, name, value = data
+                for k in local_indices:
+                    setattr(envs[k], name, value)
+                remote.send(None)
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
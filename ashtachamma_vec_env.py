@@ -0,0 +1,257 @@
+from time import perf_counter
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from ashtachamma_obs import ObservationBuilder
+from ashtachamma_vec_games import NUM_PAWNS, NUM_PLAYERS, OFF_BOARD, POOL, STRATEGIES, VecGames
+from board_updated import HOME_INDEX, PATH_LENGTH
+from env_timings import PhaseTimings
+
+# Phases timed with profile=True; "step" and "reset" cover the whole calls, the other phases are parts of them
+TIMED_PHASES = ("step", "reset", "agent_turns", "opponent_turns", "auto_reset", "observation")
+
+
+class AshtachammaVecEnv(VecGames, VecEnv):
+    """
+    Vectorized Ashta Chamma environment that plays many games at once with NumPy.
+
+    The games are played by VecGames, which computes dice rolls, move legality, captures, the heuristic opponents
+    and reward shaping for all games in one batch. Each step follows the same rules and rewards as
+    AshtachammaEnv.step, and finished games are reset automatically as Stable-Baselines3 expects, so it can be
+    passed to PPO/DQN in place of a DummyVecEnv. The info of a finished game also holds its "game" statistics:
+    the winning seat, the number of turns played and the agent's kills and home arrivals.
+
+    Seats given the "pool" strategy draw a new opponent from an opponent_pool.OpponentPool whenever their game is
+    reset. Every step, the games facing the same frozen checkpoint are batched into one forward pass of it.
+    """
+
+    supports_pool = True
+
+    def __init__(self, num_envs=1024, strategies=("RL", "random", "defensive", "aggressive"), seed=None,
+                 obs_format="padded", roll_first=False, fast_forward=False, extra_turns=False,
+                 dice="d6", profile=False, opponent_pool=None):
+        """
+        Initialize the vectorized environment.
+
+        Parameters:
+        - num_envs (int): Number of games simulated in parallel.
+        - strategies (sequence of str): Strategy of each seat. Seat 0 is driven by the agent's actions when it is
+          "RL"; the other seats use "random", "aggressive" or "defensive", or "pool" for an opponent drawn from
+          opponent_pool in every game. Without an "RL" seat the env can only be used to simulate() games.
+        - seed (int): Optional seed for the dice and the random strategy.
+        - obs_format (str): Observation encoding, one of ashtachamma_obs.OBS_FORMATS (see AshtachammaEnv).
+        - roll_first (bool): Roll each game's next turn before emitting the observation (see AshtachammaEnv).
+        - fast_forward (bool): Play the opponents' turns within each step, so that every step is a move of seat 0.
+        - extra_turns (bool): Give a player another turn after rolling a 4 or 8 or capturing a pawn.
+        - dice (str or tuple): Outcome distribution of the dice (see AshtachammaEnv).
+        - profile (bool): Time the phases of step() and reset() (see TIMED_PHASES), reported by get_timings().
+        - opponent_pool (opponent_pool.OpponentPool): Opponents of the "pool" seats.
+        """
+        if roll_first and obs_format != "features":
+            raise ValueError(f"roll_first needs an observation that includes the roll, use obs_format='features' "
+                             f"instead of {obs_format!r}")
+        if "pool" in strategies and opponent_pool is None:
+            raise ValueError(f"Seats with the 'pool' strategy need an opponent_pool, got strategies {strategies}")
+        self.opponent_pool = opponent_pool
+        self._pool_seats = [seat for seat, strategy in enumerate(strategies) if strategy == "pool"]
+        self._opponent_ids = np.zeros((num_envs, NUM_PLAYERS), dtype=np.intp)  # Pool opponent of each seat
+        self._opponents = {}  # Opponent id -> opponent, for the ids some game is playing against
+        self._seat_builders = {}  # Observation format -> builder of the frozen checkpoints' observations
+        VecGames.__init__(self, num_envs, strategies=strategies, seed=seed, roll_first=roll_first,
+                          extra_turns=extra_turns, dice=dice)
+        self.render_mode = None
+        self.fast_forward = fast_forward
+        self._actions = None
+        self._obs_builder = ObservationBuilder(obs_format, batch_shape=(num_envs,), max_roll=self.dice.max_roll)
+        self._obs_pawns = np.empty_like(self.pawns)  # Pawn offsets with HOME_INDEX for pawns that are home
+        self.timings = PhaseTimings(TIMED_PHASES) if profile else None
+        VecEnv.__init__(self, num_envs, self._obs_builder.observation_space, spaces.Discrete(NUM_PAWNS))
+
+    def _get_obs(self, rows=None, out=None):
+        """
+        Build the observation batch, laid out like AshtachammaEnv._get_state().
+
+        Parameters:
+        - rows (np.ndarray): Only encode these games, into `out`. By default every game is encoded into the
+          observation builder's buffers.
+        - out (np.ndarray): Array receiving the observations of `rows`.
+        """
+        pawns = self._obs_pawns
+        np.copyto(pawns, self.pawns)
+        pawns[pawns == OFF_BOARD] = HOME_INDEX
+        if rows is None:
+            return self._obs_builder.build(pawns, self.current_player, self.last_roll)
+        return self._obs_builder.build(pawns[rows], self.current_player[rows], self.last_roll[rows], out=out)
+
+    def reset(self):
+        """
+        Reset every game and return the batch of initial observations.
+        """
+        if self.timings is not None:
+            start = perf_counter()
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+            self.dice.seed(self.rng)
+        self._reset_seeds()
+        self._reset_options()
+        self.restart_games(self._rows)
+        obs = self._get_obs()
+        if self.timings is not None:
+            self.timings.lap("reset", start)
+        return obs
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        """
+        Play one turn in every game: the agent's move where seat 0 is to play, a heuristic move elsewhere.
+        With fast_forward, keep playing the opponents' turns until seat 0 is to move again in every game.
+        """
+        timings = self.timings
+        if timings is not None:
+            step_start = start = perf_counter()
+        rewards, won = self.play_turns(self._actions)
+        if timings is not None:
+            start = timings.lap("agent_turns", start)
+        if self.fast_forward:
+            self.play_opponents(won)
+            if timings is not None:
+                start = timings.lap("opponent_turns", start)
+
+        # Auto-reset finished games
+        infos = [{} for _ in range(self.num_envs)]
+        if won.any():
+            done_rows = self._rows[won]
+            terminal_obs = np.empty((len(done_rows),) + self.observation_space.shape,
+                                    dtype=self.observation_space.dtype)
+            self._get_obs(done_rows, out=terminal_obs)
+            for i, observation in zip(done_rows, terminal_obs):
+                infos[i]["terminal_observation"] = observation
+                infos[i]["TimeLimit.truncated"] = False
+                infos[i]["game"] = {"winner": int(self.current_player[i]), "turns": int(self.turns[i]),
+                                    "kills": int(self.kills[i, 0]), "arrivals": int(self.scores[i, 0])}
+            if self._pool_seats:
+                self.opponent_pool.update(self._opponent_ids[np.ix_(done_rows, self._pool_seats)],
+                                          (self.current_player[done_rows] == 0)[:, None])
+            self.restart_games(done_rows)
+            if timings is not None:
+                start = timings.lap("auto_reset", start)
+        obs = self._get_obs()
+        if timings is not None:
+            timings.lap("observation", start)
+            timings.lap("step", step_start)
+        return obs, rewards, won, infos
+
+    def _reset_games(self, rows):
+        """
+        Put the pawns of the given games back on their start squares, and draw the opponents of their "pool" seats.
+        """
+        VecGames._reset_games(self, rows)
+        if not self._pool_seats:
+            return
+        pool = self.opponent_pool
+        seats = np.ix_(rows, self._pool_seats)
+        self._opponent_ids[seats] = opponent_ids = pool.sample((len(rows), len(self._pool_seats)), rng=self.rng)
+        in_use = np.unique(self._opponent_ids[:, self._pool_seats])
+        self._opponents = {i: self._opponents[i] if i in self._opponents else pool.get(i) for i in in_use}
+        strategy = {i: STRATEGIES.index(self._opponents[i]) if isinstance(self._opponents[i], str) else POOL
+                    for i in np.unique(opponent_ids)}  # Heuristic opponents play as that strategy in this game
+        self._strategy[seats] = np.vectorize(strategy.__getitem__, otypes=[int])(opponent_ids)
+
+    def _opponent_choices(self, rows, player, roll, action_masks):
+        """
+        Pick the pawns of the "pool" seats to move, with one batched forward pass per frozen checkpoint. Each seat
+        sees the board as the agent sees it from seat 0, with the seats rotated.
+
+        Parameters:
+        - rows (np.ndarray): Games where a "pool" seat is to move.
+        - player (np.ndarray): The seat to move in each of them.
+        - roll (np.ndarray): The roll each seat's observation shows.
+        - action_masks (np.ndarray): (n, 2) valid pawns of each seat, as the agent's action masks.
+
+        Returns:
+        - np.ndarray of pawn indices.
+        """
+        seats = (player[:, None] + np.arange(NUM_PLAYERS)) % NUM_PLAYERS  # Seat order from the mover's point of view
+        pawns = self.pawns[rows[:, None], seats]
+        pawns[pawns == OFF_BOARD] = HOME_INDEX
+        opponent_ids = self._opponent_ids[rows, player]
+        choices = np.empty(len(rows), dtype=np.intp)
+        for opponent_id in np.unique(opponent_ids):
+            group = opponent_ids == opponent_id
+            opponent = self._opponents[opponent_id]
+            builder = self._seat_builders.get(opponent.obs_format)
+            if builder is None:
+                builder = self._seat_builders[opponent.obs_format] = ObservationBuilder(
+                    opponent.obs_format, max_roll=self.dice.max_roll)
+            space = builder.observation_space
+            obs = builder.build(pawns[group], 0, roll[group],
+                                out=np.empty((int(group.sum()),) + space.shape, dtype=space.dtype))
+            choices[group] = opponent.act(obs, action_masks[group])
+        return choices
+
+    def action_masks(self):
+        """
+        Get the valid actions of every game, as in AshtachammaEnv.action_masks().
+
+        Returns:
+        - np.ndarray of shape (num_envs, 2) with True for valid actions.
+        """
+        own = self.pawns[:, 0]  # Only seat 0 is driven by the agent
+        mask = own != OFF_BOARD
+        if self.roll_first:
+            mask &= own + self.last_roll[:, None] < PATH_LENGTH
+        mask[(self.current_player != 0) | ~mask.any(axis=1)] = True
+        return mask
+
+    def get_timings(self, reset=False):
+        """
+        Get the time spent in each phase of step() and reset(), as AshtachammaEnv.get_timings() does for all games.
+        """
+        return None if self.timings is None else self.timings.snapshot(reset)
+
+    def close(self):
+        pass
+
+    def _indices(self, indices):
+        """
+        Convert a VecEnv indices argument into a list of game indices.
+        """
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        """
+        Return an attribute of the vectorized environment once per requested game. Attributes are shared by all
+        games, so every game reports the same value.
+        """
+        value = getattr(self, attr_name)
+        return [value for _ in self._indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        """
+        Set an attribute of the vectorized environment. Attributes are shared by all games, so `indices` must
+        select every game: setting one for only some of them would silently change the others too.
+        """
+        if sorted(set(self._indices(indices))) != list(range(self.num_envs)):
+            raise ValueError(f"AshtachammaVecEnv attributes are shared by all games, can't set {attr_name!r} for "
+                             f"only some of them")
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """
+        Call a method once per requested game. Only action_masks is supported, which is what MaskablePPO calls.
+        """
+        if method_name == "action_masks":
+            masks = self.action_masks()
+            return [masks[i] for i in self._indices(indices)]
+        raise NotImplementedError(f"AshtachammaVecEnv has no per-game environments to call {method_name} on")
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._indices(indices)]
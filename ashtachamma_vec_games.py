@@ -0,0 +1,261 @@
+import numpy as np
+
+from dice import Dice
+from board_updated import (BOARD_SIZE, CELL_DISTANCE, CENTRE_DISTANCE, EXTRA_TURN_ROLLS, HOME_INDEX, NEIGHBOUR_CELLS,
+                           PATH_CELLS, PATH_LENGTH, SAFE_CELLS)
+
+NUM_PLAYERS = 4
+NUM_PAWNS = 2
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+OFF_BOARD = -1  # Path offset stored for pawns that reached home
+STRATEGIES = ("RL", "random", "aggressive", "defensive", "pool")
+RL, RANDOM, AGGRESSIVE, DEFENSIVE, POOL = range(len(STRATEGIES))
+
+# NumPy versions of the board_updated lookup tables. Each gets one extra trailing entry: a pawn at OFF_BOARD (-1)
+# indexes the last path entry, which maps to the sentinel cell NUM_CELLS that is never safe, adjacent or close.
+_PATH_CELLS = np.array([cells + (NUM_CELLS,) for cells in PATH_CELLS], dtype=np.intp)  # (player, offset) -> cell
+_SAFE = np.array(SAFE_CELLS + (False,))
+_CENTRE_DISTANCE = np.array(CENTRE_DISTANCE + (0,))
+_CELL_DISTANCE = np.full((NUM_CELLS + 1, NUM_CELLS + 1), -1)
+_CELL_DISTANCE[:NUM_CELLS, :NUM_CELLS] = CELL_DISTANCE
+_ADJACENT = np.zeros((NUM_CELLS + 1, NUM_CELLS + 1), dtype=bool)
+for _cell, _neighbours in enumerate(NEIGHBOUR_CELLS):
+    _ADJACENT[_cell, list(_neighbours)] = True
+_SEATS = np.arange(NUM_PLAYERS)[None, :, None]
+
+
+class VecGames:
+    """
+    Many Ashta Chamma games played at once with NumPy, without the Gym/Stable-Baselines3 interface.
+
+    Every game is stored as rows of NumPy arrays instead of Board/StrategicPlayer objects, and dice rolls, move
+    legality, captures, the heuristic players and reward shaping are computed for all games in one batch. Only
+    NumPy is imported, so searches can use simulate() for rollouts without loading torch; AshtachammaVecEnv adds
+    observations, auto-resets and the VecEnv interface on top.
+    """
+
+    # Whether the class can seat "pool" opponents, which needs an _opponent_choices(rows, player, roll,
+    # action_masks) method picking their pawns from observations (see AshtachammaVecEnv)
+    supports_pool = False
+
+    def __init__(self, num_envs=1024, strategies=("RL", "random", "defensive", "aggressive"), seed=None,
+                 roll_first=False, extra_turns=False, dice="d6"):
+        """
+        Initialize the games.
+
+        Parameters:
+        - num_envs (int): Number of games simulated in parallel.
+        - strategies (sequence of str): Strategy of each seat. Seat 0 is driven by the agent's actions when it is
+          "RL"; the other seats use "random", "aggressive" or "defensive", or "pool" for an opponent drawn from an
+          opponent pool in subclasses that support it (supports_pool). Without an "RL" seat the games can only be
+          used to simulate() games.
+        - seed (int): Optional seed for the dice and the random strategy.
+        - roll_first (bool): Roll each game's next turn ahead of the move, so it can be shown to the agent.
+        - extra_turns (bool): Give a player another turn after rolling a 4 or 8 or capturing a pawn.
+        - dice (str or tuple): Outcome distribution of the dice (see AshtachammaEnv).
+        """
+        unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown strategies {unknown}, expected some of {STRATEGIES}")
+        if "RL" in strategies[1:]:
+            raise ValueError(f"Only seat 0 can be played by the RL agent, got strategies {strategies}")
+        if "pool" in strategies and not self.supports_pool:
+            raise ValueError(f"{type(self).__name__} can't seat opponents from a pool, got strategies {strategies}")
+
+        self.num_envs = num_envs
+        self.strategies = tuple(strategies)
+        self.roll_first = roll_first
+        self.extra_turns = extra_turns
+        # Strategy of each seat of each game; a "pool" seat can play a different opponent in every game
+        self._strategy = np.tile(np.array([STRATEGIES.index(strategy) for strategy in strategies]), (num_envs, 1))
+        self.rng = np.random.default_rng(seed)
+        self.dice = Dice(dice, rng=self.rng)
+
+        # Game state, one row per game
+        self.pawns = np.empty((num_envs, NUM_PLAYERS, NUM_PAWNS), dtype=np.int16)  # Path offsets, OFF_BOARD once home
+        self.scores = np.empty((num_envs, NUM_PLAYERS), dtype=np.int8)
+        self.current_player = np.empty(num_envs, dtype=np.intp)
+        self.last_roll = np.zeros(num_envs, dtype=np.int8)
+        self.last_choice = np.zeros(num_envs, dtype=np.int8)  # Pawn chosen on the most recent turn
+        self.turns = np.empty(num_envs, dtype=np.int32)  # Turns played so far, by any seat
+        self.kills = np.empty((num_envs, NUM_PLAYERS), dtype=np.int16)  # Pawns each player has captured
+        self._rows = np.arange(num_envs)
+        self._reset_games(self._rows)
+
+    def _reset_games(self, rows):
+        """
+        Put the pawns of the given games back on their start squares.
+        """
+        self.pawns[rows] = np.arange(NUM_PAWNS, dtype=np.int16)  # Start squares are path offsets 0 and 1
+        self.scores[rows] = 0
+        self.current_player[rows] = 0
+        self.last_roll[rows] = 0
+        self.turns[rows] = 0
+        self.kills[rows] = 0
+
+    def _play_turns(self, rows, actions=None):
+        """
+        Play the current player's turn in some of the games.
+
+        Parameters:
+        - rows (np.ndarray): Indices of the games to play.
+        - actions (np.ndarray): The agent's pawn choice in every game, used where seat 0 is to play.
+
+        Returns:
+        - rewards (np.ndarray): float32 reward of seat 0's move in each of the games (0 for other seats), whether
+          the agent or a heuristic strategy chose it.
+        - won (np.ndarray): Whether the player who moved won, for each of the games.
+        """
+        n = len(rows)
+        index = np.arange(n)
+        pawns = self.pawns[rows]  # Written back once the moves are applied
+        player = self.current_player[rows]
+        strategy = self._strategy[rows, player]
+        is_pool = strategy == POOL
+        if self.roll_first:
+            roll = self.last_roll[rows].astype(np.intp)  # Rolled when the previous observations were emitted
+        else:
+            shown_roll = self.last_roll[rows] if is_pool.any() else None  # What the observations showed
+            roll = self.dice.rolls(n)  # Same dice as Board.diceRoll
+            self.last_roll[rows] = roll
+
+        # Candidate moves for both pawns of the player to move
+        own = pawns[index, player].astype(np.intp)  # (n, 2)
+        dest = own + roll[:, None]
+        legal = (own != OFF_BOARD) & (dest < PATH_LENGTH)
+        dest_cell = _PATH_CELLS[player[:, None], np.where(legal, dest, OFF_BOARD)]  # Sentinel cell when illegal
+        opponent = _SEATS != player[:, None, None]  # (n, 4, 1)
+        opponent_cells = np.where(opponent, _PATH_CELLS[_SEATS, pawns], NUM_CELLS).reshape(n, -1)  # (n, 8)
+        kill = legal & ~_SAFE[dest_cell] & (dest_cell[:, :, None] == opponent_cells[:, None, :]).any(axis=2)
+        threatened = _ADJACENT[dest_cell[:, :, None], opponent_cells[:, None, :]].any(axis=2)
+        home = legal & (dest == HOME_INDEX)
+
+        # Pick a pawn per game, mirroring StrategicPlayer.decide_move for the heuristic seats
+        first_legal = legal.argmax(axis=1)
+        choice = first_legal
+        coin = self.rng.integers(0, NUM_PAWNS, size=n)
+        choice = np.where((strategy == RANDOM) & legal.all(axis=1), coin, choice)
+        choice = np.where((strategy == AGGRESSIVE) & kill.any(axis=1), kill.argmax(axis=1), choice)
+        safe = legal & ~threatened
+        defensive = np.where(home.any(axis=1), home.argmax(axis=1),
+                             np.where(safe.any(axis=1), safe.argmax(axis=1), first_legal))
+        choice = np.where(strategy == DEFENSIVE, defensive, choice)
+        is_rl = strategy == RL
+        if is_rl.any():
+            action = np.asarray(actions, dtype=np.intp).reshape(self.num_envs)[rows]
+            action = np.where(own[index, action] == OFF_BOARD, 1 - action, action)  # Home pawns can't be chosen
+            choice = np.where(is_rl, action, choice)
+        if is_pool.any():
+            mask = legal[is_pool] if self.roll_first else own[is_pool] != OFF_BOARD  # As AshtachammaEnv.action_masks
+            mask[~mask.any(axis=1)] = True
+            action = self._opponent_choices(rows[is_pool], player[is_pool],
+                                            roll[is_pool] if self.roll_first else shown_roll[is_pool], mask)
+            action = np.where(own[index[is_pool], action] == OFF_BOARD, 1 - action, action)
+            choice[is_pool] = action
+        self.last_choice[rows] = choice
+        moved = legal[index, choice]
+
+        # Apply the chosen moves, sending captured opponent pawns (one per opponent) back to start
+        old_cell = _PATH_CELLS[player, own[index, choice]]
+        new_offset = dest[index, choice]
+        new_cell = dest_cell[index, choice]
+        killed = moved & kill[index, choice]
+        captured = opponent_cells.reshape(n, NUM_PLAYERS, NUM_PAWNS) == new_cell[:, None, None]
+        captured &= killed[:, None, None]
+        captured[:, :, 1] &= ~captured[:, :, 0]
+        pawns[captured] = 0
+        reached = moved & (new_offset == HOME_INDEX)
+        pawns[index[moved], player[moved], choice[moved]] = np.where(reached, OFF_BOARD, new_offset)[moved]
+        self.pawns[rows] = pawns
+        self.scores[rows[reached], player[reached]] += 1
+        self.kills[rows[killed], player[killed]] += 1
+        self.turns[rows] += 1
+        won = self.scores[rows, player] >= 2
+
+        # Reward shaping for the agent's moves, as in AshtachammaEnv.step
+        opponent_cells = np.where(opponent, _PATH_CELLS[_SEATS, pawns], NUM_CELLS).reshape(n, -1)
+        at_risk = (_CELL_DISTANCE[new_cell[:, None], opponent_cells] == 6).sum(axis=1)
+        shaped = (1.5 * (_CENTRE_DISTANCE[new_cell] < _CENTRE_DISTANCE[old_cell])  # Progress reward
+                  + 5 * reached  # Home reward
+                  + 1 * _SAFE[new_cell]  # Safe zone reward
+                  - 0.8 * at_risk  # Risk penalty
+                  + 2 * killed  # Kill reward
+                  + 10 * won)  # Winning reward
+        rewards = np.where(player == 0, np.where(moved, shaped, -0.1), 0.0).astype(np.float32)
+
+        # Advance to the next player, unless the game is over or the player earned another turn
+        stay = won
+        if self.extra_turns:
+            stay = stay | killed | np.isin(roll, EXTRA_TURN_ROLLS)
+        self.current_player[rows] = np.where(stay, player, (player + 1) % NUM_PLAYERS)
+        if self.roll_first:
+            self.last_roll[rows] = self.dice.rolls(n)  # Roll for the turn each observation shows
+        return rewards, won
+
+    def play_turns(self, actions=None):
+        """
+        Play the current player's turn in every game.
+
+        Parameters:
+        - actions (np.ndarray): The agent's pawn choice in every game, used where an "RL" seat 0 is to play.
+
+        Returns:
+        - rewards (np.ndarray): float32 reward of seat 0's move in each game (0 where another seat moved).
+        - won (np.ndarray): Whether the player who moved won, for each game.
+        """
+        return self._play_turns(self._rows, actions)
+
+    def play_opponents(self, won):
+        """
+        Play the opponents' turns until seat 0 is to move again in every game that isn't over.
+
+        Parameters:
+        - won (np.ndarray): Whether each game is over, updated with the games the opponents win.
+        """
+        pending = self._rows[(self.current_player != 0) & ~won]
+        while len(pending):
+            _, opponent_won = self._play_turns(pending)
+            won[pending] = opponent_won
+            pending = pending[(self.current_player[pending] != 0) & ~opponent_won]
+
+    def restart_games(self, rows):
+        """
+        Start new games in the given rows, e.g. those that are over, rolling their first turn with roll_first.
+
+        Parameters:
+        - rows (np.ndarray): Indices of the games to restart.
+        """
+        self._reset_games(rows)
+        if self.roll_first:
+            self.last_roll[rows] = self.dice.rolls(len(rows))
+
+    def simulate(self, pawns, current_player, max_turns=10000):
+        """
+        Play games from the given positions to the end with the seats' strategies, e.g. as MCTS rollouts.
+        Every seat must use a heuristic strategy. The first len(pawns) games of the batch are overwritten.
+
+        Parameters:
+        - pawns (np.ndarray): (n, 4, 2) path offsets of each position's pawns, OFF_BOARD for pawns at home.
+        - current_player (np.ndarray): (n,) seat to move in each position.
+        - max_turns (int): Give up on games still running after this many turns.
+
+        Returns:
+        - np.ndarray of shape (n,) with the winning seat of each game, -1 if it reached max_turns.
+        """
+        if np.isin(self._strategy, (RL, POOL)).any():
+            raise ValueError("simulate() needs a heuristic strategy in every seat, got " + str(self.strategies))
+        n = len(pawns)
+        rows = self._rows[:n]
+        self.pawns[rows] = pawns
+        self.scores[rows] = (self.pawns[rows] == OFF_BOARD).sum(axis=2)
+        self.current_player[rows] = current_player
+        if self.roll_first:
+            self.last_roll[rows] = self.dice.rolls(n)
+        winners = np.full(n, -1)
+        for _ in range(max_turns):
+            if not len(rows):
+                break
+            _, won = self._play_turns(rows)
+            winners[rows[won]] = self.current_player[rows[won]]
+            rows = rows[~won]
+        return winners
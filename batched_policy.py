@@ -0,0 +1,178 @@
+import collections
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+_STOP = object()  # Queued by close() to stop the inference thread
+LATENCY_WINDOW = 100000  # Most recent latencies kept for the p95 of stats()
+
+
+class BatchedPolicy:
+    """
+    Share one Stable-Baselines3 policy between many concurrently running games.
+
+    Every model.predict() call pays the torch dispatch overhead whatever the batch size, so a game asking for one
+    action at a time wastes most of a forward pass. Games running in their own threads call predict() instead,
+    which queues the observation and waits: a background thread takes the first pending request, keeps collecting
+    until it has max_batch_size of them or max_wait seconds have passed, runs them through the policy in one
+    batched forward pass and hands every game its action. A larger max_wait fills bigger batches (throughput) at
+    the cost of each game waiting longer for its move (latency); stats() reports both.
+    """
+
+    def __init__(self, model, max_batch_size=256, max_wait=0.002, deterministic=True):
+        """
+        Start the inference thread.
+
+        Parameters:
+        - model: Trained PPO, DQN or MaskablePPO model, or a numpy_policy.NumpyPolicy.
+        - max_batch_size (int): Most observations run through the policy at once.
+        - max_wait (float): Seconds to wait for more requests after the first one of a batch arrives.
+        - deterministic (bool): Whether to pick the most likely action instead of sampling one.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.deterministic = deterministic
+        # MaskablePPO (or a NumpyPolicy exported from one) takes the masks of the pawns that can move
+        self.maskable = getattr(model, "maskable", "action_masks" in inspect.signature(model.predict).parameters)
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self._thread = threading.Thread(target=self._serve, name="BatchedPolicy", daemon=True)
+        self._thread.start()
+
+    def submit(self, obs, action_mask=None):
+        """
+        Queue one observation for the next batch without waiting for it.
+
+        Parameters:
+        - obs (np.ndarray): Observation of a single game.
+        - action_mask (np.ndarray): Boolean mask of the pawns that can move, used by maskable models.
+
+        Returns:
+        - concurrent.futures.Future resolving to the action (int).
+        """
+        future = Future()
+        self._requests.put((obs, action_mask, future, time.perf_counter()))
+        return future
+
+    def predict(self, obs, action_mask=None):
+        """
+        Get the action for one observation, waiting for the batch it is part of.
+
+        Returns:
+        - int: The chosen action.
+        """
+        return self.submit(obs, action_mask).result()
+
+    def predict_batch(self, obs, action_masks=None):
+        """
+        Run a batch of observations through the policy right away, in the calling thread.
+
+        Parameters:
+        - obs (np.ndarray): Observations stacked along the first axis.
+        - action_masks (np.ndarray): (n, 2) boolean masks, used by maskable models.
+
+        Returns:
+        - np.ndarray of actions.
+        """
+        if self.maskable and action_masks is not None:
+            actions, _ = self.model.predict(obs, deterministic=self.deterministic, action_masks=action_masks)
+        else:
+            actions, _ = self.model.predict(obs, deterministic=self.deterministic)
+        return actions
+
+    def close(self):
+        """
+        Stop the inference thread once the requests queued so far are served.
+        """
+        self._requests.put(_STOP)
+        self._thread.join()
+
+    def reset_stats(self):
+        """
+        Clear the counters reported by stats().
+        """
+        with self._lock:
+            self._batches = 0
+            self._served = 0
+            self._latency_sum = 0.0
+            self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+            self._started = time.perf_counter()
+
+    def stats(self):
+        """
+        Report throughput and latency since the last reset_stats().
+
+        Returns:
+        - dict with requests, batches, mean_batch (requests per forward pass), throughput (requests per second)
+          and mean / p95 latency (seconds from submit() to the action being ready, the p95 over the most recent
+          LATENCY_WINDOW requests).
+        """
+        with self._lock:
+            latencies = np.array(self._latencies)
+            elapsed = time.perf_counter() - self._started
+            return {
+                "requests": self._served,
+                "batches": self._batches,
+                "mean_batch": self._served / self._batches if self._batches else 0.0,
+                "throughput": self._served / elapsed if elapsed > 0 else 0.0,
+                "mean_latency": self._latency_sum / self._served if self._served else 0.0,
+                "p95_latency": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            }
+
+    def _collect(self, first):
+        """
+        Gather a batch starting with `first`, until it is full or max_wait has passed.
+
+        Returns:
+        - (batch, stop) where stop is True when close() was called.
+        """
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _serve(self):
+        """
+        Inference thread: run queued observations through the policy in batches until close().
+        """
+        stop = False
+        while not stop:
+            first = self._requests.get()
+            if first is _STOP:
+                break
+            batch, stop = self._collect(first)
+            try:
+                obs = np.stack([request[0] for request in batch])
+                masks = None
+                if self.maskable and any(request[1] is not None for request in batch):
+                    masks = np.stack([np.ones(2, dtype=bool) if request[1] is None else request[1]
+                                      for request in batch])
+                actions = self.predict_batch(obs, masks).tolist()
+            except Exception as error:  # Hand the error to every waiting game instead of hanging them
+                for request in batch:
+                    request[2].set_exception(error)
+                continue
+
+            done = time.perf_counter()
+            latencies = [done - request[3] for request in batch]
+            with self._lock:
+                self._batches += 1
+                self._served += len(batch)
+                self._latency_sum += sum(latencies)
+                self._latencies.extend(latencies)
+            for request, action in zip(batch, actions):
+                request[2].set_result(int(action))
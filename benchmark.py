@@ -0,0 +1,451 @@
+"""
+Micro-benchmarks for the Ashta Chamma environment.
+
+Usage:
+    python benchmark.py resets [--n N]
+    python benchmark.py steps [--n N]
+    python benchmark.py vec [--num-envs N] [--n N]
+    python benchmark.py workers [--workers 1 2 4 8] [--envs-per-worker N] [--n N]
+    python benchmark.py logging [--n N]
+    python benchmark.py render [--n N]
+    python benchmark.py obs [--n N] [--buffer-size N]
+    python benchmark.py fast-forward [--n N] [--num-envs N]
+    python benchmark.py dice [--n N]
+    python benchmark.py mcts [--simulations N] [--batch-sizes 1 16 64 256]
+    python benchmark.py inference [--n N] [--games 1 4 16 64] [--max-waits 0.0005 0.002 0.01]
+    python benchmark.py startup [--repeats N] [--workers N]
+"""
+import argparse
+import logging
+import os
+import random
+import time
+
+import numpy as np
+
+from ashtachamma_env import AshtachammaEnv
+
+# Modules timed by the startup benchmark, and the heavy dependencies it reports them loading
+STARTUP_MODULES = ("board_updated", "feat_StrategicPlayers_updated", "ashtachamma_vec_games", "ashtachamma_env",
+                   "expectimax", "mcts", "tournament", "numpy_policy", "ashtachamma_vec_env")
+HEAVY_MODULES = ("gymnasium", "pygame", "torch", "stable_baselines3")
+
+
+def _rate(fn, n):
+    """
+    Call fn() n times and return the number of calls per second.
+    """
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+
+def bench_resets(n):
+    """
+    Compare env.reset() throughput for the headless board against the old behaviour,
+    where every new Board initialized pygame and (re)created the display surface.
+    """
+    env = AshtachammaEnv()
+    headless = _rate(env.reset, n)
+
+    import pygame
+    from board_renderer import BoardRenderer
+
+    def reset_with_display():
+        env.reset()
+        pygame.init()
+        pygame.display.set_mode(BoardRenderer.screen_size(env.board))
+
+    with_display = _rate(reset_with_display, n)
+    pygame.quit()
+
+    print(f"reset() with display (before): {with_display:12.1f} resets/s")
+    print(f"reset() headless (after):      {headless:12.1f} resets/s")
+    print(f"speedup:                       {headless / with_display:12.1f}x")
+
+
+def _step_rate(env, n):
+    """
+    Time n env.step() calls with random pawn choices, resetting finished games.
+    """
+    env.reset(seed=0)
+    random.seed(0)
+
+    def step():
+        _, _, terminated, _, _ = env.step(random.randrange(2))
+        if terminated:
+            env.reset()
+
+    return _rate(step, n)
+
+
+def bench_steps(n):
+    """
+    Measure env.step() throughput with random pawn choices, and env._get_state() throughput
+    on a mid-game position.
+    """
+    env = AshtachammaEnv()
+    steps = _step_rate(env, n)
+    states = _rate(env._get_state, n)
+
+    print(f"step():       {steps:12.1f} steps/s")
+    print(f"_get_state(): {states:12.1f} calls/s")
+
+
+def bench_vec(num_envs, n):
+    """
+    Measure AshtachammaVecEnv throughput in env steps (games x turns) per second.
+    """
+    from ashtachamma_vec_env import AshtachammaVecEnv
+
+    env = AshtachammaVecEnv(num_envs=num_envs, seed=0)
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 2, size=num_envs)
+    rate = _rate(lambda: env.step(actions), max(n // num_envs, 1)) * num_envs
+
+    print(f"AshtachammaVecEnv({num_envs} games): {rate:12.1f} env steps/s")
+
+
+def bench_workers(workers, envs_per_worker, n):
+    """
+    Measure rollout throughput of SharedMemoryVecEnv for several worker counts, next to stable-baselines3's
+    SubprocVecEnv, which pickles every observation through a pipe.
+    """
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from ashtachamma_subproc_env import SharedMemoryVecEnv
+
+    print(f"{'workers':>8} {'envs':>6} {'SubprocVecEnv':>16} {'SharedMemoryVecEnv':>20}")
+    for num_workers in workers:
+        num_envs = num_workers * envs_per_worker
+        actions = np.random.default_rng(0).integers(0, 2, size=num_envs)
+        rates = []
+        for env in (SubprocVecEnv([AshtachammaEnv] * num_envs, start_method="fork"),
+                    SharedMemoryVecEnv(num_workers=num_workers, envs_per_worker=envs_per_worker)):
+            env.reset()
+            rates.append(_rate(lambda: env.step(actions), max(n // num_envs, 1)) * num_envs)
+            env.close()
+        print(f"{num_workers:>8} {num_envs:>6} {rates[0]:>12.1f} st/s {rates[1]:>16.1f} st/s")
+
+
+def bench_logging(n):
+    """
+    Compare env.step() throughput with every move logged at DEBUG level to a file (as the old per-move print()
+    calls did to training logs) against the default log_moves=False hot path.
+    """
+    handler = logging.FileHandler(os.devnull)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    logged = _step_rate(AshtachammaEnv(log_moves=True), n)
+    root.removeHandler(handler)
+    root.setLevel(logging.WARNING)
+    silent = _step_rate(AshtachammaEnv(), n)
+
+    print(f"step() logging every move: {logged:12.1f} steps/s")
+    print(f"step() log_moves=False:    {silent:12.1f} steps/s")
+    print(f"speedup:                   {silent / logged:12.1f}x")
+
+
+def bench_render(n):
+    """
+    Measure frames per second for the "rgb_array" and "human" render modes while a game is played.
+    Set SDL_VIDEODRIVER=dummy to time the "human" mode without a display.
+    """
+    variants = [
+        ("rgb_array", {}),
+        ("rgb_array", {"reuse_frame": True}),
+        ("rgb_array", {"render_size": 84}),
+        ("human", {}),
+    ]
+    for render_mode, options in variants:
+        env = AshtachammaEnv(render_mode=render_mode, **options)
+        env.reset(seed=0)
+        random.seed(0)
+
+        def frame():
+            _, _, terminated, _, _ = env.step(random.randrange(2))
+            if terminated:
+                env.reset()
+            env.render()
+
+        rate = _rate(frame, n)
+        env.close()
+        label = f"render_mode={render_mode!r} " + " ".join(f"{key}={value}" for key, value in options.items())
+        print(f"{label:45} {rate:12.1f} frames/s")
+
+
+def bench_obs(n, buffer_size):
+    """
+    Compare the observation formats: bytes per observation, the size of a DQN replay buffer holding
+    buffer_size transitions (SB3 stores both obs and next_obs), and env._get_state() throughput.
+    """
+    from ashtachamma_obs import OBS_FORMATS
+
+    print(f"{'format':>10} {'shape':>10} {'dtype':>8} {'bytes':>6} {'replay buffer':>14} {'_get_state()':>16}")
+    for obs_format in OBS_FORMATS:
+        env = AshtachammaEnv(obs_format=obs_format)
+        env.reset(seed=0)
+        for _ in range(30):
+            env.step(0)
+        space = env.observation_space
+        nbytes = int(np.prod(space.shape)) * space.dtype.itemsize
+        replay_mb = 2 * buffer_size * nbytes / 2 ** 20
+        rate = _rate(env._get_state, n)
+        print(f"{obs_format:>10} {str(space.shape):>10} {str(space.dtype):>8} {nbytes:>6} {replay_mb:>11.1f} MB "
+              f"{rate:>9.1f} calls/s")
+
+
+def bench_fast_forward(n, num_envs):
+    """
+    Compare agent decisions per second with and without fast_forward, for AshtachammaEnv and AshtachammaVecEnv.
+    Without it, only the steps where seat 0 is to move are decisions of the agent; the rest are opponent turns
+    whose action is ignored but still end up in rollouts and replay buffers.
+    """
+    from ashtachamma_vec_env import AshtachammaVecEnv
+
+    print(f"{'env':>18} {'fast_forward':>13} {'steps/s':>12} {'decisions/s':>13}")
+    for fast_forward in (False, True):
+        env = AshtachammaEnv(fast_forward=fast_forward)
+        env.reset(seed=0)
+        random.seed(0)
+        decisions = 0
+        start = time.perf_counter()
+        for _ in range(n):
+            decisions += env.current_player_index == 0
+            _, _, terminated, _, _ = env.step(random.randrange(2))
+            if terminated:
+                env.reset()
+        elapsed = time.perf_counter() - start
+        print(f"{'AshtachammaEnv':>18} {fast_forward!s:>13} {n / elapsed:>12.1f} {decisions / elapsed:>13.1f}")
+
+        env = AshtachammaVecEnv(num_envs=num_envs, seed=0, fast_forward=fast_forward)
+        env.reset()
+        actions = np.random.default_rng(0).integers(0, 2, size=num_envs)
+        steps = max(n // num_envs, 1)
+        decisions = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            decisions += np.count_nonzero(env.current_player == 0)
+            env.step(actions)
+        elapsed = time.perf_counter() - start
+        print(f"{'AshtachammaVecEnv':>18} {fast_forward!s:>13} {steps * num_envs / elapsed:>12.1f} "
+              f"{decisions / elapsed:>13.1f}")
+
+
+def bench_dice(n):
+    """
+    Compare single-roll throughput of the old random.choices() die against Dice, which serves rolls from
+    blocks pre-generated by a NumPy Generator, and against calling the Generator once per roll.
+    """
+    from dice import Dice
+
+    faces = [1, 2, 3, 4, 5, 6]
+    dice = Dice("d6", rng=0)
+    generator = np.random.default_rng(0)
+    variants = [
+        ("random.choices()", lambda: random.choices(population=faces, k=1)[0]),
+        ("Generator.integers() per roll", lambda: int(generator.integers(1, 7))),
+        ("Dice.roll()", dice.roll),
+    ]
+    for label, fn in variants:
+        print(f"{label:32} {_rate(fn, n):14.1f} rolls/s")
+    print(f"{'Dice.rolls(1024)':32} {_rate(lambda: dice.rolls(1024), max(n // 1024, 1)) * 1024:14.1f} rolls/s")
+
+
+def bench_mcts(simulations, batch_sizes):
+    """
+    Time MCTS simulations per second from the opening position for several rollout batch sizes.
+    """
+    from expectimax import game_state
+    from mcts import MCTSSearch
+
+    env = AshtachammaEnv()
+    env.reset(seed=0)
+    state = game_state(env.players)
+    for batch_size in batch_sizes:
+        search = MCTSSearch(simulations=simulations, batch_size=batch_size, seed=0)
+        search.search(state, 0, 3)
+        print(f"batch size {batch_size:5d}: {search.simulations_done} simulations in {search.elapsed:.2f}s, "
+              f"{search.simulations_per_second:10.1f} simulations/s")
+
+
+def bench_inference(n, games, max_waits):
+    """
+    Compare one model.predict() per decision with BatchedPolicy serving games that run concurrently in threads,
+    reporting throughput (decisions per second) against latency (time a game waits for its action).
+    """
+    import threading
+
+    from stable_baselines3 import PPO
+
+    from batched_policy import BatchedPolicy
+
+    model = PPO("MlpPolicy", AshtachammaEnv(), device="cpu")  # Untrained: inference cost doesn't depend on weights
+    env = AshtachammaEnv(fast_forward=True)
+    obs, _ = env.reset(seed=0)
+
+    def predict_step():
+        nonlocal obs
+        action, _ = model.predict(obs, deterministic=True)
+        obs, _, terminated, _, _ = env.step(action)
+        if terminated:
+            obs, _ = env.reset()
+
+    print(f"{'model.predict() per decision':44} {_rate(predict_step, n):10.1f} decisions/s")
+
+    for max_wait in max_waits:
+        for num_games in games:
+            policy = BatchedPolicy(model, max_batch_size=num_games, max_wait=max_wait)
+
+            def play(seed):
+                game = AshtachammaEnv(fast_forward=True)
+                game_obs, _ = game.reset(seed=seed)
+                for _ in range(n // num_games):
+                    game_obs, _, terminated, _, _ = game.step(policy.predict(game_obs))
+                    if terminated:
+                        game_obs, _ = game.reset()
+
+            threads = [threading.Thread(target=play, args=(seed,)) for seed in range(num_games)]
+            policy.reset_stats()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            stats = policy.stats()
+            policy.close()
+            label = f"BatchedPolicy {num_games:3d} games, max wait {max_wait * 1000:g} ms"
+            print(f"{label:44} {stats['throughput']:10.1f} decisions/s  batch {stats['mean_batch']:6.1f}  "
+                  f"latency mean {stats['mean_latency'] * 1000:6.2f} ms  p95 {stats['p95_latency'] * 1000:6.2f} ms")
+
+
+def _noop():
+    """
+    Empty task used to time process pool startup.
+    """
+
+
+def bench_startup(repeats, workers):
+    """
+    Time importing each module in a fresh interpreter, listing the heavy dependencies it pulls in, then time
+    starting worker processes with each multiprocessing start method.
+    """
+    import multiprocessing as mp
+    import subprocess
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+
+    from ashtachamma_subproc_env import SharedMemoryVecEnv
+
+    code = ("import sys, time; start = time.perf_counter(); import {}; elapsed = time.perf_counter() - start; "
+            "print(elapsed, *[name for name in {!r} if name in sys.modules])")
+    print(f"{'module':30} {'import':>10}  heavy dependencies loaded")
+    for module in STARTUP_MODULES:
+        runs = [subprocess.run([sys.executable, "-c", code.format(module, HEAVY_MODULES)], capture_output=True,
+                               text=True, check=True, env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"},
+                               cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+                for _ in range(repeats)]
+        elapsed = min(float(run[0]) for run in runs)
+        print(f"{module:30} {elapsed * 1000:8.1f} ms  {', '.join(runs[0][1:]) or '-'}")
+
+    print(f"\nStarting {workers} workers (until every worker has answered)")
+    for start_method in ("fork", "forkserver", "spawn"):
+        if start_method not in mp.get_all_start_methods():
+            continue
+        start = time.perf_counter()
+        env = SharedMemoryVecEnv(num_workers=workers, start_method=start_method)
+        env.reset()
+        vec_env_time = time.perf_counter() - start
+        env.close()
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context(start_method),
+                                 initializer=__import__, initargs=("tournament",)) as pool:
+            for future in [pool.submit(_noop) for _ in range(workers)]:
+                future.result()
+        pool_time = time.perf_counter() - start
+        print(f"{start_method:>10}: SharedMemoryVecEnv {vec_env_time * 1000:8.1f} ms   "
+              f"tournament process pool {pool_time * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ashta Chamma environment benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    resets = subparsers.add_parser("resets", help="env.reset() throughput")
+    resets.add_argument("--n", type=int, default=2000, help="Number of resets to time")
+
+    steps = subparsers.add_parser("steps", help="env.step() and env._get_state() throughput")
+    steps.add_argument("--n", type=int, default=50000, help="Number of calls to time")
+
+    vec = subparsers.add_parser("vec", help="AshtachammaVecEnv throughput")
+    vec.add_argument("--num-envs", type=int, default=1024, help="Number of games in the vectorized env")
+    vec.add_argument("--n", type=int, default=1000000, help="Number of env steps to time")
+
+    workers = subparsers.add_parser("workers", help="Multi-process rollout scaling")
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to time")
+    workers.add_argument("--envs-per-worker", type=int, default=4, help="Environments stepped by each worker")
+    workers.add_argument("--n", type=int, default=50000, help="Number of env steps to time per worker count")
+
+    logging_parser = subparsers.add_parser("logging", help="env.step() throughput with and without move logging")
+    logging_parser.add_argument("--n", type=int, default=50000, help="Number of steps to time")
+
+    render = subparsers.add_parser("render", help="env.render() frame rate")
+    render.add_argument("--n", type=int, default=500, help="Number of frames to time")
+
+    obs = subparsers.add_parser("obs", help="Observation format memory use and throughput")
+    obs.add_argument("--n", type=int, default=100000, help="Number of _get_state() calls to time per format")
+    obs.add_argument("--buffer-size", type=int, default=1000000, help="DQN replay buffer size to size up")
+
+    fast_forward = subparsers.add_parser("fast-forward", help="Agent decisions per second with fast_forward")
+    fast_forward.add_argument("--n", type=int, default=50000, help="Number of steps to time")
+    fast_forward.add_argument("--num-envs", type=int, default=1024, help="Number of games in the vectorized env")
+
+    dice = subparsers.add_parser("dice", help="Dice roll throughput")
+    dice.add_argument("--n", type=int, default=1000000, help="Number of rolls to time")
+
+    mcts = subparsers.add_parser("mcts", help="MCTS simulations per second by rollout batch size")
+    mcts.add_argument("--simulations", type=int, default=1024, help="Simulations per search")
+    mcts.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64, 256],
+                      help="Rollouts played out together in one vectorized simulation")
+
+    inference = subparsers.add_parser("inference", help="Batched policy inference throughput and latency")
+    inference.add_argument("--n", type=int, default=20000, help="Number of decisions to time per setting")
+    inference.add_argument("--games", type=int, nargs="+", default=[1, 4, 16, 64],
+                           help="Numbers of games played at once in threads")
+    inference.add_argument("--max-waits", type=float, nargs="+", default=[0.0005, 0.002, 0.01],
+                           help="Seconds BatchedPolicy waits to fill a batch")
+
+    startup = subparsers.add_parser("startup", help="Module import time and worker process start time")
+    startup.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per module; the best is kept")
+    startup.add_argument("--workers", type=int, default=4, help="Number of worker processes to start")
+
+    args = parser.parse_args()
+    if args.benchmark == "resets":
+        bench_resets(args.n)
+    elif args.benchmark == "steps":
+        bench_steps(args.n)
+    elif args.benchmark == "vec":
+        bench_vec(args.num_envs, args.n)
+    elif args.benchmark == "workers":
+        bench_workers(args.workers, args.envs_per_worker, args.n)
+    elif args.benchmark == "logging":
+        bench_logging(args.n)
+    elif args.benchmark == "render":
+        bench_render(args.n)
+    elif args.benchmark == "obs":
+        bench_obs(args.n, args.buffer_size)
+    elif args.benchmark == "fast-forward":
+        bench_fast_forward(args.n, args.num_envs)
+    elif args.benchmark == "dice":
+        bench_dice(args.n)
+    elif args.benchmark == "mcts":
+        bench_mcts(args.simulations, args.batch_sizes)
+    elif args.benchmark == "inference":
+        bench_inference(args.n, args.games, args.max_waits)
+    elif args.benchmark == "startup":
+        bench_startup(args.repeats, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 # import pygame
-import random
+from board_updated import PATHS, PATH_INDEX
+from dice import Dice
 
 class Board:
-    def __init__(self):
+    def __init__(self, dice=None):
         self.board_size = 9  # 9x9 board
         self.safe_places = [(1, 4), (2, 2), (2, 6), (4, 1), (4, 4), (4, 7), (6, 2), (6, 6), (7, 4)]
         self.home_places = [(0, 4), (4, 0), (8, 4), (4, 8)]
@@ -11,18 +12,8 @@ class Board:
         self.current_player_index = 0
         self.cell_size = 60
         self.padding = 20
-        self.paths = [[(0,4), (1,4), (1,3), (1,2), (1,1), (2,1), (3,1), (4,1), (5,1), (6,1), (7,1), (7,2), (7,3), (7,4), (7,5), (7,6), (7,7), (6,7), (5,7), (4,7), (3,7), (2,7), (1,7), (1,6), (1,5), 
-          (2,6), (3,6), (4,6), (5,6), (6,6), (6,5), (6,4), (6,3), (6,2), (5,2), (4,2), (3,2), (2,2), (2,3), (2,4), (2,5),  (3,5), (4,5), (5,5), (5,4), (5,3), (4,3), (3,3),(3,4), (4,4)],
-		
-		 [(4,0), (4,1), (5,1), (6,1), (7,1), (7,2), (7,3), (7,4), (7,5), (7,6), (7,7), (6,7), (5,7), (4,7), (3,7), (2,7), (1,7), (1,6), (1,5), (1,4), (1,3), (1,2), (1,1), (2,1), (3,1), 
-		  (2,2), (2,3), (2,4), (2,5), (2,6), (3,6), (4,6), (5,6), (6,6), (6,5), (6,4), (6,3), (6,2), (5,2), (4,2), (3,2), (3,3),(3,4), (3,5), (4,5), (5,5), (5,4), (5,3), (4,3), (4,4)],
-
-		 [(8,4), (7,4), (7,5), (7,6), (7,7), (6,7), (5,7), (4,7), (3,7), (2,7), (1,7), (1,6), (1,5), (1,4), (1,3), (1,2), (1,1), (2,1), (3,1), (4,1), (5,1), (6,1), (7,1), (7,2), (7,3), 
-          (6,2), (5,2), (4,2), (3,2), (2,2), (2,3), (2,4), (2,5), (2,6), (3,6), (4,6), (5,6), (6,6), (6,5), (6,4), (6,3), (5,3), (4,3),(3,3),(3,4), (3,5), (4,5), (5,5), (5,4), (4,4)],
-			
-		 [(4,8), (4,7), (3,7), (2,7), (1,7), (1,6), (1,5), (1,4), (1,3), (1,2), (1,1), (2,1), (3,1), (4,1), (5,1), (6,1), (7,1), (7,2), (7,3), (7,4), (7,5), (7,6), (7,7), (6,7), (5,7),
-          (6,6), (6,5), (6,4), (6,3), (6,2), (5,2), (4,2), (3,2), (2,2), (2,3), (2,4), (2,5), (2,6), (3,6), (4,6), (5,6), (5,5), (5,4), (5,3), (4,3), (3,3),(3,4), (3,5), (4,5), (4,4)] 
-		]
+        self.paths = PATHS  # Shared with board_updated, along with the PATH_INDEX lookup table
+        self.dice = Dice("cowries") if dice is None else dice
         # pygame.init()
         # self.screen = pygame.display.set_mode((self.board_size * self.cell_size + 2 * self.padding,
                                             #    self.board_size * self.cell_size + 2 * self.padding))
@@ -37,13 +28,10 @@ class Board:
 
     def diceRoll(self):
         """
-        Simulate a dice roll with weighted probabilities.
-        Possible outcomes are 1, 2, 3, 4, and 8.
+        Roll the board's dice (by default cowries with equally likely outcomes 1, 2, 3, 4, and 8).
         :return: The number rolled on the dice.
         """
-        possibleNumbers = [1, 2, 3, 4, 8]
-        number = random.choices(population=possibleNumbers, k=1)[0]
-        return number
+        return self.dice.roll()
     def _next_player(self):
         """
         Switch to the next player's turn.
@@ -67,7 +55,7 @@ class Board:
             if pawn_position is None:
                 continue  # Skip if the pawn is inactive
             # print(pawn_position)
-            current_position = possible_path.index(pawn_position)
+            current_position = PATH_INDEX[player_id][pawn_position]
             new_position_index = current_position + dice_number
 
             if new_position_index < len(possible_path):
@@ -0,0 +1,224 @@
+import os
+
+import numpy as np
+import pygame
+
+CROSS_ICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "icons", "cross.png")
+PAWN_RADIUS = 10
+
+
+class BoardRenderer:
+    """
+    Pygame renderer for an Ashta Chamma board.
+
+    The renderer is kept apart from the game rules in board_updated.Board so that
+    training never initializes pygame or opens a display. It is only created when
+    something actually needs to be drawn.
+
+    The board itself never changes, so it is drawn once into a cached background
+    surface; each frame only blits that background and draws the pawns.
+    """
+
+    def __init__(self, caption="Ashta Chamma", size=None):
+        """
+        Initialize the renderer.
+
+        Parameters:
+        - caption (str): Window title used when a display window is opened.
+        - size (int): Side length in pixels of rgb_array frames, e.g. 84 for pixel-based agents.
+          None keeps the full board resolution.
+        """
+        self.caption = caption
+        self.size = size
+        self.window = None  # Display surface, opened on the first call to show()
+        self.background = None  # Static board image, drawn on first use
+        self.dirty_rects = []  # Areas covered by pawns in the last frame shown in the window
+
+        # rgb_array state, prepared on the first call to rgb_array()
+        self.frame = None  # Reused (height, width, 3) frame buffer
+        self._board_image = None  # Background as a NumPy image at the output size
+        self._disc = None  # Boolean mask of the pixels covered by a pawn
+        self._corners = None  # [player][offset] -> (y, x) top-left corner of the pawn's disc in the frame
+
+    @staticmethod
+    def screen_size(board):
+        """
+        Get the pixel size of the rendered board.
+
+        Parameters:
+        - board (Board): The board being rendered.
+
+        Returns:
+        - (width, height) tuple in pixels.
+        """
+        size = board.board_size * board.cell_size + 2 * board.padding
+        return size, size
+
+    def get_background(self, board):
+        """
+        Get the static board image, drawing it the first time it is needed.
+
+        Parameters:
+        - board (Board): The board being rendered.
+
+        Returns:
+        - pygame.Surface with the empty board.
+        """
+        if self.background is None:
+            self.background = self._draw_board(board)
+        return self.background
+
+    def _draw_board(self, board):
+        """
+        Draw the empty board, loading and scaling the safe-square icon once.
+        """
+        surface = pygame.Surface(self.screen_size(board))
+        surface.fill((0, 0, 0))  # Fill the background with black
+        cross = pygame.transform.scale(pygame.image.load(CROSS_ICON), (53, 53))
+        home_colors = [(255, 255, 255), (200, 200, 200), (180, 180, 180), (220, 220, 220)]
+
+        for i in range(board.board_size):
+            for j in range(board.board_size):
+                rect = pygame.Rect(
+                    board.padding + j * board.cell_size,
+                    board.padding + i * board.cell_size,
+                    board.cell_size,
+                    board.cell_size
+                )
+
+                # Check if the cell is a safe place
+                if (i, j) in board.safe_places:
+                    pygame.draw.rect(surface, (240, 207, 174), rect)
+                    surface.blit(cross, rect.topleft)  # Draw the cross icon in the safe place
+                # Check if the cell is a home place
+                elif (i, j) in board.home_places:
+                    pygame.draw.rect(surface, home_colors[board.home_places.index((i, j))], rect)
+                else:
+                    pygame.draw.rect(surface, (240, 207, 174), rect)
+
+                pygame.draw.rect(surface, (255, 255, 255), rect, 2)  # Border
+        return surface
+
+    def draw_pawns(self, surface, board):
+        """
+        Draw every pawn still in play onto a surface.
+
+        Parameters:
+        - surface (pygame.Surface): The surface to draw on.
+        - board (Board): The board holding the players to draw.
+
+        Returns:
+        - List of the pygame.Rect areas that were drawn.
+        """
+        rects = []
+        for player in board.players:
+            for offset in player.pawns:
+                if offset is None:
+                    continue
+                # Convert the pawn's path offset to grid coordinates, then to pixel coordinates
+                row, col = board.position(player.player_id, offset)
+                pawn_position = (board.padding + col * board.cell_size + board.cell_size // 2,  # X coordinate
+                                 board.padding + row * board.cell_size + board.cell_size // 2)  # Y coordinate
+                rects.append(pygame.draw.circle(surface, player.color, pawn_position, PAWN_RADIUS))
+        return rects
+
+    def draw(self, surface, board):
+        """
+        Draw the board and the current positions of all pawns onto a surface.
+
+        Parameters:
+        - surface (pygame.Surface): The surface to draw on.
+        - board (Board): The board holding the players to draw.
+
+        Returns:
+        - List of the pygame.Rect areas covered by pawns.
+        """
+        surface.blit(self.get_background(board), (0, 0))
+        return self.draw_pawns(surface, board)
+
+    def show(self, board):
+        """
+        Draw the board into a display window, opening the window on first use.
+
+        After the first frame only the areas under the previous and current pawns are
+        redrawn and pushed to the display.
+
+        Parameters:
+        - board (Board): The board to draw.
+        """
+        if self.window is None:
+            pygame.init()
+            self.window = pygame.display.set_mode(self.screen_size(board))
+            pygame.display.set_caption(self.caption)
+            self.dirty_rects = self.draw(self.window, board)
+            pygame.display.flip()
+            return
+
+        background = self.get_background(board)
+        for rect in self.dirty_rects:
+            self.window.blit(background, rect, rect)  # Restore the board under the old pawns
+        rects = self.draw_pawns(self.window, board)
+        pygame.display.update(self.dirty_rects + rects)
+        self.dirty_rects = rects
+
+    def _prepare_frames(self, board):
+        """
+        Convert the background to a NumPy image at the output size and precompute where every pawn is painted.
+        """
+        full_size = self.screen_size(board)[0]
+        size = self.size or full_size
+        background = self.get_background(board)
+        if size != full_size:
+            background = pygame.transform.smoothscale(background, (size, size))
+        self._board_image = pygame.surfarray.array3d(background).transpose(1, 0, 2).copy()  # (height, width, 3)
+        self.frame = np.empty_like(self._board_image)
+
+        scale = size / full_size
+        radius = max(1, round(PAWN_RADIUS * scale))
+        y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+        self._disc = x * x + y * y <= radius * radius
+        half_cell = board.cell_size // 2
+        self._corners = [
+            [(int((board.padding + row * board.cell_size + half_cell) * scale) - radius,
+              int((board.padding + col * board.cell_size + half_cell) * scale) - radius)
+             for row, col in path]
+            for path in board.paths
+        ]
+
+    def rgb_array(self, board):
+        """
+        Paint the current frame with NumPy and return it as an image.
+
+        The pawns are painted onto a copy of the cached board image inside a preallocated
+        frame buffer, so no pygame Surface is created or redrawn per frame.
+
+        Parameters:
+        - board (Board): The board to draw.
+
+        Returns:
+        - np.ndarray of shape (height, width, 3). This is the renderer's frame buffer, which
+          the next call overwrites; copy it to keep it.
+        """
+        if self.frame is None:
+            self._prepare_frames(board)
+        frame = self.frame
+        np.copyto(frame, self._board_image)
+        disc = self._disc
+        width = disc.shape[0]
+        for player in board.players:
+            corners = self._corners[player.player_id]
+            for offset in player.pawns:
+                if offset is None:
+                    continue
+                y, x = corners[offset]
+                frame[y:y + width, x:x + width][disc] = player.color
+        return frame
+
+    def close(self):
+        """
+        Close the display window if one was opened.
+        """
+        if self.window is not None:
+            pygame.quit()
+            self.window = None
+            self.dirty_rects = []
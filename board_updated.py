@@ -1,40 +1,70 @@
-import pygame
-import random
+from dice import Dice
+
+BOARD_SIZE = 9  # 9x9 board
+SAFE_PLACES = [(1, 4), (2, 2), (2, 6), (4, 1), (4, 4), (4, 7), (6, 2), (6, 6), (7, 4)]
+HOME_PLACES = [(4, 8), (8, 4), (4, 0), (0, 4)]
+
+# Path of board positions each player's pawns follow, from their start square to the centre
+PATHS = [
+    [(0, 4), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3),
+     (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5),
+     (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (6, 5), (6, 4), (6, 3), (6, 2), (5, 2), (4, 2), (3, 2), (2, 2),
+     (2, 3), (2, 4), (2, 5), (3, 5), (4, 5), (5, 5), (5, 4), (5, 3), (4, 3), (3, 3), (3, 4), (4, 4)],
+
+    [(4, 0), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7),
+     (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1),
+     (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (6, 5), (6, 4), (6, 3), (6, 2),
+     (5, 2), (4, 2), (3, 2), (3, 3), (3, 4), (3, 5), (4, 5), (5, 5), (5, 4), (5, 3), (4, 3), (4, 4)],
+
+    [(8, 4), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5),
+     (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3),
+     (6, 2), (5, 2), (4, 2), (3, 2), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6),
+     (6, 5), (6, 4), (6, 3), (5, 3), (4, 3), (3, 3), (3, 4), (3, 5), (4, 5), (5, 5), (5, 4), (4, 4)],
+
+    [(4, 8), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1),
+     (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7),
+     (6, 6), (6, 5), (6, 4), (6, 3), (6, 2), (5, 2), (4, 2), (3, 2), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6),
+     (3, 6), (4, 6), (5, 6), (5, 5), (5, 4), (5, 3), (4, 3), (3, 3), (3, 4), (3, 5), (4, 5), (4, 4)]
+]
+
+PATH_LENGTH = len(PATHS[0])
+HOME_INDEX = PATH_LENGTH - 1  # Path offset of the central square (4, 4)
+EXTRA_TURN_ROLLS = (4, 8)  # Rolls that earn another turn, as does capturing a pawn
+
+# Lookup tables built once at import, so the rules never scan a path with list.index().
+# Pawns are stored as integer path offsets; a board square is identified by its cell id row * BOARD_SIZE + col.
+PATH_INDEX = [{position: index for index, position in enumerate(path)} for path in PATHS]  # position -> offset
+PATH_CELLS = [tuple(row * BOARD_SIZE + col for row, col in path) for path in PATHS]  # offset -> cell id
+SAFE_CELLS = tuple((cell // BOARD_SIZE, cell % BOARD_SIZE) in SAFE_PLACES for cell in range(BOARD_SIZE * BOARD_SIZE))
+PATH_SAFE = [tuple(SAFE_CELLS[cell] for cell in cells) for cells in PATH_CELLS]  # offset -> safe square?
+CENTRE_DISTANCE = tuple(abs(cell // BOARD_SIZE - 4) + abs(cell % BOARD_SIZE - 4)
+                        for cell in range(BOARD_SIZE * BOARD_SIZE))  # Manhattan distance to (4, 4)
+CELL_DISTANCE = tuple(tuple(abs(a // BOARD_SIZE - b // BOARD_SIZE) + abs(a % BOARD_SIZE - b % BOARD_SIZE)
+                            for b in range(BOARD_SIZE * BOARD_SIZE))
+                      for a in range(BOARD_SIZE * BOARD_SIZE))  # Manhattan distance between two cells
+NEIGHBOUR_CELLS = tuple(frozenset(row * BOARD_SIZE + col
+                                  for row, col in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1))
+                                  if 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE)
+                        for r in range(BOARD_SIZE) for c in range(BOARD_SIZE))  # Cells sharing an edge
+
 
 class Board:
-    def __init__(self):
-        self.board_size = 9  # 9x9 board
-        self.safe_places = [(1, 4), (2, 2), (2, 6), (4, 1), (4, 4), (4, 7), (6, 2), (6, 6), (7, 4)]
-        self.home_places = [(4, 8), (8, 4), (4, 0), (0, 4)]
+    def __init__(self, dice=None):
+        """
+        Set up an empty board.
+        :param dice: Dice object to roll; defaults to an unseeded six-sided die
+        """
+        self.board_size = BOARD_SIZE
+        self.safe_places = SAFE_PLACES
+        self.home_places = HOME_PLACES
         # self.board_state = [[None for _ in range(self.board_size)] for _ in range(self.board_size)]
         self.players = []  # List of Player objects
         self.cell_size = 60
         self.padding = 20
-        self.paths = [
-            [(0, 4), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3),
-             (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5),
-             (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (6, 5), (6, 4), (6, 3), (6, 2), (5, 2), (4, 2), (3, 2), (2, 2),
-             (2, 3), (2, 4), (2, 5), (3, 5), (4, 5), (5, 5), (5, 4), (5, 3), (4, 3), (3, 3), (3, 4), (4, 4)],
-
-            [(4, 0), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7),
-             (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1),
-             (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (6, 5), (6, 4), (6, 3), (6, 2),
-             (5, 2), (4, 2), (3, 2), (3, 3), (3, 4), (3, 5), (4, 5), (5, 5), (5, 4), (5, 3), (4, 3), (4, 4)],
-
-            [(8, 4), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5),
-             (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3),
-             (6, 2), (5, 2), (4, 2), (3, 2), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6),
-             (6, 5), (6, 4), (6, 3), (5, 3), (4, 3), (3, 3), (3, 4), (3, 5), (4, 5), (5, 5), (5, 4), (4, 4)],
-
-            [(4, 8), (4, 7), (3, 7), (2, 7), (1, 7), (1, 6), (1, 5), (1, 4), (1, 3), (1, 2), (1, 1), (2, 1), (3, 1),
-             (4, 1), (5, 1), (6, 1), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7), (6, 7), (5, 7),
-             (6, 6), (6, 5), (6, 4), (6, 3), (6, 2), (5, 2), (4, 2), (3, 2), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6),
-             (3, 6), (4, 6), (5, 6), (5, 5), (5, 4), (5, 3), (4, 3), (3, 3), (3, 4), (3, 5), (4, 5), (4, 4)]
-            ]
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.board_size * self.cell_size + 2 * self.padding,
-                                               self.board_size * self.cell_size + 2 * self.padding))
-        pygame.display.set_caption("Ashta Chamma")
+        self.paths = PATHS
+        self.renderer = None  # Created on the first render() call, so the rules never touch pygame
+        self.dice = Dice("d6") if dice is None else dice
+
     def add_player(self, player):
         """
         Add a player to the game.
@@ -44,59 +74,88 @@ class Board:
 
     def diceRoll(self):
         """
-        Simulate a dice roll with weighted probabilities.
-        Possible outcomes are 1, 2, 3, 4, and 8.
+        Roll the board's dice (by default a six-sided die, outcomes 1 to 6).
         :return: The number rolled on the dice.
         """
-        possibleNumbers = [1, 2, 3, 4, 5, 6]
-        number = random.choices(population=possibleNumbers, k=1)[0]
-        return number
-
-    def move(self, player, pawn_index, roll):
-        """Move a pawn for the player, based on the dice roll."""
-        print(f"Player {player.player_id} rolled a {roll}")
-
-        current_pos = player.pawns[pawn_index]
-        # Ensure the current position is valid
-        if current_pos not in self.paths[player.player_id]:
-            print("Error: Pawn is not on the board!")
-            return current_pos
-
-        while True:
-            current_pos_index = self.paths[player.player_id].index(current_pos)
-            new_pos_index = current_pos_index + roll
-
-            # Handle out of bounds move
-            if new_pos_index >= len(self.paths[player.player_id]):
-                print("Move out of bounds!Re-rolling")
-                roll = self.diceRoll()
-                print(f"Player {player.player_id} re-rolled a {roll}")
-            else:
-                # Update the new position
-                new_position = self.paths[player.player_id][new_pos_index]
-                player.kill = False  # Reset kill flag
-
-                # Check if the position is occupied by another pawn
-                for opponent in self.players:
-                    if opponent != player:
-                        if new_position in opponent.pawns:
-                            if new_position not in self.safe_places:
-                                # Kill the opponent's pawn
-                                killed_pawn_index = opponent.pawns.index(new_position)
-                                player.kill = True
-                                # Reset opponent pawn to their start position
-                                opponent.pawns[killed_pawn_index] = self.paths[opponent.player_id][0]  # Reset to start position
-
-                # Update the player's pawn position
-                # player.update_position(pawn_index, new_position)
-                return new_position
+        return self.dice.roll()
+
+    def position(self, player_id, offset):
+        """
+        Convert a pawn's path offset to its (row, col) board position, e.g. for rendering.
+        :param player_id: ID of the player owning the pawn
+        :param offset: Path offset of the pawn
+        :return: (row, col) tuple
+        """
+        return PATHS[player_id][offset]
+
+    def legal_moves(self, player, roll):
+        """
+        List every move the player can make with the given roll, without changing the game.
+        :param player: Player object whose turn it is
+        :param roll: The number rolled on the dice
+        :return: List of (player_id, kill, pawn_index, new_offset) tuples, where new_offset is the pawn's
+                 path offset after the move and kill is True when the move captures an opponent's pawn
+        """
+        cells = PATH_CELLS[player.player_id]
+        safe = PATH_SAFE[player.player_id]
+        moves = []
+        for pawn_index, offset in enumerate(player.pawns):
+            if offset is None:
+                continue  # Pawn already reached home
+            new_offset = offset + roll
+            if new_offset >= PATH_LENGTH:
+                continue  # Pawns must reach the centre exactly
+            kill = False
+            if not safe[new_offset]:
+                kill = self._occupant(player, cells[new_offset]) is not None
+            moves.append((player.player_id, kill, pawn_index, new_offset))
+        return moves
+
+    def apply_move(self, move):
+        """
+        Play a move returned by legal_moves, sending any captured opponent pawns back to start.
+        :param move: (player_id, kill, pawn_index, new_offset) tuple
+        :return: The new path offset of the moved pawn
+        """
+        player_id, kill, pawn_index, new_offset = move
+        player = self.players[player_id]
+        if kill:
+            cell = PATH_CELLS[player_id][new_offset]
+            for opponent in self.players:
+                if opponent is player:
+                    continue
+                opponent_cells = PATH_CELLS[opponent.player_id]
+                for killed_pawn_index, offset in enumerate(opponent.pawns):
+                    if offset is not None and opponent_cells[offset] == cell:
+                        opponent.pawns[killed_pawn_index] = 0  # Reset opponent pawn to their start position
+                        break
+        player.kill = kill
+        player.pawns[pawn_index] = new_offset
+        return new_offset
+
+    def _occupant(self, player, cell):
+        """
+        Find an opponent pawn standing on a cell.
+        :param player: Player object whose opponents are searched
+        :param cell: Cell id (row * BOARD_SIZE + col)
+        :return: (opponent, pawn_index) tuple, or None if the cell holds no opponent pawn
+        """
+        for opponent in self.players:
+            if opponent is player:
+                continue
+            opponent_cells = PATH_CELLS[opponent.player_id]
+            for pawn_index, offset in enumerate(opponent.pawns):
+                if offset is not None and opponent_cells[offset] == cell:
+                    return opponent, pawn_index
+        return None
+
     def check_winner(self,chosen_move):
         """
         Check if any player has moved all their pawns to their home.
         :return: The player who won, or None if no winner yet.
         """
         player_id,_,pawn_no,_ = chosen_move
-        if self.players[player_id].pawns[pawn_no] == (4,4):
+        if self.players[player_id].pawns[pawn_no] == HOME_INDEX:
             self.players[player_id].pawns[pawn_no] = None
             self.players[player_id].score += 1
 
@@ -108,46 +167,9 @@ class Board:
     def render(self, screen):
         """
         Render the board and the current positions of all pawns.
+        :param screen: pygame surface to draw on
         """
-        screen.fill((0, 0, 0))  # Fill the background with black
-
-        # Draw the board
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                rect = pygame.Rect(
-                    self.padding + j * self.cell_size,
-                    self.padding + i * self.cell_size,
-                    self.cell_size,
-                    self.cell_size
-                )
-
-                # Check if the cell is a safe place
-                if (i, j) in self.safe_places:
-                    pygame.draw.rect(screen, (240, 207, 174), rect)
-                    cross = pygame.image.load("assets/icons/cross.png")
-                    cross = pygame.transform.scale(cross, (53, 53))
-                    screen.blit(cross, rect.topleft)  # Draw the cross icon in the safe place
-                # Check if the cell is a home place
-                elif (i, j) in self.home_places:
-                    home_color_index = self.home_places.index((i, j))
-                    home_colors = [(255, 255, 255), (200, 200, 200), (180, 180, 180), (220, 220, 220)]
-                    pygame.draw.rect(screen, home_colors[home_color_index], rect)
-                else:
-                    pygame.draw.rect(screen, (240, 207, 174), rect)
-
-                pygame.draw.rect(screen, (255, 255, 255), rect, 2)  # Border
-
-        # Render each player's pawns
-        for player in self.players:
-            for pawn in player.pawns:
-                if pawn is None:
-                    continue
-                # Convert pawn position from grid coordinates to pixel coordinates
-                # Assuming pawn is a tuple of (row, col)
-                row, col = pawn
-                pawn_position = (self.padding + col * self.cell_size + self.cell_size // 2,  # X coordinate
-                                 self.padding + row * self.cell_size + self.cell_size // 2)  # Y coordinate
-                pygame.draw.circle(screen, player.color, pawn_position, 10)  # Render pawns as circles
-
-
-
+        if self.renderer is None:
+            from board_renderer import BoardRenderer
+            self.renderer = BoardRenderer()
+        self.renderer.draw(screen, self)
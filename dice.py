@@ -0,0 +1,74 @@
+import numpy as np
+
+# Outcome distributions understood by Dice, as (faces, weights) pairs; weights of None make every face equally likely:
+# - "d6":      the six-sided die of board_updated.Board
+# - "cowries": the 1, 2, 3, 4 and 8 outcomes of board.Board, equally likely
+# - "shells":  four cowrie shells thrown together and counted by how many land mouth up, with none up counting as 8,
+#              so the weights follow the binomial odds of 1 to 4 shells (and of 0 for the 8)
+DICE = {
+    "d6": ((1, 2, 3, 4, 5, 6), None),
+    "cowries": ((1, 2, 3, 4, 8), None),
+    "shells": ((1, 2, 3, 4, 8), (4, 6, 4, 1, 1)),
+}
+
+
+class Dice:
+    """
+    Dice rolls drawn from a numpy.random.Generator.
+
+    Single rolls are served from a block of pre-generated rolls that is refilled in bulk, so rolling costs a
+    list pop instead of a call into the generator. Seeding the generator makes every roll reproducible.
+    """
+
+    def __init__(self, distribution="d6", rng=None, block_size=1024):
+        """
+        Initialize the dice.
+
+        Parameters:
+        - distribution (str or tuple): Name of one of the DICE distributions, or a (faces, weights) pair where
+          weights is None for equally likely faces.
+        - rng (np.random.Generator or int): Generator to draw rolls from, or a seed for a new one.
+        - block_size (int): Number of rolls generated at once by roll().
+        """
+        if isinstance(distribution, str):
+            if distribution not in DICE:
+                raise ValueError(f"Unknown dice {distribution!r}, expected one of {tuple(DICE)}")
+            distribution = DICE[distribution]
+        faces, weights = distribution
+        self.faces = np.array(faces, dtype=np.int64)
+        self.p = None if weights is None else np.asarray(weights, dtype=np.float64) / np.sum(weights)
+        self.max_roll = int(self.faces.max())
+        self.block_size = block_size
+        self.seed(rng)
+
+    def seed(self, rng=None):
+        """
+        Draw the following rolls from a new generator, dropping any pre-generated ones.
+
+        Parameters:
+        - rng (np.random.Generator or int): Generator to use, or a seed for a new one.
+        """
+        self.rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+        self._block = []
+
+    def roll(self):
+        """
+        Roll the dice once.
+
+        Returns:
+        - int: The number rolled.
+        """
+        if not self._block:
+            self._block = self.rolls(self.block_size).tolist()
+        return self._block.pop()
+
+    def rolls(self, size):
+        """
+        Roll the dice `size` times straight from the generator, e.g. once per game of a vectorized env.
+
+        Returns:
+        - np.ndarray of int64 rolls.
+        """
+        if self.p is None:
+            return self.faces[self.rng.integers(len(self.faces), size=size)]
+        return self.faces[self.rng.choice(len(self.faces), size=size, p=self.p)]
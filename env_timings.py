@@ -0,0 +1,93 @@
+"""
+Opt-in timing counters for the phases of the environments' step() and reset().
+
+An environment created with profile=True keeps a PhaseTimings, adds the time spent in each phase to it with lap(),
+and returns the totals from get_timings(). With profiling off the environments only test `timings is not None` at
+each phase boundary, so the counters can stay in the code of production runs.
+"""
+from time import perf_counter
+
+
+class PhaseTimings:
+    """
+    Total seconds and number of calls per phase.
+    """
+
+    def __init__(self, phases):
+        """
+        Parameters:
+        - phases (sequence of str): Names of the phases, in the order they are reported.
+        """
+        self.phases = tuple(phases)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the counters.
+        """
+        self.seconds = dict.fromkeys(self.phases, 0.0)
+        self.calls = dict.fromkeys(self.phases, 0)
+
+    def lap(self, phase, start, count=True):
+        """
+        Count the time since `start` towards a phase.
+
+        Parameters:
+        - phase (str): Phase that just ended.
+        - start (float): time.perf_counter() value when it began.
+        - count (bool): Count a call of the phase; False for a phase that is interrupted by others and resumed, so
+          that only its last part counts the call.
+
+        Returns:
+        - float: The current time.perf_counter() value, which is where the next phase begins.
+        """
+        now = perf_counter()
+        self.seconds[phase] += now - start
+        if count:
+            self.calls[phase] += 1
+        return now
+
+    def snapshot(self, reset=False):
+        """
+        Get the counters, optionally clearing them.
+
+        Returns:
+        - dict of phase -> {"calls": int, "seconds": float}.
+        """
+        snapshot = {phase: {"calls": self.calls[phase], "seconds": self.seconds[phase]} for phase in self.phases}
+        if reset:
+            self.reset()
+        return snapshot
+
+
+def merge_timings(snapshots):
+    """
+    Add up the snapshots of several environments.
+
+    Parameters:
+    - snapshots (iterable of dict): PhaseTimings.snapshot() results; None entries (profiling off) are skipped.
+
+    Returns:
+    - dict of phase -> {"calls": int, "seconds": float}, in the order phases are first seen.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for phase, counts in (snapshot or {}).items():
+            total = merged.setdefault(phase, {"calls": 0, "seconds": 0.0})
+            total["calls"] += counts["calls"]
+            total["seconds"] += counts["seconds"]
+    return merged
+
+
+def collect_timings(vec_env, reset=False):
+    """
+    Gather the timings of every environment in a vectorized env: an AshtachammaVecEnv (possibly wrapped), or a
+    DummyVecEnv or SharedMemoryVecEnv of AshtachammaEnv instances.
+
+    Returns:
+    - dict of phase -> {"calls": int, "seconds": float}, empty when profiling is off.
+    """
+    get_timings = getattr(vec_env, "get_timings", None)  # VecEnvWrapper forwards attributes of the wrapped env
+    if get_timings is not None:
+        return merge_timings([get_timings(reset=reset)])
+    return merge_timings(vec_env.env_method("get_timings", reset=reset))
@@ -0,0 +1,270 @@
+"""
+Evaluate trained checkpoints against the heuristic opponents.
+
+Each checkpoint plays seat 0 of many games at once in one AshtachammaVecEnv, so every step is a single batched
+forward pass, and several checkpoints are evaluated in parallel worker processes. Episodes are counted in rounds
+of one finished game per env, so that short games aren't over-represented when evaluation stops early. The win
+rate (with a Wilson 95% interval) and the mean game length in turns, kills, home arrivals and episode reward (with
+normal 95% intervals) are reported, and a checkpoint stops being evaluated once its win rate interval is tight
+enough.
+
+Usage:
+    python evaluate.py ppo:ashtachamma_ppo_agent.zip ["ppo:checkpoints/*.zip" ...]
+        [--episodes N] [--num-envs N] [--workers N] [--tolerance P] [--min-episodes N] [--seed N]
+        [--opponents random defensive aggressive] [--roll-first] [--fast-forward] [--extra-turns]
+        [--dice d6|cowries|shells] [--stochastic] [--results FILE] [--watch SECONDS]
+
+Checkpoints are given as <algorithm>:<path>, with algorithm "ppo", "dqn", "maskable" or "numpy" (see
+numpy_policy.py), and the path may be a glob pattern. With --watch, the patterns are polled for new checkpoints,
+e.g. those CheckpointCallback writes while training runs.
+"""
+import argparse
+import glob
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dice import DICE
+from tournament import Z, wilson_interval
+
+METRICS = ("turns", "kills", "arrivals", "reward")  # Reported as means with confidence intervals, next to wins
+SETTLE_TIME = 2.0  # Seconds a checkpoint file must be left unchanged before --watch evaluates it
+HEADER = (f"{'checkpoint':>40} {'episodes':>8} {'win rate':>8} {'95% CI':>14} "
+          + " ".join(f"{name:>17}" for name in METRICS) + f" {'time':>8}")
+
+
+def expand_specs(specs, settle_time=0.0):
+    """
+    Expand glob patterns in checkpoint specs, oldest file first.
+
+    Parameters:
+    - specs (list of str): "<algorithm>:<path or pattern>" specs.
+    - settle_time (float): Skip files modified less than this many seconds ago, which may still be written.
+
+    Returns:
+    - list of "<algorithm>:<path>" specs.
+    """
+    expanded = []
+    now = time.time()
+    for spec in specs:
+        algorithm, pattern = spec.split(":", 1)
+        is_pattern = glob.has_magic(pattern)
+        mtimes = {}  # Each file is stat'ed once, as rotation may delete it at any time
+        for path in glob.glob(pattern) if is_pattern else [pattern]:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except FileNotFoundError:
+                if is_pattern:
+                    continue  # Deleted since the glob, e.g. by checkpoint rotation
+                mtimes[path] = 0.0  # Named explicitly: loading it reports the missing file
+        paths = [path for path, mtime in mtimes.items() if not settle_time or now - mtime >= settle_time]
+        paths.sort(key=lambda path: (mtimes[path], path))
+        expanded.extend(f"{algorithm}:{path}" for path in paths)
+    return expanded
+
+
+def mean_interval(values, z=Z):
+    """
+    Mean of a sample and the half width of its normal confidence interval.
+    """
+    if len(values) < 2:
+        return float(np.mean(values)) if len(values) else 0.0, math.inf
+    return float(np.mean(values)), float(z * np.std(values, ddof=1) / math.sqrt(len(values)))
+
+
+def summarize(wins, metrics):
+    """
+    Aggregate finished episodes.
+
+    Parameters:
+    - wins (np.ndarray): Whether the agent won each episode.
+    - metrics (np.ndarray): (episodes, len(METRICS)) values of each episode.
+
+    Returns:
+    - dict with "episodes", "win_rate", "win_interval" and a [mean, half width] pair per metric.
+    """
+    n = len(wins)
+    summary = {"episodes": n, "win_rate": float(np.mean(wins)) if n else 0.0,
+               "win_interval": wilson_interval(int(np.sum(wins)), n)}
+    for column, name in enumerate(METRICS):
+        summary[name] = mean_interval(metrics[:, column])
+    return summary
+
+
+def evaluate_checkpoint(spec, **kwargs):
+    """
+    Load a checkpoint and evaluate it with evaluate_policy().
+
+    Parameters:
+    - spec (str): "<algorithm>:<path>" of the checkpoint.
+    - kwargs: Options of evaluate_policy().
+
+    Returns:
+    - dict with "checkpoint", "elapsed" and the summarize() statistics.
+    """
+    from numpy_policy import load_policy
+
+    start = time.perf_counter()
+    summary = evaluate_policy(load_policy(spec), **kwargs)
+    return {"checkpoint": spec, "elapsed": time.perf_counter() - start, **summary}
+
+
+def evaluate_policy(model, episodes=5000, num_envs=256, tolerance=0.02, min_episodes=512, seed=0,
+                    opponents=("random", "defensive", "aggressive"), deterministic=True, roll_first=False,
+                    fast_forward=False, extra_turns=False, dice="d6"):
+    """
+    Play a policy in seat 0 until `episodes` episodes are finished or its win rate is known precisely enough.
+
+    Parameters:
+    - model: Stable-Baselines3 model or NumpyPolicy, e.g. from numpy_policy.load_policy().
+    - episodes (int): Most episodes to play, rounded up to a whole number of rounds of num_envs episodes.
+    - num_envs (int): Games played at once in the vectorized env.
+    - tolerance (float): Stop once the win rate's 95% interval is narrower than ± this.
+    - min_episodes (int): Episodes to play before stopping early.
+    - seed (int): Seed of the dice and the opponents; the same seed plays every checkpoint on the same dice.
+    - opponents (sequence of str): Strategies of seats 1 to 3.
+    - deterministic (bool): Pick the policy's most likely action instead of sampling one.
+    - roll_first, fast_forward, extra_turns, dice: Environment options the policy was trained with.
+
+    Returns:
+    - dict of summarize() statistics.
+    """
+    from ashtachamma_obs import find_obs_format
+    from ashtachamma_vec_env import AshtachammaVecEnv
+    from batched_policy import BatchedPolicy
+
+    policy = BatchedPolicy(model, deterministic=deterministic)  # Only its predict_batch() is used here
+    num_envs = min(num_envs, episodes)
+    env = AshtachammaVecEnv(num_envs=num_envs, strategies=("RL",) + tuple(opponents), seed=seed,
+                            obs_format=find_obs_format(model.observation_space), roll_first=roll_first,
+                            fast_forward=fast_forward, extra_turns=extra_turns, dice=dice)
+
+    rounds = math.ceil(episodes / num_envs)
+    wins = np.zeros((rounds, num_envs), dtype=bool)  # One row per round, one column per game
+    metrics = np.zeros((rounds, num_envs, len(METRICS)))
+    finished = np.zeros(num_envs, dtype=int)  # Episodes finished by each game
+    returns = np.zeros(num_envs)
+    complete = 0  # Rounds in which every game has finished an episode
+    summary = summarize(wins[:0].ravel(), metrics[:0].reshape(-1, len(METRICS)))
+    obs = env.reset()
+    while complete < rounds:
+        actions = policy.predict_batch(obs, env.action_masks() if policy.maskable else None)
+        obs, rewards, dones, infos = env.step(actions)
+        returns += rewards
+        if not dones.any():
+            continue
+        for i in np.flatnonzero(dones):
+            if finished[i] < rounds:
+                game = infos[i]["game"]
+                wins[finished[i], i] = game["winner"] == 0
+                metrics[finished[i], i] = (game["turns"], game["kills"], game["arrivals"], returns[i])
+            finished[i] += 1
+            returns[i] = 0.0
+        if finished.min() > complete:
+            complete = min(int(finished.min()), rounds)
+            summary = summarize(wins[:complete].ravel(), metrics[:complete].reshape(-1, len(METRICS)))
+            low, high = summary["win_interval"]
+            if summary["episodes"] >= min_episodes and (high - low) / 2 < tolerance:
+                break
+    env.close()
+    policy.close()
+    return summary
+
+
+def format_result(result):
+    """
+    Format an evaluate_checkpoint() result as a table row.
+    """
+    low, high = result["win_interval"]
+    cells = [f"{result['checkpoint']:>40}", f"{result['episodes']:>8}", f"{result['win_rate']:>8.3f}",
+             f"[{low:.3f}, {high:.3f}]"]
+    cells += [f"{result[name][0]:>8.2f} ± {result[name][1]:<6.2f}" for name in METRICS]
+    return " ".join(cells) + f" {result['elapsed']:>7.1f}s"
+
+
+def run_evaluation(specs, workers=1, results_path=None, start_method=None, **kwargs):
+    """
+    Evaluate checkpoints in a process pool, printing each result as it comes in.
+
+    Parameters:
+    - specs (list of str): "<algorithm>:<path>" checkpoints.
+    - workers (int): Worker processes; 1 evaluates in this process.
+    - results_path (str): JSON lines file receiving every result.
+    - start_method (str): multiprocessing start method; defaults to "fork" where available, else "spawn".
+    - kwargs: Options of evaluate_checkpoint().
+
+    Returns:
+    - list of results, in the order they finished.
+    """
+    results = []
+
+    def record(result):
+        print(format_result(result), flush=True)
+        results.append(result)
+        if results_path:
+            with open(results_path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+    if workers <= 1 or len(specs) <= 1:
+        for spec in specs:
+            record(evaluate_checkpoint(spec, **kwargs))
+        return results
+    if start_method is None:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(min(workers, len(specs)), mp_context=mp.get_context(start_method)) as pool:
+        for future in as_completed([pool.submit(evaluate_checkpoint, spec, **kwargs) for spec in specs]):
+            record(future.result())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate Ashta Chamma checkpoints against the heuristic players")
+    parser.add_argument("checkpoints", nargs="+",
+                        help="Checkpoints as ALGORITHM:PATH (ppo, dqn, maskable or numpy); PATH may be a glob pattern")
+    parser.add_argument("--episodes", type=int, default=5000, help="Most episodes per checkpoint")
+    parser.add_argument("--num-envs", type=int, default=256, help="Games played at once per checkpoint")
+    parser.add_argument("--workers", type=int, default=1, help="Checkpoints evaluated at once in worker processes")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Stop once the win rate's 95%% interval is within ± this")
+    parser.add_argument("--min-episodes", type=int, default=512, help="Episodes to play before stopping early")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the dice and the opponents")
+    parser.add_argument("--opponents", nargs=3, default=["random", "defensive", "aggressive"],
+                        choices=["random", "aggressive", "defensive"], help="Strategies of seats 1 to 3")
+    parser.add_argument("--roll-first", action="store_true", help="The checkpoint was trained with --roll-first")
+    parser.add_argument("--fast-forward", action="store_true", help="Play the opponents' turns inside each step")
+    parser.add_argument("--extra-turns", action="store_true",
+                        help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+    parser.add_argument("--dice", choices=DICE, default="d6", help="Dice outcome distribution")
+    parser.add_argument("--stochastic", action="store_true", help="Sample actions instead of taking the most likely")
+    parser.add_argument("--results", default=None, help="Append every result to this JSON lines file")
+    parser.add_argument("--watch", type=float, default=None,
+                        help="Keep polling the checkpoint patterns every this many seconds for new files")
+    args = parser.parse_args()
+
+    for spec in args.checkpoints:
+        if ":" not in spec:
+            parser.error(f"Checkpoint {spec!r} should be given as ALGORITHM:PATH")
+    options = dict(workers=args.workers, results_path=args.results, episodes=args.episodes, num_envs=args.num_envs,
+                   tolerance=args.tolerance, min_episodes=args.min_episodes, seed=args.seed,
+                   opponents=args.opponents, deterministic=not args.stochastic, roll_first=args.roll_first,
+                   fast_forward=args.fast_forward, extra_turns=args.extra_turns, dice=args.dice)
+
+    print(HEADER)
+    done = set()
+    while True:
+        specs = [spec for spec in expand_specs(args.checkpoints, SETTLE_TIME if args.watch else 0.0)
+                 if spec not in done]
+        run_evaluation(specs, **options)
+        done.update(specs)
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
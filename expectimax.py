@@ -0,0 +1,278 @@
+import time
+
+from board_updated import EXTRA_TURN_ROLLS, HOME_INDEX, PATH_CELLS, PATH_LENGTH, PATH_SAFE
+from dice import Dice
+
+NUM_PLAYERS = 4
+NUM_PAWNS = 2
+WIN_VALUE = 1000.0  # Value of a won game for the winner; the other players get -WIN_VALUE
+HOME_BONUS = 15.0  # Value of a pawn at home on top of its path offset
+CHECK_EVERY = 16  # Chance nodes searched between two checks of the time budget
+
+
+class _Timeout(Exception):
+    """
+    Raised inside the search when the time budget of a move runs out.
+    """
+
+
+def game_state(players):
+    """
+    Encode the pawns of all players as a search state.
+
+    Parameters:
+    - players (list): StrategicPlayer objects in seat order.
+
+    Returns:
+    - tuple of 8 path offsets, two per seat in seat order, with HOME_INDEX for pawns that are home.
+    """
+    return tuple(HOME_INDEX if offset is None else offset for player in players for offset in player.pawns)
+
+
+def state_key(state, seat):
+    """
+    Pack a search state and the seat to move into one integer (50 bits), the transposition table key.
+    """
+    key = 0
+    for offset in state:
+        key = key * PATH_LENGTH + offset
+    return key * NUM_PLAYERS + seat
+
+
+def apply_move(state, seat, pawn_index, new_offset):
+    """
+    Play a move on a search state, sending captured opponent pawns (one per opponent) back to start.
+
+    Returns:
+    - (new state, kill) where kill is True when the move captured a pawn.
+    """
+    pawns = list(state)
+    pawns[NUM_PAWNS * seat + pawn_index] = new_offset
+    kill = False
+    if not PATH_SAFE[seat][new_offset]:
+        cell = PATH_CELLS[seat][new_offset]
+        for opponent in range(NUM_PLAYERS):
+            if opponent == seat:
+                continue
+            cells = PATH_CELLS[opponent]
+            for i in range(NUM_PAWNS * opponent, NUM_PAWNS * opponent + NUM_PAWNS):
+                if pawns[i] != HOME_INDEX and cells[pawns[i]] == cell:
+                    pawns[i] = 0
+                    kill = True
+                    break
+    return tuple(pawns), kill
+
+
+class ExpectimaxSearch:
+    """
+    Depth-limited expectimax search over the headless rules.
+
+    Dice rolls are chance nodes weighted by the dice distribution, and each player picks the move that maximizes
+    its own entry of a per-player value vector (max^n), so opponents are modelled as playing for themselves rather
+    than against the searching player. Depth counts turns, so depth 4 looks one full round ahead. Chance node
+    values are cached in a fixed-size transposition table keyed by state_key(), and moves are searched with
+    iterative deepening until the per-move time budget runs out.
+    """
+
+    def __init__(self, dice="d6", extra_turns=False, time_budget=0.05, max_depth=8, table_size=2 ** 18):
+        """
+        Initialize the search.
+
+        Parameters:
+        - dice (str, tuple or Dice): Dice distribution (see dice.DICE) whose outcomes weight the chance nodes.
+        - extra_turns (bool): Whether rolling a 4 or 8 or capturing a pawn earns another turn, as in the game.
+        - time_budget (float): Seconds to spend per move; the deepest fully searched depth decides the move.
+        - max_depth (int): Deepest iteration of the iterative deepening.
+        - table_size (int): Number of transposition table slots; the table never grows beyond it.
+        """
+        dice = dice if isinstance(dice, Dice) else Dice(dice)
+        p = dice.p if dice.p is not None else [1 / len(dice.faces)] * len(dice.faces)
+        self.outcomes = [(int(face), float(weight)) for face, weight in zip(dice.faces, p)]
+        self.extra_turns = extra_turns
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table_size = table_size
+        self._keys = [None] * table_size
+        self._depths = [0] * table_size
+        self._values = [None] * table_size
+
+        # Chance of a player landing a pawn on each cell with its next roll, by seat and the offsets of its pawns,
+        # for the risk term of evaluate(); filled in as positions are evaluated (at most 4 * 50 * 50 entries)
+        self._threats = {}
+
+        # Statistics of the last search
+        self.depth = 0
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        """
+        Describe the last search, e.g. for logging.
+        """
+        return f"depth {self.depth}, {self.nodes} nodes, {self.nodes / self.elapsed if self.elapsed else 0:.0f} nodes/s"
+
+    def choose(self, players, seat, roll):
+        """
+        Choose the move of the player in `seat` for a roll, e.g. for StrategicPlayer.decide_move.
+
+        Parameters:
+        - players (list): StrategicPlayer objects in seat order.
+        - seat (int): Seat of the player to move.
+        - roll (int): The number rolled.
+
+        Returns:
+        - The index of the pawn to move, or None when no pawn can move.
+        """
+        return self.search(game_state(players), seat, roll)
+
+    def search(self, state, seat, roll):
+        """
+        Search a position with iterative deepening until the time budget or max_depth is reached.
+
+        Returns:
+        - The index of the pawn to move, or None when no pawn can move.
+        """
+        start = time.perf_counter()
+        self._deadline = start + self.time_budget
+        self._countdown = CHECK_EVERY
+        self.nodes = 0
+        moves = self._moves(state, seat, roll)
+        best = moves[0][0] if moves else None
+        self.depth = 0
+        if len(moves) > 1:
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    values = [self._after_move(state, seat, roll, pawn_index, new_offset, depth)
+                              for pawn_index, new_offset in moves]
+                except _Timeout:
+                    break
+                best = moves[max(range(len(moves)), key=lambda i: values[i][seat])][0]
+                self.depth = depth
+        self.elapsed = time.perf_counter() - start
+        return best
+
+    def action_values(self, state, seat, roll, depth):
+        """
+        Get the searched value of every legal move for the player in `seat`, e.g. as targets for a learner.
+
+        Returns:
+        - dict mapping pawn index -> expected value for that player after searching `depth` turns.
+        """
+        self._deadline = float("inf")
+        self._countdown = CHECK_EVERY
+        return {pawn_index: self._after_move(state, seat, roll, pawn_index, new_offset, depth)[seat]
+                for pawn_index, new_offset in self._moves(state, seat, roll)}
+
+    def _moves(self, state, seat, roll):
+        """
+        List the (pawn_index, new_offset) moves of a seat, like Board.legal_moves.
+        """
+        moves = []
+        for pawn_index in range(NUM_PAWNS):
+            offset = state[NUM_PAWNS * seat + pawn_index]
+            if offset != HOME_INDEX and offset + roll < PATH_LENGTH:
+                moves.append((pawn_index, offset + roll))
+        return moves
+
+    def _after_move(self, state, seat, roll, pawn_index, new_offset, depth):
+        """
+        Value of a position right after a move, searching depth - 1 more turns.
+        """
+        child, kill = apply_move(state, seat, pawn_index, new_offset)
+        if child[NUM_PAWNS * seat] == HOME_INDEX and child[NUM_PAWNS * seat + 1] == HOME_INDEX:
+            value = [-WIN_VALUE] * NUM_PLAYERS
+            value[seat] = WIN_VALUE
+            return value
+        return self._chance(child, self._next_seat(seat, roll, kill), depth - 1)
+
+    def _next_seat(self, seat, roll, kill):
+        """
+        Seat to play after a turn, which is the same seat when it earned an extra turn.
+        """
+        if self.extra_turns and (kill or roll in EXTRA_TURN_ROLLS):
+            return seat
+        return (seat + 1) % NUM_PLAYERS
+
+    def _chance(self, state, seat, depth):
+        """
+        Expected value vector of a position before `seat` rolls, averaged over the dice outcomes.
+        """
+        if depth <= 0:
+            return self.evaluate(state)
+
+        self.nodes += 1
+        self._countdown -= 1
+        if self._countdown <= 0:
+            self._countdown = CHECK_EVERY
+            if time.perf_counter() > self._deadline:
+                raise _Timeout
+
+        key = state_key(state, seat)
+        slot = key % self.table_size
+        if self._keys[slot] == key and self._depths[slot] >= depth:
+            return self._values[slot]
+
+        value = [0.0] * NUM_PLAYERS
+        for roll, probability in self.outcomes:
+            best = None
+            for pawn_index, new_offset in self._moves(state, seat, roll):
+                child_value = self._after_move(state, seat, roll, pawn_index, new_offset, depth)
+                if best is None or child_value[seat] > best[seat]:
+                    best = child_value
+            if best is None:  # No pawn can move with this roll
+                best = self._chance(state, self._next_seat(seat, roll, False), depth - 1)
+            for i in range(NUM_PLAYERS):
+                value[i] += probability * best[i]
+
+        # Always replace: recent positions are the most likely to be searched again
+        self._keys[slot] = key
+        self._depths[slot] = depth
+        self._values[slot] = value
+        return value
+
+    def _threat(self, seat, *offsets):
+        """
+        Chance of each cell a player with pawns at some path offsets could land a pawn on with its next roll (none
+        from home), weighted by the dice distribution.
+
+        Returns:
+        - dict of cell -> probability.
+        """
+        cells = PATH_CELLS[seat]
+        threat = {}
+        for face, probability in self.outcomes:
+            for cell in {cells[offset + face] for offset in offsets if offset + face < PATH_LENGTH}:
+                threat[cell] = threat.get(cell, 0.0) + probability
+        self._threats[(seat,) + offsets] = threat
+        return threat
+
+    def evaluate(self, state):
+        """
+        Heuristic value of a position for every player: progress along the path, a bonus for pawns at home and a
+        penalty for pawns each opponent could capture with its next roll, weighted by the chance of that roll,
+        relative to the average opponent.
+        """
+        self.nodes += 1
+        threats = []  # Chance of each cell each player could land on next
+        for seat in range(NUM_PLAYERS):
+            key = (seat,) + state[NUM_PAWNS * seat:NUM_PAWNS * seat + NUM_PAWNS]
+            threat = self._threats.get(key)
+            threats.append(threat if threat is not None else self._threat(*key))
+        scores = []
+        for seat in range(NUM_PLAYERS):
+            cells = PATH_CELLS[seat]
+            safe = PATH_SAFE[seat]
+            score = 0.0
+            for offset in state[NUM_PAWNS * seat:NUM_PAWNS * seat + NUM_PAWNS]:
+                if offset == HOME_INDEX:
+                    score += HOME_INDEX + HOME_BONUS
+                    continue
+                score += offset
+                if not safe[offset]:
+                    cell = cells[offset]
+                    for opponent in range(NUM_PLAYERS):
+                        if opponent != seat and cell in threats[opponent]:
+                            score -= offset * threats[opponent][cell]  # Expected loss if captured
+            scores.append(score)
+        total = sum(scores)
+        return [score - (total - score) / (NUM_PLAYERS - 1) for score in scores]
@@ -1,51 +1,79 @@
+import logging
 import random
 
+from board_updated import HOME_INDEX, NEIGHBOUR_CELLS, PATH_CELLS
+
+logger = logging.getLogger(__name__)
+
 
 class StrategicPlayer:
-    def __init__(self, player_id, start_positions, color, strategy="random"):
+    def __init__(self, player_id, start_positions, color, strategy="random", log_moves=None,
+                 rng=None, search=None):
         """
         Initialize the StrategicPlayer object.
 
         Args:
         - player_id: Unique identifier for the player.
-        - start_positions: List of starting positions for the player's pawns.
+        - start_positions: List of starting path offsets for the player's pawns.
         - color: The player's color.
-        - strategy: The player's strategy ("random", "aggressive", "defensive", or "RL").
+        - strategy: The player's strategy ("random", "aggressive", "defensive", "expectimax", "mcts", or "RL").
+        - log_moves: Whether to log each decision at DEBUG level. Defaults to whether DEBUG logging is enabled
+          when the player is created; pass False to keep logging calls off the move-decision path entirely.
+        - rng: random.Random instance used by the "random" strategy, e.g. seeded for reproducible games.
+          Defaults to the global random module.
+        - search: ExpectimaxSearch or MCTSSearch used by the "expectimax" or "mcts" strategy, e.g. to set the dice,
+          extra turns or budget. Defaults to a search over the six-sided die, created on the first move.
         """
         self.player_id = player_id
-        self.pawns = start_positions  # List storing the positions of the player's pawns
+        self.pawns = start_positions  # List storing the path offsets of the player's pawns (None once home)
         self.color = color  # Player's color
         self.strategy = strategy  # Strategy used to decide moves
         self.kill = None  # Tracks if the player captured an opponent's pawn (for aggressive strategy)
         self.score = 0  # Player's score, can be incremented based on game rules
+        self.log_moves = logger.isEnabledFor(logging.DEBUG) if log_moves is None else log_moves
+        self.rng = random if rng is None else rng
+        self.search = search
 
-    def decide_move(self, possible_moves, players):
+    def decide_move(self, possible_moves, players, roll=None):
         """
         Decide the player's move based on the chosen strategy.
 
         Args:
         - possible_moves: A list of all possible moves for the player.
         - players: A list of all players in the game.
+        - roll: The number rolled, which the search strategies ("expectimax", "mcts") need.
 
         Returns:
         - A chosen move from possible_moves.
         """
         if self.strategy == "aggressive":
-            print(f"Player {self.player_id} (Aggressive) choosing move...")
+            if self.log_moves:
+                logger.debug("Player %s (Aggressive) choosing move...", self.player_id)
             return self._aggressive_move(possible_moves, players)
         elif self.strategy == "defensive":
-            print(f"Player {self.player_id} (Defensive) choosing move...")
+            if self.log_moves:
+                logger.debug("Player %s (Defensive) choosing move...", self.player_id)
             return self._defensive_move(possible_moves, players)
         elif self.strategy == "random":
-            print(f"Player {self.player_id} (Random) choosing move...")
-            return random.choice(possible_moves)  # Pick a random move
+            if self.log_moves:
+                logger.debug("Player %s (Random) choosing move...", self.player_id)
+            return self.rng.choice(possible_moves)  # Pick a random move
+        elif self.strategy == "expectimax":
+            if self.log_moves:
+                logger.debug("Player %s (Expectimax) choosing move...", self.player_id)
+            return self._search_move(possible_moves, players, roll)
+        elif self.strategy == "mcts":
+            if self.log_moves:
+                logger.debug("Player %s (MCTS) choosing move...", self.player_id)
+            return self._search_move(possible_moves, players, roll)
         elif self.strategy == "RL":
             # Placeholder for RL-based decision-making
-            print(f"Player {self.player_id} (RL): Move to be decided externally.")
+            if self.log_moves:
+                logger.debug("Player %s (RL): Move to be decided externally.", self.player_id)
             return None  # RL logic is handled externally
         else:
-            print(f"Player {self.player_id}: Unknown strategy, choosing random move.")
-            return random.choice(possible_moves)
+            logger.warning("Player %s: Unknown strategy %r, choosing random move.", self.player_id, self.strategy)
+            return self.rng.choice(possible_moves)
 
     def _aggressive_move(self, possible_moves, players):
         """
@@ -68,23 +96,59 @@ class StrategicPlayer:
                 safe_moves.append(move)
 
         if capture_moves:  # If there are capture moves, prioritize them
-            if capture_moves[0][3] == (4, 4):  # Check if move leads to a "winning" position
-                print("Pawn at win place, will be removed now!")
+            if capture_moves[0][3] == HOME_INDEX:  # Check if move leads to a "winning" position
+                if self.log_moves:
+                    logger.debug("Pawn at win place, will be removed now!")
                 return capture_moves[0]
             else:
-                print(f"The player has killed the pawn at {capture_moves[0][3]}")
+                if self.log_moves:
+                    logger.debug("The player has killed the pawn at path offset %s", capture_moves[0][3])
                 return capture_moves[0]
         elif safe_moves:  # Choose a safe move if no capture moves
-            if safe_moves[0][3] == (4, 4):
-                print("Pawn at win place, will be removed now!")
+            if safe_moves[0][3] == HOME_INDEX:
+                if self.log_moves:
+                    logger.debug("Pawn at win place, will be removed now!")
                 return safe_moves[0]
             else:
-                print(f"The player has chosen the safe move at {safe_moves[0][3]}")
+                if self.log_moves:
+                    logger.debug("The player has chosen the safe move to path offset %s", safe_moves[0][3])
                 return safe_moves[0]
         else:
-            print(f"The player has chosen the best of the possible moves, moving to {possible_moves[0][3]}")
+            if self.log_moves:
+                logger.debug("The player has chosen the best of the possible moves, moving to path offset %s",
+                             possible_moves[0][3])
             return possible_moves[0]  # Default to the first move
 
+    def _search_move(self, possible_moves, players, roll):
+        """
+        Implement the search strategies: look ahead over the following turns, with dice rolls as chance nodes,
+        using expectimax or Monte Carlo Tree Search.
+
+        Args:
+        - possible_moves: A list of possible moves.
+        - players: A list of all players in the game.
+        - roll: The number rolled.
+
+        Returns:
+        - The move leading to the best expected position.
+        """
+        if roll is None:
+            raise ValueError(f"The {self.strategy} strategy needs the roll passed to decide_move()")
+        if self.search is None:
+            if self.strategy == "mcts":
+                from mcts import MCTSSearch
+                self.search = MCTSSearch()
+            else:
+                from expectimax import ExpectimaxSearch
+                self.search = ExpectimaxSearch()
+        pawn_index = self.search.choose(players, self.player_id, roll)
+        if self.log_moves:
+            logger.debug("Searched for %.3fs: %s", self.search.elapsed, self.search.summary())
+        for move in possible_moves:
+            if move[2] == pawn_index:
+                return move
+        return possible_moves[0]
+
     def isKill(self, move):
         """
         Check if a move results in capturing an opponent's pawn.
@@ -98,21 +162,23 @@ class StrategicPlayer:
         _, kill, _, _ = move
         return bool(kill)  # Return True if the move kills an opponent's pawn
 
-    def is_opponent_pawn(self, position, players):
+    def is_opponent_pawn(self, cell, players):
         """
-        Check if a given position has an opponent's pawn.
+        Check if a given cell has an opponent's pawn.
 
         Args:
-        - position: The position to check.
+        - cell: The cell id (row * 9 + col) to check.
         - players: A list of all players in the game.
 
         Returns:
-        - True if the position contains an opponent's pawn, False otherwise.
+        - True if the cell contains an opponent's pawn, False otherwise.
         """
         for player in players:
             if player.player_id != self.player_id:  # Ignore the player's own pawns
-                if position in player.pawns:
-                    return True  # Position belongs to an opponent
+                cells = PATH_CELLS[player.player_id]
+                for offset in player.pawns:
+                    if offset is not None and cells[offset] == cell:
+                        return True  # Cell belongs to an opponent
         return False
 
     def _defensive_move(self, possible_moves, players):
@@ -129,17 +195,22 @@ class StrategicPlayer:
         safe_moves = []
 
         for move in possible_moves:
-            if move[3] == (4, 4):  # Check if move leads to a "winning" position
-                print("Pawn at win place, will be removed now!")
+            if move[3] == HOME_INDEX:  # Check if move leads to a "winning" position
+                if self.log_moves:
+                    logger.debug("Pawn at win place, will be removed now!")
                 return move
             elif self.is_safe_position(move, players):  # Check if move is safe
                 safe_moves.append(move)
 
         if safe_moves:  # Choose a safe move if available
-            print(f"The player has chosen the safest move possible, moving to {safe_moves[0][3]}")
+            if self.log_moves:
+                logger.debug("The player has chosen the safest move possible, moving to path offset %s",
+                             safe_moves[0][3])
             return safe_moves[0]
         else:
-            print(f"The player has chosen the best of the possible moves, moving to {possible_moves[0][3]}")
+            if self.log_moves:
+                logger.debug("The player has chosen the best of the possible moves, moving to path offset %s",
+                             possible_moves[0][3])
             return possible_moves[0]  # Default to the first move
 
     def is_safe_position(self, position, players):
@@ -161,21 +232,16 @@ class StrategicPlayer:
 
     def get_surrounding_positions(self, position):
         """
-        Get all positions surrounding the given position.
+        Get all cells surrounding the destination of a move.
 
         Args:
-        - position: The current position as a tuple (x, y).
+        - position: A move tuple whose last element is the pawn's new path offset.
 
         Returns:
-        - A list of surrounding positions.
+        - A frozenset of the cell ids directly right, left, below and above the destination.
         """
-        _, _, _, (x, y) = position
-        return [
-            (x + 1, y),  # Right
-            (x - 1, y),  # Left
-            (x, y + 1),  # Down
-            (x, y - 1)  # Up
-        ]
+        _, _, _, offset = position
+        return NEIGHBOUR_CELLS[PATH_CELLS[self.player_id][offset]]
 
     def update_position(self, pawn_index, new_position):
         """
@@ -183,6 +249,6 @@ class StrategicPlayer:
 
         Args:
         - pawn_index: The index of the pawn to update.
-        - new_position: The new position of the pawn.
+        - new_position: The new path offset of the pawn.
         """
         self.pawns[pawn_index] = new_position  # Update the pawn's position
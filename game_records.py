@@ -0,0 +1,413 @@
+"""
+Compact binary records of played games.
+
+Every turn is stored in 4 bytes: one packing the seat, the pawn and whether a pawn moved and captured, then the roll
+and the pawn's path offsets before and after the move. Turns without a legal move are recorded too, so the turn
+order can be replayed exactly. Games are appended to a GameLog while they are played and handed to a GameRecorder,
+which writes them in chunk files of up to games_per_chunk games:
+
+    header   HEADER_DTYPE: magic, format version, number of games and of turns
+    games    GAME_DTYPE per game: first turn, number of turns, winner (-1 if none), rule flags and highest roll
+    turns    TURN_DTYPE per turn, the games' turns one after another
+
+GameRecords memory-maps the chunk files instead of reading them, so millions of games can be counted, filtered on
+the games table and replayed without loading the turns into memory. A GameRecord replays its turns from the start
+position to rebuild the pawns before any turn, and the observation AshtachammaEnv._get_state() returned there.
+
+Usage:
+    python game_records.py games/ [--winner SEAT] [--min-turns N] [--max-turns N] [--show GAME]
+"""
+import argparse
+import glob
+import os
+import threading
+
+import numpy as np
+
+from ashtachamma_obs import ObservationBuilder
+from expectimax import NUM_PAWNS, NUM_PLAYERS, apply_move
+
+MAGIC = b"ACGR"
+VERSION = 1
+EXTENSION = ".acgr"
+HEADER_DTYPE = np.dtype([("magic", "S4"), ("version", "<u4"), ("games", "<u8"), ("turns", "<u8")])
+GAME_DTYPE = np.dtype([("start", "<u8"), ("length", "<u4"), ("winner", "i1"), ("flags", "u1"), ("max_roll", "u1")])
+TURN_DTYPE = np.dtype([("info", "u1"), ("roll", "u1"), ("from", "u1"), ("to", "u1")])
+
+# Bits of a turn's "info" byte, above the seat in bits 0 and 1
+PAWN_SHIFT = 2
+MOVED = 1 << 3
+CAPTURE = 1 << 4
+
+# Bits of a game's "flags" byte
+EXTRA_TURNS = 1
+ROLL_FIRST = 2
+
+START_STATE = (0, 1) * NUM_PLAYERS  # Every seat starts with its pawns on path offsets 0 and 1
+
+_builders = {}  # (obs_format, max_roll) -> ObservationBuilder used by GameRecord.observation()
+
+
+class GameLog:
+    """
+    The turns of one game, recorded while it is played.
+    """
+
+    def __init__(self, extra_turns=False, roll_first=False, max_roll=6):
+        """
+        Start an empty game.
+
+        Parameters:
+        - extra_turns (bool): Whether the game gives another turn after rolling a 4 or 8 or capturing a pawn.
+        - roll_first (bool): Whether observations show the roll of the turn to play (see AshtachammaEnv).
+        - max_roll (int): Highest roll of the dice, which the "features" observation scales to 1.
+        """
+        self.flags = (EXTRA_TURNS if extra_turns else 0) | (ROLL_FIRST if roll_first else 0)
+        self.max_roll = max_roll
+        self.turns = bytearray()
+
+    def __len__(self):
+        return len(self.turns) // TURN_DTYPE.itemsize
+
+    def record(self, seat, roll, move=None, source=0):
+        """
+        Append a turn.
+
+        Parameters:
+        - seat (int): Seat of the player who rolled.
+        - roll (int): The number rolled.
+        - move (tuple): The (player_id, kill, pawn_index, new_offset) move played, or None if no pawn could move.
+        - source (int): Path offset the moved pawn started from.
+        """
+        if move is None:
+            self.turns += bytes((seat, roll, 0, 0))
+        else:
+            _, kill, pawn_index, new_offset = move
+            self.turns += bytes((seat | pawn_index << PAWN_SHIFT | MOVED | (CAPTURE if kill else 0), roll,
+                                 source, new_offset))
+
+
+class GameRecorder:
+    """
+    Write finished games to chunk files in a directory.
+
+    Games are buffered in memory until games_per_chunk of them are collected, then written to a new chunk file.
+    Each file is written under a temporary name and renamed once complete, so readers never see a partial chunk.
+    add() may be called from several threads; processes writing to the same directory need different prefixes.
+    """
+
+    def __init__(self, directory, games_per_chunk=65536, prefix="games"):
+        """
+        Initialize the recorder.
+
+        Parameters:
+        - directory (str): Directory receiving the chunk files, created if needed.
+        - games_per_chunk (int): Games written per chunk file.
+        - prefix (str): Start of the chunk file names, followed by the chunk number.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.games_per_chunk = games_per_chunk
+        self.prefix = prefix
+        self._chunk = len(glob.glob(os.path.join(directory, f"{prefix}-*{EXTENSION}")))  # Never overwrite a chunk
+        self._games = []
+        self._turns = bytearray()
+        self._lock = threading.Lock()
+
+    def add(self, log, winner=None):
+        """
+        Record a finished game.
+
+        Parameters:
+        - log (GameLog): The game's turns.
+        - winner (int): Seat of the winner, or None if the game was cut short.
+        """
+        with self._lock:
+            start = len(self._turns) // TURN_DTYPE.itemsize
+            self._games.append((start, len(log), -1 if winner is None else winner, log.flags, log.max_roll))
+            self._turns += log.turns
+            if len(self._games) >= self.games_per_chunk:
+                self._write()
+
+    def flush(self):
+        """
+        Write the games buffered so far to a chunk file.
+        """
+        with self._lock:
+            self._write()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self):
+        """
+        Write the buffered games to the next chunk file and clear the buffer. Called with the lock held.
+        """
+        if not self._games:
+            return
+        header = np.array([(MAGIC, VERSION, len(self._games), len(self._turns) // TURN_DTYPE.itemsize)],
+                          dtype=HEADER_DTYPE)
+        path = os.path.join(self.directory, f"{self.prefix}-{self._chunk:05d}{EXTENSION}")
+        with open(path + ".tmp", "wb") as f:
+            f.write(header.tobytes())
+            f.write(np.array(self._games, dtype=GAME_DTYPE).tobytes())
+            f.write(self._turns)
+        os.replace(path + ".tmp", path)
+        self._chunk += 1
+        self._games = []
+        self._turns = bytearray()
+
+
+class GameRecord:
+    """
+    One recorded game, replayable to any of its turns.
+
+    The turn fields are NumPy views of the memory-mapped chunk file, decoded on access.
+    """
+
+    def __init__(self, game, turns):
+        """
+        Parameters:
+        - game: The game's GAME_DTYPE entry.
+        - turns (np.ndarray): The game's TURN_DTYPE turns.
+        """
+        self.turns = turns
+        self.winner = None if game["winner"] < 0 else int(game["winner"])
+        self.extra_turns = bool(game["flags"] & EXTRA_TURNS)
+        self.roll_first = bool(game["flags"] & ROLL_FIRST)
+        self.max_roll = int(game["max_roll"])
+        self._states = None
+
+    def __len__(self):
+        return len(self.turns)
+
+    @property
+    def seats(self):
+        return self.turns["info"] & 3
+
+    @property
+    def pawns(self):
+        return (self.turns["info"] >> PAWN_SHIFT) & 1
+
+    @property
+    def moved(self):
+        return (self.turns["info"] & MOVED) != 0
+
+    @property
+    def captures(self):
+        return (self.turns["info"] & CAPTURE) != 0
+
+    @property
+    def rolls(self):
+        return self.turns["roll"]
+
+    def moves(self):
+        """
+        Iterate over the turns as (seat, roll, move) tuples, with the (player_id, kill, pawn_index, new_offset) move
+        played, or None if no pawn could move.
+        """
+        for info, roll, _, new_offset in self.turns.tolist():
+            seat = info & 3
+            move = None
+            if info & MOVED:
+                move = (seat, bool(info & CAPTURE), (info >> PAWN_SHIFT) & 1, new_offset)
+            yield seat, roll, move
+
+    def states(self):
+        """
+        Replay the game, keeping the pawns before every turn.
+
+        Returns:
+        - (len(self) + 1, 8) uint8 array: the path offsets of every pawn (two per seat in seat order, HOME_INDEX for
+          pawns that are home) before each turn, and after the last one.
+        """
+        if self._states is None:
+            states = np.empty((len(self) + 1, NUM_PLAYERS * NUM_PAWNS), dtype=np.uint8)
+            state = START_STATE
+            states[0] = state
+            for turn, (info, _, _, new_offset) in enumerate(self.turns.tolist(), 1):
+                if info & MOVED:
+                    state, _ = apply_move(state, info & 3, (info >> PAWN_SHIFT) & 1, new_offset)
+                states[turn] = state
+            self._states = states
+        return self._states
+
+    def state(self, turn):
+        """
+        Replay the game up to a turn, without keeping the positions before it.
+
+        Returns:
+        - tuple of the 8 path offsets before `turn` (len(self) for the end of the game).
+        """
+        if self._states is not None:
+            return tuple(self._states[turn].tolist())
+        state = START_STATE
+        for info, _, _, new_offset in self.turns[:turn].tolist():
+            if info & MOVED:
+                state, _ = apply_move(state, info & 3, (info >> PAWN_SHIFT) & 1, new_offset)
+        return state
+
+    def observation(self, turn, obs_format="padded", roll_first=None):
+        """
+        Rebuild the observation AshtachammaEnv._get_state() returned before a turn was played.
+
+        Parameters:
+        - turn (int): Index of the turn, or len(self) for the observation after the last one.
+        - obs_format (str): One of ashtachamma_obs.OBS_FORMATS.
+        - roll_first (bool): Whether the observation shows the roll of the turn to play instead of the previous
+          one; defaults to how the game was recorded.
+
+        Returns:
+        - np.ndarray observation.
+        """
+        roll_first = self.roll_first if roll_first is None else roll_first
+        if turn < len(self):
+            current_player = int(self.turns["info"][turn] & 3)
+            roll_turn = turn if roll_first else turn - 1
+        else:
+            current_player = int(self.turns["info"][-1] & 3) if len(self) else 0  # The winner stays to move
+            roll_turn = turn - 1
+        roll = int(self.turns["roll"][roll_turn]) if roll_turn >= 0 else 0
+        pawns = np.array(self.state(turn), dtype=np.int16).reshape(NUM_PLAYERS, NUM_PAWNS)
+        builder = _builders.get((obs_format, self.max_roll))
+        if builder is None:
+            builder = _builders[obs_format, self.max_roll] = ObservationBuilder(obs_format, max_roll=self.max_roll)
+        space = builder.observation_space
+        return builder.build(pawns, current_player, roll, out=np.empty(space.shape, dtype=space.dtype))
+
+
+class GameRecords:
+    """
+    Memory-mapped access to the games in one or more chunk files.
+    """
+
+    def __init__(self, path):
+        """
+        Open chunk files.
+
+        Parameters:
+        - path (str): A chunk file, a directory of chunk files, or a glob pattern.
+        """
+        if os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, f"*{EXTENSION}")))
+        elif glob.has_magic(path):
+            paths = sorted(glob.glob(path))
+        else:
+            paths = [path]
+        self.paths = paths
+        self._games = []
+        self._turns = []
+        for chunk in paths:
+            header = np.fromfile(chunk, dtype=HEADER_DTYPE, count=1)
+            if len(header) == 0 or header["magic"][0] != MAGIC or header["version"][0] != VERSION:
+                raise ValueError(f"{chunk} is not a version {VERSION} game record file")
+            games, turns = int(header["games"][0]), int(header["turns"][0])
+            offset = HEADER_DTYPE.itemsize
+            self._games.append(np.memmap(chunk, dtype=GAME_DTYPE, mode="r", offset=offset, shape=(games,)))
+            offset += games * GAME_DTYPE.itemsize
+            self._turns.append(np.memmap(chunk, dtype=TURN_DTYPE, mode="r", offset=offset, shape=(turns,))
+                               if turns else np.empty(0, dtype=TURN_DTYPE))
+        self._ends = np.cumsum([len(games) for games in self._games], dtype=np.int64)  # Games up to each chunk
+
+    def __len__(self):
+        return int(self._ends[-1]) if len(self._ends) else 0
+
+    @property
+    def num_turns(self):
+        return sum(len(turns) for turns in self._turns)
+
+    def __getitem__(self, index):
+        """
+        Get a game by its index across all chunks.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Game {index} out of range for {len(self)} games")
+        chunk = int(np.searchsorted(self._ends, index, side="right"))
+        game = self._games[chunk][index - (int(self._ends[chunk - 1]) if chunk else 0)]
+        start = int(game["start"])
+        return GameRecord(game, self._turns[chunk][start:start + int(game["length"])])
+
+    def __iter__(self):
+        for games, turns in zip(self._games, self._turns):
+            for game in games:
+                start = int(game["start"])
+                yield GameRecord(game, turns[start:start + int(game["length"])])
+
+    def column(self, name):
+        """
+        One field of the games table of every game, e.g. "winner" or "length", without reading any turns.
+        """
+        return np.concatenate([games[name] for games in self._games]) if self._games else np.empty(0)
+
+    def select(self, winner=None, min_turns=None, max_turns=None, extra_turns=None):
+        """
+        Find games by their games table entries.
+
+        Parameters:
+        - winner (int): Seat of the winner, or -1 for games without one.
+        - min_turns, max_turns (int): Bounds on the number of turns.
+        - extra_turns (bool): Whether the game was played with extra turns.
+
+        Returns:
+        - np.ndarray of game indices, to pass to games() or self[...].
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if winner is not None:
+            keep &= self.column("winner") == winner
+        if min_turns is not None or max_turns is not None:
+            length = self.column("length")
+            if min_turns is not None:
+                keep &= length >= min_turns
+            if max_turns is not None:
+                keep &= length <= max_turns
+        if extra_turns is not None:
+            keep &= ((self.column("flags") & EXTRA_TURNS) != 0) == extra_turns
+        return np.flatnonzero(keep)
+
+    def games(self, indices=None):
+        """
+        Iterate over the games with the given indices (all games by default).
+        """
+        if indices is None:
+            yield from self
+        else:
+            for index in indices:
+                yield self[int(index)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize and replay recorded Ashta Chamma games")
+    parser.add_argument("path", help="Chunk file, directory of chunk files or glob pattern")
+    parser.add_argument("--winner", type=int, default=None, help="Only games won by this seat (-1: no winner)")
+    parser.add_argument("--min-turns", type=int, default=None, help="Only games of at least this many turns")
+    parser.add_argument("--max-turns", type=int, default=None, help="Only games of at most this many turns")
+    parser.add_argument("--show", type=int, default=None, help="Print every turn of the game with this index")
+    args = parser.parse_args()
+
+    records = GameRecords(args.path)
+    selected = records.select(winner=args.winner, min_turns=args.min_turns, max_turns=args.max_turns)
+    winners = np.bincount(records.column("winner")[selected] + 1, minlength=NUM_PLAYERS + 1)
+    print(f"{len(records)} games, {records.num_turns} turns in {len(records.paths)} chunk files")
+    print(f"{len(selected)} selected games, {records.column('length')[selected].mean() if len(selected) else 0:.1f} "
+          f"turns on average, wins by seat: {winners[1:].tolist()}, no winner: {winners[0]}")
+
+    if args.show is not None:
+        game = records[args.show]
+        states = game.states()
+        for turn, (seat, roll, move) in enumerate(game.moves()):
+            played = "no move" if move is None else (f"pawn {move[2]} {game.turns['from'][turn]} -> {move[3]}"
+                                                     + (" capture" if move[1] else ""))
+            print(f"{turn:>5} seat {seat} rolled {roll}: {played:<28} {states[turn + 1].tolist()}")
+        print(f"Winner: {game.winner}")
+
+
+if __name__ == "__main__":
+    main()
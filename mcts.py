@@ -0,0 +1,211 @@
+import math
+import time
+
+import numpy as np
+
+from ashtachamma_vec_games import OFF_BOARD, VecGames
+from board_updated import EXTRA_TURN_ROLLS, HOME_INDEX, PATH_LENGTH
+from dice import Dice
+from expectimax import NUM_PAWNS, NUM_PLAYERS, apply_move, game_state
+
+
+class _Chance:
+    """
+    Tree node for a position before `seat` rolls. Its children are decision nodes, one per roll seen so far.
+    """
+    __slots__ = ("state", "seat", "winner", "children")
+
+    def __init__(self, state, seat, winner=None):
+        self.state = state
+        self.seat = seat
+        self.winner = winner  # Seat that won the game in this position, if any
+        self.children = {}  # roll -> _Decision
+
+
+class _Decision:
+    """
+    Tree node for a position where `seat` has rolled `roll` and picks a move. Each edge keeps its visit count and
+    the summed results of all four players, so every player picks moves by its own results (max^n).
+    """
+    __slots__ = ("seat", "roll", "moves", "children", "visits", "edge_visits", "edge_wins")
+
+    def __init__(self, seat, roll, moves):
+        self.seat = seat
+        self.roll = roll
+        self.moves = moves  # (pawn_index, new_offset) moves, or [None] when no pawn can move
+        self.children = [None] * len(moves)  # _Chance node reached by each move, created on its first visit
+        self.visits = 0
+        self.edge_visits = [0] * len(moves)
+        self.edge_wins = [[0.0] * NUM_PLAYERS for _ in moves]
+
+
+class MCTSSearch:
+    """
+    Monte Carlo Tree Search with chance nodes (chance-aware UCT).
+
+    Dice rolls are sampled from the dice distribution at chance nodes, moves are chosen with UCB1 on the mover's
+    own win rate, and leaves are scored by playing the game out. Rollouts are batched: `batch_size` leaves are
+    selected (with a virtual loss so they spread over the tree) and played out together in one NumPy
+    VecGames.simulate() call, using the same rules as the environments.
+    """
+
+    def __init__(self, dice="d6", extra_turns=False, simulations=1000, time_budget=None, batch_size=64,
+                 exploration=1.4, rollout_strategy="random", seed=None):
+        """
+        Initialize the search.
+
+        Parameters:
+        - dice (str, tuple or Dice): Dice distribution (see dice.DICE) sampled at chance nodes and in rollouts.
+        - extra_turns (bool): Whether rolling a 4 or 8 or capturing a pawn earns another turn, as in the game.
+        - simulations (int): Rollouts per move, or None to only use the time budget.
+        - time_budget (float): Seconds to spend per move, or None to only use the simulation budget.
+        - batch_size (int): Rollouts played out together in one vectorized simulation.
+        - exploration (float): UCB1 exploration constant.
+        - rollout_strategy (str): Strategy of every seat in rollouts: "random", "aggressive" or "defensive".
+        - seed (int): Seed for the dice samples of the tree and the rollouts.
+        """
+        if simulations is None and time_budget is None:
+            raise ValueError("MCTSSearch needs a simulation or time budget")
+        dice = dice if isinstance(dice, Dice) else Dice(dice)
+        tree_seed, rollout_seed = np.random.SeedSequence(seed).spawn(2)  # Independent streams from one seed
+        self.dice = Dice((dice.faces, dice.p), rng=np.random.default_rng(tree_seed))
+        self.extra_turns = extra_turns
+        self.simulations = simulations
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self._rollouts = VecGames(num_envs=batch_size, strategies=(rollout_strategy,) * NUM_PLAYERS,
+                                  seed=rollout_seed, dice=(dice.faces, dice.p), extra_turns=extra_turns)
+
+        # Statistics of the last search
+        self.simulations_done = 0
+        self.elapsed = 0.0
+
+    @property
+    def simulations_per_second(self):
+        return self.simulations_done / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        """
+        Describe the last search, e.g. for logging.
+        """
+        return f"{self.simulations_done} simulations, {self.simulations_per_second:.0f} simulations/s"
+
+    def choose(self, players, seat, roll):
+        """
+        Choose the move of the player in `seat` for a roll, e.g. for StrategicPlayer.decide_move.
+
+        Parameters:
+        - players (list): StrategicPlayer objects in seat order.
+        - seat (int): Seat of the player to move.
+        - roll (int): The number rolled.
+
+        Returns:
+        - The index of the pawn to move, or None when no pawn can move.
+        """
+        return self.search(game_state(players), seat, roll)
+
+    def search(self, state, seat, roll):
+        """
+        Search a position (in the format of expectimax.game_state) until the budget is used up.
+
+        Returns:
+        - The index of the pawn to move, or None when no pawn can move.
+        """
+        start = time.perf_counter()
+        deadline = start + self.time_budget if self.time_budget is not None else math.inf
+        budget = self.simulations if self.simulations is not None else math.inf
+        root = self._decision(state, seat, roll)
+        self.simulations_done = 0
+        if root.moves[0] is not None and len(root.moves) > 1:
+            while self.simulations_done < budget and time.perf_counter() < deadline:
+                self._run_batch(root, state, int(min(self.batch_size, budget - self.simulations_done)))
+        self.elapsed = time.perf_counter() - start
+        best = max(range(len(root.moves)), key=lambda i: root.edge_visits[i])
+        return None if root.moves[best] is None else root.moves[best][0]
+
+    def _decision(self, state, seat, roll):
+        """
+        Create the decision node of `seat` with a roll.
+        """
+        moves = []
+        for pawn_index in range(NUM_PAWNS):
+            offset = state[NUM_PAWNS * seat + pawn_index]
+            if offset != HOME_INDEX and offset + roll < PATH_LENGTH:
+                moves.append((pawn_index, offset + roll))
+        return _Decision(seat, roll, moves or [None])
+
+    def _next_seat(self, seat, roll, kill):
+        """
+        Seat to play after a turn, which is the same seat when it earned an extra turn.
+        """
+        if self.extra_turns and (kill or roll in EXTRA_TURN_ROLLS):
+            return seat
+        return (seat + 1) % NUM_PLAYERS
+
+    def _select(self, root, root_state):
+        """
+        Walk down the tree to a new or terminal chance node, adding a virtual visit to every edge on the way.
+
+        Returns:
+        - (path, leaf): the (decision node, edge index) pairs walked, and the chance node reached.
+        """
+        path = []
+        node, state = root, root_state
+        while True:
+            # Pick an edge: unvisited edges first, then UCB1 on the mover's own results
+            if node.visits < len(node.moves):
+                edge = node.edge_visits.index(0)
+            else:
+                log_visits = math.log(node.visits)
+                seat = node.seat
+                edge = max(range(len(node.moves)),
+                           key=lambda i: node.edge_wins[i][seat] / node.edge_visits[i]
+                           + self.exploration * math.sqrt(log_visits / node.edge_visits[i]))
+            path.append((node, edge))
+            node.visits += 1
+            node.edge_visits[edge] += 1
+
+            child = node.children[edge]
+            if child is None:
+                move = node.moves[edge]
+                if move is None:
+                    child = _Chance(state, self._next_seat(node.seat, node.roll, False))
+                else:
+                    child_state, kill = apply_move(state, node.seat, *move)
+                    own = child_state[NUM_PAWNS * node.seat:NUM_PAWNS * node.seat + NUM_PAWNS]
+                    if own[0] == HOME_INDEX and own[1] == HOME_INDEX:
+                        child = _Chance(child_state, node.seat, winner=node.seat)
+                    else:
+                        child = _Chance(child_state, self._next_seat(node.seat, node.roll, kill))
+                node.children[edge] = child
+                return path, child
+            if child.winner is not None:
+                return path, child
+
+            # Chance node: sample the next roll
+            roll = self.dice.roll()
+            state = child.state
+            node = child.children.get(roll)
+            if node is None:
+                node = child.children[roll] = self._decision(state, child.seat, roll)
+
+    def _run_batch(self, root, root_state, size):
+        """
+        Select `size` leaves, play them out in one vectorized simulation and back the results up the tree.
+        """
+        selections = [self._select(root, root_state) for _ in range(size)]
+        rollouts = [leaf for _, leaf in selections if leaf.winner is None]
+        winners = iter(())
+        if rollouts:
+            pawns = np.array([leaf.state for leaf in rollouts], dtype=np.int16).reshape(-1, NUM_PLAYERS, NUM_PAWNS)
+            pawns[pawns == HOME_INDEX] = OFF_BOARD
+            winners = iter(self._rollouts.simulate(pawns, [leaf.seat for leaf in rollouts]).tolist())
+
+        for path, leaf in selections:
+            winner = leaf.winner if leaf.winner is not None else next(winners)
+            if winner < 0:
+                continue  # Rollout hit the turn limit: count it as a draw
+            for node, edge in path:
+                node.edge_wins[edge][winner] += 1.0
+        self.simulations_done += size
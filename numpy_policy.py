@@ -0,0 +1,217 @@
+"""
+Torch-free inference for trained MlpPolicy checkpoints.
+
+export_policy() dumps the layers a checkpoint needs to pick actions (the PPO actor or the DQN Q-network) to a small
+.npz file, and NumpyPolicy runs the same forward pass with NumPy only, so games against a trained agent don't need to
+import stable_baselines3 or torch.
+
+Usage:
+    python numpy_policy.py ppo:ashtachamma_ppo_agent.zip [--output ashtachamma_ppo_agent.npz] [--check N]
+
+Checkpoints are given as <algorithm>:<path>, with algorithm "ppo", "dqn" or "maskable" (sb3-contrib MaskablePPO).
+"""
+import argparse
+import os
+
+import numpy as np
+
+from ashtachamma_obs import find_obs_format, observation_space
+
+ACTIVATIONS = {
+    "identity": lambda x: x,
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0.0),
+}
+MASKED_LOGIT = -1e8  # Logit of actions ruled out by a mask, as in sb3-contrib's MaskableCategorical
+
+
+def load_model(spec):
+    """
+    Load a Stable-Baselines3 checkpoint given as "<algorithm>:<path>".
+
+    Returns:
+    - (algorithm, model)
+    """
+    algorithm, path = spec.split(":", 1)
+    if algorithm == "ppo":
+        from stable_baselines3 import PPO as model_class
+    elif algorithm == "dqn":
+        from stable_baselines3 import DQN as model_class
+    elif algorithm == "maskable":
+        from sb3_contrib import MaskablePPO as model_class
+    else:
+        raise ValueError(f"Unknown algorithm {algorithm!r} in {spec!r}, expected ppo, dqn or maskable")
+    return algorithm, model_class.load(path, device="cpu")
+
+
+def load_policy(spec):
+    """
+    Load a checkpoint to play with, given as "<algorithm>:<path>": a Stable-Baselines3 model ("ppo", "dqn" or
+    "maskable"), or a NumpyPolicy ("numpy") which doesn't import torch.
+
+    Returns:
+    - An object with predict() and observation_space, like a Stable-Baselines3 model.
+    """
+    algorithm, path = spec.split(":", 1)
+    if algorithm == "numpy":
+        return NumpyPolicy(path)
+    return load_model(spec)[1]
+
+
+def _layers(modules):
+    """
+    Convert torch modules applied in sequence into (weight, bias, activation) layers.
+    """
+    import torch.nn as nn
+
+    layers = []
+    for module in modules:
+        if isinstance(module, nn.Linear):
+            layers.append([module.weight.detach().cpu().numpy().T.copy(), module.bias.detach().cpu().numpy().copy(),
+                           "identity"])
+        elif isinstance(module, (nn.Tanh, nn.ReLU)) and layers and layers[-1][2] == "identity":
+            layers[-1][2] = "tanh" if isinstance(module, nn.Tanh) else "relu"
+        else:
+            raise ValueError(f"Can't export {module!r}: only Linear layers with Tanh or ReLU activations are supported")
+    return layers
+
+
+def export_policy(model, path, algorithm=None):
+    """
+    Save the weights needed to pick actions to a compressed .npz file.
+
+    Parameters:
+    - model: PPO, MaskablePPO or DQN model with an MlpPolicy.
+    - path (str): File to write.
+    - algorithm (str): "ppo", "dqn" or "maskable"; guessed from the model when omitted.
+
+    Returns:
+    - str: The path written.
+    """
+    if algorithm is None:
+        name = type(model).__name__
+        algorithm = {"PPO": "ppo", "DQN": "dqn", "MaskablePPO": "maskable"}.get(name)
+        if algorithm is None:
+            raise ValueError(f"Can't export a {name} model, expected PPO, DQN or MaskablePPO")
+
+    if algorithm == "dqn":
+        layers = _layers(model.q_net.q_net)  # Greedy actions maximize the Q-values
+        epsilon = model.exploration_rate  # Sampled predict() actions are epsilon-greedy
+    else:
+        layers = _layers([*model.policy.mlp_extractor.policy_net, model.policy.action_net])  # Action logits
+        epsilon = 0.0
+
+    arrays = {"algorithm": np.array(algorithm), "obs_format": np.array(find_obs_format(model.observation_space)),
+              "epsilon": np.array(epsilon), "activations": np.array([activation for _, _, activation in layers])}
+    for i, (weight, bias, _) in enumerate(layers):
+        arrays[f"weight_{i}"] = weight.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+    with open(path, "wb") as f:  # A file object keeps np.savez from appending ".npz" to the name
+        np.savez_compressed(f, **arrays)
+    return path
+
+
+class NumpyPolicy:
+    """
+    Pick actions like a trained model's predict(), from weights saved by export_policy().
+
+    Deterministic actions match Stable-Baselines3's (up to floating point rounding on near ties). Sampled actions
+    follow the same distribution: the softmax of the PPO logits, or epsilon-greedy for DQN, drawn from a NumPy
+    Generator instead of torch's. As in DQN.predict(), epsilon-greedy draws once per call: with probability epsilon
+    every action of the batch is random, otherwise they are all greedy.
+    """
+
+    def __init__(self, path, rng=None):
+        """
+        Load exported weights.
+
+        Parameters:
+        - path (str): .npz file written by export_policy().
+        - rng (np.random.Generator or int): Random source of sampled actions, or a seed for a new one.
+        """
+        with np.load(path) as data:
+            self.algorithm = str(data["algorithm"])
+            self.obs_format = str(data["obs_format"])
+            self.epsilon = float(data["epsilon"])
+            activations = [str(activation) for activation in data["activations"]]
+            self.layers = [(data[f"weight_{i}"], data[f"bias_{i}"], ACTIVATIONS[activation])
+                           for i, activation in enumerate(activations)]
+        self.observation_space = observation_space(self.obs_format)
+        self.maskable = self.algorithm == "maskable"
+        self.num_actions = self.layers[-1][1].shape[0]
+        self.rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+    def forward(self, obs):
+        """
+        Run a batch of observations through the network.
+
+        Parameters:
+        - obs (np.ndarray): Observations of shape (n,) + observation_space.shape.
+
+        Returns:
+        - (n, num_actions) float32 array of action logits (PPO) or Q-values (DQN).
+        """
+        x = np.asarray(obs, dtype=np.float32).reshape(len(obs), -1)
+        for weight, bias, activation in self.layers:
+            x = activation(x @ weight + bias)
+        return x
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False, action_masks=None):
+        """
+        Get the actions for one observation or a batch of them, with the signature of Stable-Baselines3's predict().
+
+        Parameters:
+        - obs (np.ndarray): One observation, or a batch stacked along the first axis.
+        - deterministic (bool): Whether to pick the most likely action instead of sampling one.
+        - action_masks (np.ndarray): Boolean masks of the valid actions, only used by MaskablePPO policies.
+
+        Returns:
+        - (actions, None), like Stable-Baselines3.
+        """
+        obs = np.asarray(obs)
+        single = obs.shape == self.observation_space.shape
+        if single:
+            obs = obs[None]
+        values = self.forward(obs)
+
+        if self.algorithm == "dqn":
+            actions = values.argmax(axis=1)
+            if not deterministic:
+                if self.rng.random() < self.epsilon:  # One draw for the whole batch, as DQN.predict()
+                    actions = self.rng.integers(self.num_actions, size=len(actions))
+        else:
+            if self.maskable and action_masks is not None:
+                values = np.where(np.asarray(action_masks, dtype=bool).reshape(values.shape), values, MASKED_LOGIT)
+            if deterministic:
+                actions = values.argmax(axis=1)
+            else:
+                probabilities = np.exp(values - values.max(axis=1, keepdims=True))
+                cumulative = np.cumsum(probabilities, axis=1)
+                draws = self.rng.random((len(values), 1)) * cumulative[:, -1:]
+                actions = (draws >= cumulative).sum(axis=1)
+        return (actions[0] if single else actions), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained checkpoint for torch-free NumPy inference")
+    parser.add_argument("checkpoint", help="Checkpoint to export: ppo:PATH, dqn:PATH or maskable:PATH")
+    parser.add_argument("--output", default=None, help="File to write (default: the checkpoint path with .npz)")
+    parser.add_argument("--check", type=int, default=1000,
+                        help="Compare deterministic actions with the original model on this many random observations")
+    args = parser.parse_args()
+
+    algorithm, model = load_model(args.checkpoint)
+    output = args.output or os.path.splitext(args.checkpoint.split(":", 1)[1])[0] + ".npz"
+    export_policy(model, output, algorithm)
+    print(f"Wrote {output} ({os.path.getsize(output)} bytes)")
+
+    if args.check > 0:
+        policy = NumpyPolicy(output)
+        obs = np.stack([policy.observation_space.sample() for _ in range(args.check)])
+        expected, _ = model.predict(obs, deterministic=True)
+        actions, _ = policy.predict(obs, deterministic=True)
+        print(f"Deterministic actions agree on {np.mean(actions == expected):.1%} of {args.check} random observations")
+
+
+if __name__ == "__main__":
+    main()
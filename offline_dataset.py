@@ -0,0 +1,398 @@
+"""
+Offline datasets of heuristic self-play, for pretraining policies by behavior cloning.
+
+Worker processes play many games at once with VecGames, with seat 0 played by a heuristic "teacher" strategy, and
+record each of the teacher's decisions as an (obs, action, reward, done, legal_mask) transition:
+
+    obs         the observation seat 0 gets before moving, in the chosen observation format
+    action      the pawn the teacher chose
+    reward      seat 0's shaped reward for the move, as AshtachammaEnv.step gives it
+    done        whether the game ended before seat 0's next decision
+    legal_mask  which pawns could move with the roll (both False when neither could)
+
+The opponents' turns are played in between, as with fast_forward, so every transition is a decision of seat 0.
+Transitions are written to fixed-size shards: compressed .npz files, or with --format npy one .npy file per field
+that loaders memory-map. Each worker only holds the shard it is filling, so memory use doesn't grow with the size of
+the dataset. Within a shard the transitions are stored step by step, num_envs games at a time, so the transition
+following row i of the same game is row i + num_envs, until it is done.
+
+OfflineDataset reads the shards back in shuffled minibatches, loading the next shard in a background thread, and
+behavior_clone() trains a PPO, MaskablePPO or DQN model to pick the teacher's moves.
+
+Usage:
+    python offline_dataset.py DIR [--transitions N] [--workers N] [--shard-size N] [--num-envs N]
+        [--teacher aggressive|defensive|random] [--opponents random defensive aggressive] [--obs-format FORMAT]
+        [--no-roll-first] [--extra-turns] [--dice d6|cowries|shells] [--format npz|npy] [--seed N]
+"""
+import argparse
+import glob
+import inspect
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from ashtachamma_obs import OBS_FORMATS, ObservationBuilder, find_obs_format
+from ashtachamma_vec_games import NUM_PAWNS, OFF_BOARD, VecGames
+from board_updated import HOME_INDEX, PATH_LENGTH
+from dice import DICE
+
+FIELDS = ("obs", "actions", "rewards", "dones", "legal_masks")
+META_FILE = "dataset.json"
+
+logger = logging.getLogger(__name__)
+
+
+def generate_shards(directory, worker, num_shards, shard_size, seed=0, num_envs=1024, teacher="aggressive",
+                    opponents=("random", "defensive", "aggressive"), obs_format="features", roll_first=True,
+                    extra_turns=False, dice="d6", file_format="npz"):
+    """
+    Play heuristic games and write the teacher's transitions to shards. Runs in a worker process.
+
+    Parameters:
+    - directory (str): Directory receiving the shards.
+    - worker (int): Index of the worker, part of the shard names and of the seed.
+    - num_shards (int): Shards to write.
+    - shard_size (int): Transitions per shard, rounded down to a multiple of num_envs.
+    - seed (int): Seed of the dice and the random strategy, combined with the worker index.
+    - num_envs (int): Games played at once.
+    - teacher (str): Strategy of seat 0, whose decisions are recorded.
+    - opponents (sequence of str): Strategies of seats 1 to 3.
+    - obs_format (str): Observation encoding, one of ashtachamma_obs.OBS_FORMATS.
+    - roll_first (bool): Record observations that show the roll of the turn, as AshtachammaEnv(roll_first=True)
+      does; needs the "features" format. Without it the teacher's choice depends on a roll the observation lacks.
+    - extra_turns, dice: Rules of the games (see AshtachammaEnv).
+    - file_format (str): "npz" for compressed shards, "npy" for memory-mappable ones.
+
+    Returns:
+    - dict with "shards" (list of [name, transitions]), "games" and "wins" (games won by the teacher).
+    """
+    if roll_first and obs_format != "features":
+        raise ValueError(f"roll_first needs an observation that includes the roll, use obs_format='features' "
+                         f"instead of {obs_format!r}")
+    games = VecGames(num_envs, strategies=(teacher,) + tuple(opponents), seed=[seed, worker],
+                     roll_first=roll_first, extra_turns=extra_turns, dice=dice)
+    builder = ObservationBuilder(obs_format, batch_shape=(num_envs,), max_roll=games.dice.max_roll)
+    steps = max(shard_size // num_envs, 1)
+    space = builder.observation_space
+
+    # Shard buffers, filled one step (one decision in every game) at a time
+    buffers = {
+        "obs": np.empty((steps, num_envs) + space.shape, dtype=space.dtype),
+        "actions": np.empty((steps, num_envs), dtype=np.int8),
+        "rewards": np.empty((steps, num_envs), dtype=np.float32),
+        "dones": np.empty((steps, num_envs), dtype=bool),
+        "legal_masks": np.empty((steps, num_envs, NUM_PAWNS), dtype=bool),
+    }
+    obs_pawns = np.empty_like(games.pawns)
+    games.restart_games(np.arange(num_envs))  # Rolls the first turns with roll_first
+
+    shards = []
+    finished = wins = 0
+    for shard in range(num_shards):
+        for step in range(steps):
+            np.copyto(obs_pawns, games.pawns)
+            obs_pawns[obs_pawns == OFF_BOARD] = HOME_INDEX
+            builder.build(obs_pawns, games.current_player, games.last_roll, out=buffers["obs"][step])
+            own = games.pawns[:, 0].copy()
+            roll = games.last_roll.copy() if roll_first else None  # The roll seat 0 is about to play
+            rewards, won = games.play_turns()
+            if roll is None:
+                roll = games.last_roll  # Rolled during the turn
+            np.logical_and(own != OFF_BOARD, own + roll[:, None] < PATH_LENGTH, out=buffers["legal_masks"][step])
+            buffers["actions"][step] = games.last_choice
+
+            # Play the opponents' turns until seat 0 is to move again, then restart the games that are over
+            games.play_opponents(won)
+            buffers["rewards"][step] = rewards
+            buffers["dones"][step] = won
+            if won.any():
+                done_rows = np.flatnonzero(won)
+                finished += len(done_rows)
+                wins += int(np.count_nonzero(games.current_player[done_rows] == 0))
+                games.restart_games(done_rows)
+
+        name = f"shard-{worker:03d}-{shard:05d}"
+        _write_shard(directory, name, {key: value.reshape((-1,) + value.shape[2:]) for key, value in buffers.items()},
+                     file_format)
+        shards.append([name, steps * num_envs])
+    return {"shards": shards, "games": finished, "wins": wins}
+
+
+def _write_shard(directory, name, arrays, file_format):
+    """
+    Write a shard's arrays, under a temporary name first so that readers never see a partial shard.
+    """
+    if file_format == "npz":
+        path = os.path.join(directory, name + ".npz")
+        with open(path + ".tmp", "wb") as f:  # A file object keeps np.savez from appending ".npz" to the name
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+    elif file_format == "npy":
+        for key, value in arrays.items():
+            path = os.path.join(directory, f"{name}.{key}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, value)
+            os.replace(path + ".tmp", path)
+    else:
+        raise ValueError(f"Unknown shard format {file_format!r}, expected 'npz' or 'npy'")
+
+
+def game_options(kwargs):
+    """
+    Resolve the options of generate_shards() that describe the games, filling in the defaults kwargs leaves out.
+
+    Returns:
+    - dict: num_envs, teacher, opponents, obs_format, roll_first, extra_turns and dice.
+    """
+    parameters = inspect.signature(generate_shards).parameters.values()
+    return {parameter.name: kwargs.get(parameter.name, parameter.default) for parameter in parameters
+            if parameter.default is not inspect.Parameter.empty and parameter.name not in ("seed", "file_format")}
+
+
+def generate_dataset(directory, transitions=10_000_000, workers=None, shard_size=2 ** 18, seed=0, file_format="npz",
+                     start_method=None, **kwargs):
+    """
+    Generate a dataset of about `transitions` transitions in a process pool.
+
+    Parameters:
+    - directory (str): Directory receiving the shards and the dataset.json description, created if needed.
+    - transitions (int): Transitions to generate, rounded up to whole shards.
+    - workers (int): Worker processes; defaults to the number of CPUs.
+    - shard_size (int): Transitions per shard.
+    - seed (int): Seed of the dice and the random strategy.
+    - file_format (str): "npz" for compressed shards, "npy" for memory-mappable ones.
+    - start_method (str): multiprocessing start method; defaults to "fork" where available, else "spawn".
+    - kwargs: Options of generate_shards() (num_envs, teacher, opponents, obs_format, roll_first, ...).
+
+    Returns:
+    - dict: The dataset description written to dataset.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    workers = workers or os.cpu_count()
+    num_envs = kwargs.get("num_envs", 1024)
+    shard_size = max(shard_size // num_envs, 1) * num_envs
+    num_shards = math.ceil(transitions / shard_size)
+    workers = min(workers, num_shards)
+    counts = [(num_shards + i) // workers for i in range(workers)]  # Shards per worker
+
+    start = time.perf_counter()
+    if start_method is None:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+    if workers <= 1:
+        results = [generate_shards(directory, 0, num_shards, shard_size, seed, file_format=file_format, **kwargs)]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context(start_method)) as pool:
+            futures = [pool.submit(generate_shards, directory, worker, count, shard_size, seed,
+                                   file_format=file_format, **kwargs) for worker, count in enumerate(counts)]
+            results = [future.result() for future in futures]
+
+    options = {key: list(value) if isinstance(value, tuple) else value
+               for key, value in game_options(kwargs).items()}  # Defaults included, for OfflineDataset.check_options()
+    meta = {
+        "format": file_format,
+        "seed": seed,
+        **options,
+        "shards": [shard for result in results for shard in result["shards"]],
+        "games": sum(result["games"] for result in results),
+        "teacher_wins": sum(result["wins"] for result in results),
+        "elapsed": time.perf_counter() - start,
+    }
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class OfflineDataset:
+    """
+    Shuffled minibatches from the shards of a dataset written by generate_dataset().
+
+    Only the shard being served and the next one, loaded in a background thread, are held in memory (.npy shards
+    are memory-mapped instead), so datasets can be much larger than RAM.
+    """
+
+    def __init__(self, directory):
+        """
+        Open a dataset.
+
+        Parameters:
+        - directory (str): Directory holding the shards and dataset.json.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.shards = [name for name, _ in self.meta["shards"]]
+        self.sizes = [size for _, size in self.meta["shards"]]
+        # Datasets of older versions only recorded the options given explicitly
+        self.options = {**game_options({}), **{key: self.meta[key] for key in game_options({}) if key in self.meta}}
+        self.obs_format = self.options["obs_format"]
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    def check_options(self, **options):
+        """
+        Check that the games of the dataset were played with the options of the environment a model trains on,
+        raising a ValueError otherwise.
+
+        Parameters:
+        - options: Options of generate_shards() to compare, e.g. roll_first, extra_turns and dice.
+        """
+        mismatches = [f"{key}={self.options[key]!r} (expected {value!r})" for key, value in options.items()
+                      if self.options[key] != (list(value) if isinstance(value, tuple) else value)]
+        if mismatches:
+            raise ValueError(f"The dataset {self.directory} was generated with " + ", ".join(mismatches))
+
+    def load_shard(self, name):
+        """
+        Read one shard.
+
+        Returns:
+        - dict of arrays, keyed by FIELDS.
+        """
+        if self.meta["format"] == "npz":
+            with np.load(os.path.join(self.directory, name + ".npz")) as data:
+                return {key: data[key] for key in FIELDS}
+        return {key: np.load(os.path.join(self.directory, f"{name}.{key}.npy"), mmap_mode="r") for key in FIELDS}
+
+    def batches(self, batch_size=256, shuffle=True, seed=None, drop_last=False):
+        """
+        Iterate over the dataset in minibatches.
+
+        Parameters:
+        - batch_size (int): Transitions per batch.
+        - shuffle (bool): Visit the shards, and the transitions within each shard, in random order.
+        - seed (int): Seed of the shuffling.
+        - drop_last (bool): Skip each shard's last batch when it is smaller than batch_size.
+
+        Returns:
+        - Iterator of dicts of arrays keyed by FIELDS.
+        """
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.shards)) if shuffle else np.arange(len(self.shards))
+        if not len(order):
+            return
+        with ThreadPoolExecutor(1) as loader:
+            pending = loader.submit(self.load_shard, self.shards[order[0]])
+            for position in range(len(order)):
+                shard = pending.result()
+                if position + 1 < len(order):
+                    pending = loader.submit(self.load_shard, self.shards[order[position + 1]])
+                size = len(shard["actions"])
+                rows = rng.permutation(size) if shuffle else np.arange(size)
+                for begin in range(0, size, batch_size):
+                    batch = rows[begin:begin + batch_size]
+                    if drop_last and len(batch) < batch_size:
+                        break
+                    if not shuffle:
+                        batch = slice(begin, begin + batch_size)  # Contiguous reads from memory-mapped shards
+                    yield {key: np.asarray(shard[key][batch]) for key in FIELDS}
+
+
+def behavior_clone(model, dataset, epochs=1, batch_size=256, learning_rate=None, seed=None):
+    """
+    Train a model to pick the teacher's moves by maximizing their likelihood (PPO, MaskablePPO) or by treating the
+    Q-values as logits of a cross entropy (DQN), skipping the transitions where no pawn could move.
+
+    Parameters:
+    - model: PPO, MaskablePPO or DQN model whose observation format matches the dataset's.
+    - dataset (OfflineDataset): Transitions to learn from.
+    - epochs (int): Passes over the dataset.
+    - batch_size (int): Transitions per gradient step.
+    - learning_rate (float): Learning rate of the steps; defaults to the model's current one.
+    - seed (int): Seed of the shuffling.
+
+    Returns:
+    - list of (loss, accuracy) of each epoch, the accuracy being how often the model's most likely move was the
+      teacher's.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    obs_format = find_obs_format(model.observation_space)
+    if obs_format != dataset.obs_format:
+        raise ValueError(f"The model observes {obs_format!r} observations but the dataset holds "
+                         f"{dataset.obs_format!r} ones")
+    policy = model.policy
+    optimizer = policy.optimizer
+    if learning_rate is not None:
+        for group in optimizer.param_groups:
+            group["lr"] = learning_rate
+    is_dqn = hasattr(model, "q_net")
+    maskable = not is_dqn and "action_masks" in inspect.signature(policy.get_distribution).parameters
+    policy.set_training_mode(True)
+
+    history = []
+    for epoch in range(epochs):
+        total_loss = total_correct = total = 0
+        for batch in dataset.batches(batch_size, seed=None if seed is None else seed + epoch):
+            keep = batch["legal_masks"].any(axis=1)
+            if not keep.any():
+                continue
+            obs, _ = policy.obs_to_tensor(batch["obs"][keep])
+            actions = torch.as_tensor(batch["actions"][keep], dtype=torch.long, device=policy.device)
+            if is_dqn:
+                logits = model.q_net(obs)
+            elif maskable:  # Only the legal moves compete
+                logits = policy.get_distribution(obs, action_masks=batch["legal_masks"][keep]).distribution.logits
+            else:
+                logits = policy.get_distribution(obs).distribution.logits
+            loss = F.cross_entropy(logits, actions)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(policy.parameters(), model.max_grad_norm)
+            optimizer.step()
+            total_loss += loss.item() * len(actions)
+            total_correct += (logits.argmax(dim=1) == actions).sum().item()
+            total += len(actions)
+        history.append((total_loss / max(total, 1), total_correct / max(total, 1)))
+        logger.info("Behavior cloning epoch %s: loss %.4f, accuracy %.3f", epoch + 1, *history[-1])
+    if is_dqn:
+        model.q_net_target.load_state_dict(model.q_net.state_dict())
+    policy.set_training_mode(False)
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate an offline dataset of heuristic Ashta Chamma moves")
+    parser.add_argument("directory", help="Directory receiving the shards")
+    parser.add_argument("--transitions", type=int, default=10_000_000, help="Transitions to generate")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--shard-size", type=int, default=2 ** 18, help="Transitions per shard")
+    parser.add_argument("--num-envs", type=int, default=1024, help="Games each worker plays at once")
+    parser.add_argument("--teacher", choices=["aggressive", "defensive", "random"], default="aggressive",
+                        help="Strategy of seat 0, whose moves are recorded")
+    parser.add_argument("--opponents", nargs=3, default=["random", "defensive", "aggressive"],
+                        choices=["random", "aggressive", "defensive"], help="Strategies of seats 1 to 3")
+    parser.add_argument("--obs-format", choices=OBS_FORMATS, default="features", help="Observation encoding")
+    parser.add_argument("--no-roll-first", action="store_true",
+                        help="Record observations taken before the roll, as AshtachammaEnv gives without --roll-first")
+    parser.add_argument("--extra-turns", action="store_true",
+                        help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+    parser.add_argument("--dice", choices=DICE, default="d6", help="Dice outcome distribution")
+    parser.add_argument("--format", choices=["npz", "npy"], default="npz",
+                        help="Compressed .npz shards, or .npy shards that are memory-mapped when read")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the dice and the random strategy")
+    args = parser.parse_args()
+    if not args.no_roll_first and args.obs_format != "features":
+        parser.error("Observations that show the roll need --obs-format features, or pass --no-roll-first")
+
+    meta = generate_dataset(args.directory, transitions=args.transitions, workers=args.workers,
+                            shard_size=args.shard_size, seed=args.seed, file_format=args.format,
+                            num_envs=args.num_envs, teacher=args.teacher, opponents=tuple(args.opponents),
+                            obs_format=args.obs_format, roll_first=not args.no_roll_first,
+                            extra_turns=args.extra_turns, dice=args.dice)
+    size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(args.directory, "shard-*")))
+    total = sum(count for _, count in meta["shards"])
+    print(f"Wrote {total} transitions in {len(meta['shards'])} shards ({size / 2 ** 20:.1f} MiB) in "
+          f"{meta['elapsed']:.1f}s, {total / meta['elapsed']:.0f} transitions/s; the teacher won "
+          f"{meta['teacher_wins']} of {meta['games']} games")
+
+
+if __name__ == "__main__":
+    main()
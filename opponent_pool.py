@@ -0,0 +1,245 @@
+"""
+Pool of opponents for self-play: frozen checkpoints, and optionally the heuristic strategies, that the environments
+draw the "pool" seats from at every reset.
+
+Opponents are sampled with prioritized fictitious self-play: an opponent is drawn with a weight of
+(1 - p) ** power, where p is the agent's smoothed win rate in the games it played against it, so the opponents
+that still beat the agent are met most often while every opponent keeps a min_weight share. Loaded policies are
+kept in an LRU cache, so drawing an opponent that was met recently costs a dictionary lookup rather than a
+PPO.load() from disk. Exported NumPy policies (see numpy_policy.py) are the cheapest to load and to run.
+
+Opponents are given as specs: "random", "aggressive" or "defensive" for a heuristic strategy, or
+"<algorithm>:<path>" for a checkpoint (see numpy_policy.load_policy). The path of a checkpoint spec may be a glob
+pattern, e.g. "ppo:checkpoints/*.zip", which is polled for new files every refresh_interval seconds while
+training writes them, so the league grows with the agent. Matched checkpoints whose file has since been deleted
+(e.g. rotated away by AsyncCheckpointCallback's keep_last) are retired: they keep their id and statistics but are
+no longer drawn, and a checkpoint that fails to load is retired and replaced by another opponent. Every process keeps
+its own pool (and statistics) when the environments are spread across worker processes.
+"""
+import glob
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ashtachamma_obs import find_obs_format
+
+HEURISTICS = ("random", "aggressive", "defensive")
+SETTLE_TIME = 2.0  # Seconds a checkpoint file must be left unchanged before it joins the pool
+
+logger = logging.getLogger(__name__)
+
+
+class FrozenPolicy:
+    """
+    A loaded checkpoint playing a seat: picks pawns from observations of the board as seen from that seat.
+    """
+
+    def __init__(self, model, deterministic=False):
+        """
+        Parameters:
+        - model: Stable-Baselines3 model or NumpyPolicy.
+        - deterministic (bool): Pick the most likely pawn instead of sampling one.
+        """
+        self.model = model
+        self.deterministic = deterministic
+        self.obs_format = find_obs_format(model.observation_space)
+        self.maskable = getattr(model, "maskable", "action_masks" in inspect.signature(model.predict).parameters)
+
+    def act(self, obs, action_masks=None):
+        """
+        Pick a pawn for each observation of a batch.
+
+        Parameters:
+        - obs (np.ndarray): Batch of observations in the policy's obs_format, from the seat's point of view.
+        - action_masks (np.ndarray): Boolean masks of the valid pawns, only used by maskable policies.
+
+        Returns:
+        - np.ndarray of pawn indices.
+        """
+        if self.maskable and action_masks is not None:
+            actions, _ = self.model.predict(obs, deterministic=self.deterministic, action_masks=action_masks)
+        else:
+            actions, _ = self.model.predict(obs, deterministic=self.deterministic)
+        return np.asarray(actions, dtype=np.intp).reshape(len(obs))
+
+
+class OpponentPool:
+    """
+    Opponents with prioritized sampling and an LRU cache of loaded policies.
+    """
+
+    def __init__(self, specs=(), capacity=16, power=2.0, min_weight=0.05, deterministic=False,
+                 refresh_interval=30.0, seed=None):
+        """
+        Parameters:
+        - specs (iterable of str): Opponents: heuristic strategy names, or "<algorithm>:<path>" checkpoints whose
+          path may be a glob pattern.
+        - capacity (int): Most checkpoints kept loaded at once; the least recently drawn is dropped first.
+        - power (float): Exponent of the prioritized sampling weight (1 - p) ** power; 0 samples uniformly.
+        - min_weight (float): Smallest weight of an opponent, so that beaten ones are still met now and then.
+        - deterministic (bool): Checkpoints pick their most likely pawn instead of sampling one.
+        - refresh_interval (float): Seconds between two polls of the glob patterns for new checkpoints.
+        - seed (int): Seed of the sampling, used when sample() isn't given a generator.
+        """
+        self.capacity = capacity
+        self.power = power
+        self.min_weight = min_weight
+        self.deterministic = deterministic
+        self.refresh_interval = refresh_interval
+        self.rng = np.random.default_rng(seed)
+        self.specs = []  # Spec of every opponent, indexed by the ids sample() returns
+        self.patterns = []  # Glob pattern specs polled by refresh()
+        self.games = np.zeros(0)  # Games the agent played against each opponent
+        self.wins = np.zeros(0)  # Games of those the agent won
+        self.active = np.zeros(0, dtype=bool)  # Whether each opponent can still be drawn
+        self._matched = set()  # Ids of the checkpoints found by the glob patterns
+        self._cache = OrderedDict()  # Opponent id -> FrozenPolicy, least recently used first
+        self._refreshed = -np.inf
+        for spec in specs:
+            if ":" in spec and glob.has_magic(spec.split(":", 1)[1]):
+                self.patterns.append(spec)
+            else:
+                self.add(spec)
+        self.refresh()
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __getstate__(self):
+        # Worker processes load their own policies rather than receiving the parent's
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        return state
+
+    def add(self, spec):
+        """
+        Add an opponent, unless it is in the pool already.
+
+        Parameters:
+        - spec (str): Heuristic strategy name or "<algorithm>:<path>" checkpoint.
+
+        Returns:
+        - int: The opponent's id.
+        """
+        if spec in self.specs:
+            opponent_id = self.specs.index(spec)
+            self.active[opponent_id] = True  # E.g. a retired checkpoint written again under the same name
+            return opponent_id
+        if ":" not in spec and spec not in HEURISTICS:
+            raise ValueError(f"Unknown opponent {spec!r}, expected one of {HEURISTICS} or ALGORITHM:PATH")
+        self.specs.append(spec)
+        self.games = np.append(self.games, 0.0)
+        self.wins = np.append(self.wins, 0.0)
+        self.active = np.append(self.active, True)
+        return len(self.specs) - 1
+
+    def retire(self, opponent_id):
+        """
+        Stop drawing an opponent, e.g. a checkpoint whose file was deleted. Its id and statistics are kept, as games
+        in progress may still be playing it.
+        """
+        self.active[opponent_id] = False
+        self._cache.pop(opponent_id, None)
+
+    def refresh(self):
+        """
+        Add the checkpoints matching the glob patterns that aren't in the pool yet, and retire the matched ones
+        whose file is gone.
+        """
+        self._refreshed = time.monotonic()
+        if self.patterns:
+            from evaluate import expand_specs
+            self._matched.update(self.add(spec) for spec in expand_specs(self.patterns, SETTLE_TIME))
+            for opponent_id in self._matched:
+                if self.active[opponent_id] and not os.path.exists(self.specs[opponent_id].split(":", 1)[1]):
+                    self.retire(opponent_id)
+
+    def weights(self):
+        """
+        Sampling weight of each opponent, from the agent's win rate against it (1/2 before any game); 0 once retired.
+        """
+        win_rate = (self.wins + 1.0) / (self.games + 2.0)
+        return np.where(self.active, np.maximum((1.0 - win_rate) ** self.power, self.min_weight), 0.0)
+
+    def sample(self, size=None, rng=None):
+        """
+        Draw opponents by priority.
+
+        Parameters:
+        - size (int or tuple): Shape of the ids to draw; None draws a single id.
+        - rng (np.random.Generator): Random source, e.g. the environment's, so that seeded games stay reproducible;
+          defaults to the pool's own.
+
+        Returns:
+        - int or np.ndarray of opponent ids.
+        """
+        if self.patterns and time.monotonic() - self._refreshed >= self.refresh_interval:
+            self.refresh()
+        if not self.active.any():
+            raise ValueError("The opponent pool is empty: no checkpoint matches " + ", ".join(self.patterns)
+                             + "; add a heuristic strategy to the pool to start without checkpoints")
+        cumulative = np.cumsum(self.weights())
+        draws = (rng or self.rng).random(size) * cumulative[-1]
+        return cumulative.searchsorted(draws, side="right")  # Much cheaper than Generator.choice() with p
+
+    def get(self, opponent_id):
+        """
+        Get an opponent, loading its checkpoint unless it is cached. A checkpoint that fails to load, e.g. because
+        it was deleted since the last refresh(), is retired and another opponent is drawn in its place.
+
+        Returns:
+        - str for a heuristic strategy, or a FrozenPolicy.
+        """
+        spec = self.specs[opponent_id]
+        if ":" not in spec:
+            return spec
+        policy = self._cache.get(opponent_id)
+        if policy is not None:
+            self._cache.move_to_end(opponent_id)
+            return policy
+        if not self.active[opponent_id]:
+            return self.get(self.sample())  # Retired after it was drawn, e.g. by another seat of the same game
+        from numpy_policy import load_policy
+        try:
+            policy = FrozenPolicy(load_policy(spec), self.deterministic)
+        except Exception as error:  # Don't let one unreadable checkpoint stop training
+            self.retire(opponent_id)
+            if not self.active.any():
+                raise
+            logger.warning("Dropping opponent %s from the pool, it failed to load: %s", spec, error)
+            return self.get(self.sample())
+        self._cache[opponent_id] = policy
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+        return policy
+
+    def update(self, opponent_ids, agent_won):
+        """
+        Count finished games against some opponents.
+
+        Parameters:
+        - opponent_ids (int or np.ndarray): Opponents of the games, repeated for an opponent met in several seats.
+        - agent_won (bool or np.ndarray): Whether the agent won each of the games, broadcast to opponent_ids.
+        """
+        opponent_ids = np.asarray(opponent_ids, dtype=np.intp)
+        agent_won = np.broadcast_to(agent_won, opponent_ids.shape)
+        np.add.at(self.games, opponent_ids.ravel(), 1.0)
+        np.add.at(self.wins, opponent_ids.ravel(), agent_won.ravel().astype(float))
+
+    def stats(self):
+        """
+        Get each opponent's record against the agent.
+
+        Returns:
+        - list of {"spec", "games", "win_rate", "weight", "active"} dicts, win_rate being the agent's.
+        """
+        weights = self.weights()
+        return [{"spec": spec, "games": int(games), "win_rate": float(wins / games) if games else None,
+                 "weight": float(weight), "active": bool(active)}
+                for spec, games, wins, weight, active in zip(self.specs, self.games, self.wins,
+                                                             weights / weights.sum(), self.active)]
+
@@ -0,0 +1,135 @@
+"""
+Seeded parity check of VecGames against AshtachammaEnv and StrategicPlayer.
+
+Plays games in AshtachammaEnv with roll_first, so that each turn's roll is known before it is played, and replays
+every turn in a one-game VecGames set to the same position and roll: the agent's (random) pawn choice in seat 0,
+the heuristic strategies' choices in the other seats. After each turn both must agree on the pawns, the scores,
+seat 0's shaped reward, whether the game was won and who moves next. The "random" strategy draws from different
+random sources in the two implementations, so only the deterministic "aggressive" and "defensive" seats are
+compared. Every combination of dice and extra_turns is checked unless --dice or --extra-turns narrow it down.
+
+Usage:
+    python parity.py [--games N] [--seed N] [--dice d6|cowries|shells] [--extra-turns]
+        [--opponents aggressive defensive aggressive]
+
+Exits with status 1 at the first turn the implementations disagree on, after printing both sides.
+"""
+import argparse
+import itertools
+import sys
+
+import numpy as np
+
+from ashtachamma_env import AshtachammaEnv
+from ashtachamma_vec_games import OFF_BOARD, VecGames
+from dice import DICE
+
+DETERMINISTIC_STRATEGIES = ("aggressive", "defensive")
+
+
+def scalar_state(env):
+    """
+    Position of an AshtachammaEnv in VecGames' encoding.
+
+    Returns:
+    - (pawns, scores): (4, 2) path offsets with OFF_BOARD for pawns at home, and (4,) scores.
+    """
+    pawns = np.array([[OFF_BOARD if pawn is None else pawn for pawn in player.pawns] for player in env.players])
+    scores = np.array([player.score for player in env.players])
+    return pawns, scores
+
+
+def check_game(env, games, seed, rng):
+    """
+    Play one game in env, replaying every turn in games, and raise an AssertionError describing the first turn the
+    implementations disagree on.
+
+    Parameters:
+    - env (AshtachammaEnv): Environment with roll_first, playing the game.
+    - games (VecGames): One game with roll_first and the same strategies and rules, replaying each turn.
+    - seed (int): Seed of the game's dice.
+    - rng (np.random.Generator): Source of the agent's pawn choices.
+
+    Returns:
+    - int: Turns compared.
+    """
+    env.reset(seed=seed)
+    terminated = False
+    turns = 0
+    while not terminated:
+        pawns, scores = scalar_state(env)
+        games.pawns[0], games.scores[0] = pawns, scores
+        games.current_player[0] = env.current_player_index
+        games.last_roll[0] = env.last_roll
+        action = int(rng.integers(2))
+        before = (pawns, env.current_player_index, env.last_roll, action)
+
+        _, reward, terminated, _, _ = env.step(action)
+        rewards, won = games.play_turns(np.array([action]))
+        turns += 1
+
+        pawns, scores = scalar_state(env)
+        mismatches = []
+        if not np.array_equal(games.pawns[0], pawns):
+            mismatches.append(f"pawns {games.pawns[0].tolist()} != {pawns.tolist()}")
+        if not np.array_equal(games.scores[0], scores):
+            mismatches.append(f"scores {games.scores[0].tolist()} != {scores.tolist()}")
+        if not np.isclose(rewards[0], reward, atol=1e-5):
+            mismatches.append(f"reward {rewards[0]:.2f} != {reward:.2f}")
+        if bool(won[0]) != terminated:
+            mismatches.append(f"won {bool(won[0])} != {terminated}")
+        if not terminated and games.current_player[0] != env.current_player_index:
+            mismatches.append(f"next player {games.current_player[0]} != {env.current_player_index}")
+        if mismatches:
+            raise AssertionError(f"Turn {turns} from pawns {before[0].tolist()}, seat {before[1]} to move, roll "
+                                 f"{before[2]}, action {before[3]}: VecGames vs AshtachammaEnv: "
+                                 + "; ".join(mismatches))
+    return turns
+
+
+def check_parity(games=200, seed=0, opponents=("aggressive", "defensive", "aggressive"), extra_turns=False,
+                 dice="d6"):
+    """
+    Check that VecGames plays games of some rules exactly as AshtachammaEnv does.
+
+    Parameters:
+    - games (int): Games to play.
+    - seed (int): Seed of the first game's dice and of the agent's choices; game i uses seed + i.
+    - opponents (sequence of str): Strategies of seats 1 to 3, "aggressive" or "defensive".
+    - extra_turns, dice: Rules of the games (see AshtachammaEnv).
+
+    Returns:
+    - int: Turns compared.
+    """
+    strategies = ("RL",) + tuple(opponents)
+    env = AshtachammaEnv(roll_first=True, obs_format="features", extra_turns=extra_turns, dice=dice,
+                         strategies=strategies)
+    vec_games = VecGames(num_envs=1, strategies=strategies, roll_first=True, extra_turns=extra_turns, dice=dice)
+    rng = np.random.default_rng(seed)
+    return sum(check_game(env, vec_games, seed + game, rng) for game in range(games))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that VecGames matches AshtachammaEnv turn by turn")
+    parser.add_argument("--games", type=int, default=200, help="Games per combination of rules")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the dice and the agent's choices")
+    parser.add_argument("--dice", choices=DICE, default=None, help="Only check these dice (default: all)")
+    parser.add_argument("--extra-turns", action="store_true",
+                        help="Only check games with extra turns (default: with and without)")
+    parser.add_argument("--opponents", nargs=3, choices=DETERMINISTIC_STRATEGIES,
+                        default=["aggressive", "defensive", "aggressive"], help="Strategies of seats 1 to 3")
+    args = parser.parse_args()
+
+    dice_options = [args.dice] if args.dice else list(DICE)
+    extra_turn_options = [True] if args.extra_turns else [False, True]
+    for dice, extra_turns in itertools.product(dice_options, extra_turn_options):
+        try:
+            turns = check_parity(args.games, args.seed, args.opponents, extra_turns=extra_turns, dice=dice)
+        except AssertionError as error:
+            print(f"dice={dice} extra_turns={extra_turns}: MISMATCH\n{error}")
+            sys.exit(1)
+        print(f"dice={dice} extra_turns={extra_turns}: {args.games} games, {turns} turns match")
+
+
+if __name__ == "__main__":
+    main()
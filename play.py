@@ -1,8 +1,26 @@
+import argparse
+import logging
+
 import pygame
-from board_updated import Board
+from board_updated import Board, PATH_INDEX
 from feat_StrategicPlayers_updated import StrategicPlayer
 
 
+# Parse command line options
+parser = argparse.ArgumentParser(description="Watch four strategies play Ashta Chamma")
+parser.add_argument("--agent", default=None,
+                    help="Checkpoint playing the first seat, e.g. numpy:ashtachamma_ppo_agent.npz (exported with "
+                         "numpy_policy.py, no torch needed) or ppo:ashtachamma_ppo_agent.zip")
+parser.add_argument("--roll-first", action="store_true",
+                    help="The --agent checkpoint was trained with --roll-first: show it the roll it moves with")
+parser.add_argument("--record", default=None,
+                    help="Record the game to a chunk file in this directory, to replay it with game_records.py")
+args = parser.parse_args()
+
+# Show the game's progress on the console
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
 # Initialize pygame
 pygame.init()
 
@@ -24,13 +42,19 @@ start_positions = [
 
 colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]  # Colors for players: Red, Green, Blue, Yellow
 strategies = ["defensive", "aggressive", "defensive", "aggressive"]  # Strategies for each player
+agent = None
+if args.agent:
+    from tournament import CheckpointAgent
+    # Trained policy choosing the first player's moves
+    agent = CheckpointAgent(args.agent, game_board.dice.max_roll, args.roll_first)
+    strategies[0] = "RL"
 
 # Add players to the game
 for i in range(len(start_positions)):
     # Create a StrategicPlayer instance for each player
     player = StrategicPlayer(
         player_id=i,  # Unique ID for each player
-        start_positions=start_positions[i],  # Initial positions of pawns
+        start_positions=[PATH_INDEX[i][position] for position in start_positions[i]],  # Initial path offsets
         color=colors[i],  # Color assigned to the player
         strategy=strategies[i]  # Strategy assigned to the player
     )
@@ -38,10 +62,19 @@ for i in range(len(start_positions)):
 
 players = game_board.players  # Reference to all players in the game
 
+# Record every turn of the game, if requested
+recorder = log = None
+winner_id = None  # Seat of the winner, once there is one
+if args.record:
+    from game_records import GameLog, GameRecorder
+    recorder = GameRecorder(args.record, prefix="play")
+    log = GameLog()
+
 # Game loop
 running = True  # Flag to keep the game running
 clock = pygame.time.Clock()  # Clock object to control the frame rate
 current_player_id = 0  # ID of the player whose turn it is
+last_roll = 0  # Roll of the previous turn, shown to an agent trained without --roll-first
 
 while running:
     # Handle events
@@ -55,35 +88,39 @@ while running:
 
     # Perform a move for the current player
     current_player = game_board.players[current_player_id]  # Get the current player
-    possible_moves = []  # List to store all possible moves for the player
     roll = game_board.diceRoll()  # Simulate rolling a dice
 
-    # Calculate possible moves for each pawn of the current player
-    for pawn_index, pawn in enumerate(current_player.pawns):
-        if pawn is None:  # Skip pawns that are no longer in play
-            continue
-        # Use the move function from Board to calculate the new position
-        new_position = game_board.move(current_player, pawn_index, roll)
-        if new_position != pawn:  # Check if the pawn can move
-            # Append the move information as a tuple
-            possible_moves.append((current_player_id, current_player.kill, pawn_index, new_position))
+    # Calculate possible moves for each pawn (this does not change the board)
+    possible_moves = game_board.legal_moves(current_player, roll)
 
     # If there are possible moves, decide and execute the best move
     if possible_moves:
-        chosen_move = current_player.decide_move(possible_moves, game_board.players)  # Choose a move based on strategy
-        _, _, pawn_index, new_position = chosen_move  # Unpack the chosen move
-        print(chosen_move)  # Print the chosen move
-        current_player.update_position(pawn_index, new_position)  # Update the pawn's position
-
-    # Check if the current player has won
-    win, winner = game_board.check_winner(chosen_move)  # Check for a winning condition
-    if win:
-        # Announce the winner and their strategy
-        print(f"Player {winner.player_id} wins!")
-        print(f"Player {winner.player_id} strategy: {winner.strategy}")
-        # Display the scores of all players
-        print(f"The scores of all players are: {[player.score for player in game_board.players]}")
-        running = False  # End the game
+        if agent is not None and current_player_id == 0:
+            # Ask the policy
+            chosen_move = agent.choose(possible_moves, game_board.players, current_player_id, roll,
+                                       last_roll=last_roll)
+        else:
+            # Choose a move by strategy
+            chosen_move = current_player.decide_move(possible_moves, game_board.players, roll)
+        logger.info("Chosen move: %s", chosen_move)  # Log the chosen move
+        if log is not None:
+            log.record(current_player_id, roll, chosen_move, current_player.pawns[chosen_move[2]])
+        game_board.apply_move(chosen_move)  # Move the pawn and capture any opponent pawn
+
+        # Check if the current player has won
+        win, winner = game_board.check_winner(chosen_move)  # Check for a winning condition
+        if win:
+            # Announce the winner and their strategy
+            logger.info("Player %s wins!", winner.player_id)
+            logger.info("Player %s strategy: %s", winner.player_id, winner.strategy)
+            # Display the scores of all players
+            logger.info("The scores of all players are: %s", [player.score for player in game_board.players])
+            winner_id = winner.player_id
+            running = False  # End the game
+    elif log is not None:
+        log.record(current_player_id, roll)  # No pawn could move
+
+    last_roll = roll
 
     # Cycle to the next player
     current_player_id = (current_player_id + 1) % len(game_board.players)  # Move to the next player's turn
@@ -94,5 +131,11 @@ while running:
     # Update the display
     pygame.display.flip()  # Update the screen with the latest changes
 
+# Save the recorded game, without a winner if the window was closed first
+if recorder is not None:
+    recorder.add(log, winner_id)
+    recorder.close()
+    logger.info("Recorded the game to %s", args.record)
+
 # Quit the game
 pygame.quit()  # Cleanly exit the game
@@ -0,0 +1,523 @@
+"""
+Headless tournament between the heuristic strategies and trained checkpoints.
+
+Games are played in a process pool without rendering. Each sampled lineup of four participants is played in all
+four seat rotations to cancel first-mover bias, and results are merged (and optionally streamed to a JSON lines
+file) as each batch finishes. Participants are rated with a Luce choice model fitted to the winners, on the Elo
+scale, and the tournament stops early once every rating's 95% confidence interval is tight enough.
+
+Usage:
+    python tournament.py random aggressive defensive [expectimax] [mcts] [ppo:ashtachamma_ppo_agent.zip ...]
+        [--games N] [--workers N] [--chunk N] [--tolerance ELO] [--results FILE] [--seed N]
+        [--dice d6|cowries|shells] [--extra-turns] [--time-budget SECONDS] [--simulations N]
+        [--concurrency N] [--max-wait SECONDS] [--record DIR] [--roll-first]
+
+Checkpoints are given as <algorithm>:<path>, with algorithm "ppo", "dqn", "maskable" (sb3-contrib MaskablePPO) or
+"numpy" (a .npz file exported by numpy_policy.py, which plays without importing torch).
+With --concurrency N each worker plays N games at once in threads, and checkpoints evaluate the positions of all of
+them in batched forward passes (see batched_policy.BatchedPolicy).
+Checkpoints see the roll as they saw it in training: scaled by the tournament's dice, and with --roll-first the roll
+they move with, otherwise the previous turn's roll as AshtachammaEnv shows it without roll_first.
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from board_updated import Board, EXTRA_TURN_ROLLS, HOME_INDEX
+from dice import DICE, Dice
+from feat_StrategicPlayers_updated import StrategicPlayer
+
+NUM_SEATS = 4
+STRATEGIES = ("random", "aggressive", "defensive", "expectimax", "mcts")
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]  # Red, Green, Blue, Yellow
+MAX_TURNS = 10000  # Games still running after this many turns are counted as draws
+Z = 1.96  # 95% confidence
+ELO_SCALE = 400 / math.log(10)  # Elo points per unit of log-strength
+
+_AGENTS = {}  # Checkpoint agents loaded by this process, by participant spec
+
+
+class CheckpointAgent:
+    """
+    Choose moves with a trained Stable-Baselines3 policy.
+
+    The policy was trained in seat 0, so it is shown the board from the seat it plays: the players are listed
+    starting from its own seat. Every seat's path is a rotation of seat 0's, so this view is exact. The roll and the
+    action mask are built as AshtachammaEnv built them in training, with or without roll_first.
+    """
+
+    def __init__(self, spec, max_roll=6, roll_first=False):
+        """
+        Load a checkpoint.
+
+        Parameters:
+        - spec (str): "<algorithm>:<path>", with algorithm "ppo", "dqn", "maskable" or "numpy".
+        - max_roll (int): Highest roll of the dice being played, which "features" observations scale to 1; the
+          checkpoint must have been trained with the same dice.
+        - roll_first (bool): Whether the checkpoint was trained with roll_first, seeing the roll it moves with.
+          Otherwise it sees the previous turn's roll, and maskable policies may pick any pawn that isn't home.
+        """
+        from ashtachamma_obs import ObservationBuilder, find_obs_format
+        from batched_policy import BatchedPolicy
+        from numpy_policy import load_policy
+
+        self.model = load_policy(spec)
+        self.policy = BatchedPolicy(self.model, deterministic=True)
+        self.roll_first = roll_first
+        self._obs_builder = ObservationBuilder(find_obs_format(self.model.observation_space), max_roll=max_roll)
+        self._pawns = np.empty((NUM_SEATS, 2), dtype=np.int16)
+
+    def choose(self, moves, players, seat, roll, batched=False, last_roll=0):
+        """
+        Pick one of the legal moves for the player in `seat`.
+
+        With `batched`, the position is evaluated together with those of the other games running in this process
+        in threads, in one forward pass; otherwise it is evaluated right away on its own. Without roll_first the
+        observation shows last_roll, the roll of the game's previous turn (0 on the first one), instead of roll.
+        """
+        if batched:  # Other game threads use the agent at the same time: don't share buffers with them
+            pawns = np.empty((NUM_SEATS, 2), dtype=np.int16)
+            space = self._obs_builder.observation_space
+            out = np.empty(space.shape, dtype=space.dtype)
+        else:
+            pawns = self._pawns
+            out = None
+        for i in range(NUM_SEATS):
+            for j, offset in enumerate(players[(seat + i) % NUM_SEATS].pawns):
+                pawns[i, j] = HOME_INDEX if offset is None else offset
+        obs = self._obs_builder.build(pawns, 0, roll if self.roll_first else last_roll, out=out)
+        mask = None
+        if self.policy.maskable:  # As AshtachammaEnv.action_masks
+            if self.roll_first:
+                mask = np.zeros(2, dtype=bool)
+                mask[[move[2] for move in moves]] = True
+            else:
+                mask = np.array([pawn is not None for pawn in players[seat].pawns])
+        if batched:
+            action = self.policy.predict(obs, mask)
+        else:
+            action = self.policy.predict_batch(obs[None], None if mask is None else mask[None])[0]
+        for move in moves:
+            if move[2] == int(action):
+                return move
+        return moves[0]  # The chosen pawn can't move: play the one that can, as action masking would
+
+
+def _agent(spec, max_roll=6, roll_first=False):
+    """
+    Get the checkpoint agent for a participant, loading it on first use in this process.
+    """
+    key = (spec, max_roll, roll_first)
+    agent = _AGENTS.get(key)
+    if agent is None:
+        agent = _AGENTS[key] = CheckpointAgent(spec, max_roll, roll_first)
+    return agent
+
+
+def play_game(lineup, dice, rng, extra_turns=False, searches=None, batched=False, log=None, roll_first=False):
+    """
+    Play one game without rendering.
+
+    Parameters:
+    - lineup (sequence of str): Participant spec playing each seat, seat 0 moving first.
+    - dice (Dice): Dice to roll.
+    - rng (random.Random): Random source of the "random" strategy.
+    - extra_turns (bool): Give a player another turn after rolling a 4 or 8 or capturing a pawn.
+    - searches (dict): Search used by each search strategy ("expectimax", "mcts") in the lineup.
+    - batched (bool): Batch the checkpoints' forward passes with the games running in other threads.
+    - log (game_records.GameLog): Record every turn of the game to it.
+    - roll_first (bool): The checkpoints were trained with roll_first (see CheckpointAgent).
+
+    Returns:
+    - The winning seat, or None if the game reached MAX_TURNS.
+    """
+    board = Board(dice=dice)
+    for seat, spec in enumerate(lineup):
+        strategy = spec if spec in STRATEGIES else "RL"
+        board.add_player(StrategicPlayer(seat, [0, 1], COLORS[seat], strategy=strategy, log_moves=False, rng=rng,
+                                         search=searches.get(strategy) if searches else None))
+    agents = [None if spec in STRATEGIES else _agent(spec, dice.max_roll, roll_first) for spec in lineup]
+    players = board.players
+
+    seat = 0
+    last_roll = 0  # Roll of the previous turn, which checkpoints trained without roll_first see
+    for _ in range(MAX_TURNS):
+        player = players[seat]
+        roll = board.diceRoll()
+        moves = board.legal_moves(player, roll)
+        kill = False
+        if moves:
+            agent = agents[seat]
+            if agent is None:
+                move = player.decide_move(moves, players, roll)
+            else:
+                move = agent.choose(moves, players, seat, roll, batched, last_roll)
+            if log is not None:
+                log.record(seat, roll, move, player.pawns[move[2]])
+            board.apply_move(move)
+            win, _ = board.check_winner(move)
+            if win:
+                return seat
+            kill = move[1]
+        elif log is not None:
+            log.record(seat, roll)
+        last_roll = roll
+        if not (extra_turns and (kill or roll in EXTRA_TURN_ROLLS)):
+            seat = (seat + 1) % NUM_SEATS
+    return None
+
+
+def _searches(participants, dice, extra_turns, time_budget, simulations, seed):
+    """
+    Create the searches of the search strategies among the participants, by strategy.
+    """
+    searches = {}
+    if "expectimax" in participants:
+        from expectimax import ExpectimaxSearch
+        searches["expectimax"] = ExpectimaxSearch(dice, extra_turns=extra_turns, time_budget=time_budget)
+    if "mcts" in participants:
+        from mcts import MCTSSearch
+        searches["mcts"] = MCTSSearch(dice, extra_turns=extra_turns, simulations=simulations,
+                                      time_budget=None if simulations else time_budget, seed=seed)
+    return searches
+
+
+def play_chunk(participants, lineups, seed, dice="d6", extra_turns=False, time_budget=0.05, simulations=None,
+               concurrency=1, max_wait=0.002, record=None, roll_first=False):
+    """
+    Play every lineup in all four seat rotations. Runs in a worker process.
+
+    Parameters:
+    - participants (list of str): Participant specs.
+    - lineups (list of tuple): Participant indices of each lineup, one per seat.
+    - seed (int): Seed for the dice and the random strategy.
+    - time_budget (float): Seconds per move for "expectimax" and "mcts" players.
+    - simulations (int): Rollouts per move for "mcts" players, instead of the time budget.
+    - concurrency (int): Games played at once in threads, so that checkpoints batch their forward passes.
+      Each game then rolls its own seeded dice, so results stay reproducible except for the mcts player's
+      sampling, which depends on which thread plays which game.
+    - max_wait (float): Seconds a checkpoint waits for more positions to fill a batch when concurrency > 1.
+    - record (str): Directory to record the games to, one chunk file per call (see game_records.py).
+    - roll_first (bool): The checkpoints were trained with roll_first (see CheckpointAgent).
+
+    Returns:
+    - dict with "games", "draws", "seat_wins" (wins per seat) and "results", a list of
+      [sorted lineup, games, draws, wins of every participant] entries.
+    """
+    games = [lineup[rotation:] + lineup[:rotation] for lineup in lineups for rotation in range(NUM_SEATS)]
+    recorder = None
+    if record:
+        from game_records import GameLog, GameRecorder
+        recorder = GameRecorder(record, games_per_chunk=len(games), prefix=f"tournament-{seed:016x}")
+
+    def play(seats, game_dice, rng, searches, batched=False):
+        log = GameLog(extra_turns, max_roll=game_dice.max_roll) if recorder else None
+        winner = play_game([participants[i] for i in seats], game_dice, rng, extra_turns, searches, batched, log,
+                           roll_first)
+        if log is not None:
+            recorder.add(log, winner)
+        return winner
+
+    if concurrency <= 1:
+        game_dice = Dice(dice, rng=seed)
+        rng = random.Random(seed)
+        searches = _searches(participants, game_dice, extra_turns, time_budget, simulations, seed)
+        winners = [play(seats, game_dice, rng, searches) for seats in games]
+    else:
+        for spec in participants:
+            if spec not in STRATEGIES:
+                policy = _agent(spec, Dice(dice).max_roll, roll_first).policy
+                policy.max_batch_size = concurrency  # No more positions than games can be pending
+                policy.max_wait = max_wait
+        winners = [None] * len(games)
+        next_game = iter(range(len(games)))
+        lock = threading.Lock()
+
+        def play_games(thread):
+            searches = _searches(participants, Dice(dice), extra_turns, time_budget, simulations, seed + thread)
+            while True:
+                with lock:
+                    index = next(next_game, None)
+                if index is None:
+                    return
+                game_dice = Dice(dice, rng=[seed, index])
+                rng = random.Random(int(game_dice.rng.integers(2 ** 63)))
+                winners[index] = play(games[index], game_dice, rng, searches, batched=True)
+
+        with ThreadPoolExecutor(concurrency) as threads:
+            for future in [threads.submit(play_games, thread) for thread in range(concurrency)]:
+                future.result()
+    if recorder is not None:
+        recorder.close()
+
+    results = {}
+    seat_wins = [0] * NUM_SEATS
+    draws = 0
+    for seats, winner in zip(games, winners):
+        key = tuple(sorted(seats))
+        entry = results.setdefault(key, [0, 0, [0] * len(participants)])
+        entry[0] += 1
+        if winner is None:
+            entry[1] += 1
+            draws += 1
+        else:
+            entry[2][seats[winner]] += 1
+            seat_wins[winner] += 1
+    return {
+        "games": len(lineups) * NUM_SEATS,
+        "draws": draws,
+        "seat_wins": seat_wins,
+        "results": [[list(key), games, lineup_draws, wins] for key, (games, lineup_draws, wins) in results.items()],
+    }
+
+
+def wilson_interval(wins, n, z=Z):
+    """
+    Wilson score confidence interval of a win rate.
+
+    Returns:
+    - (low, high) bounds, or (0, 1) when n is 0.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    rate = wins / n
+    centre = (rate + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return centre - half, centre + half
+
+
+def luce_ratings(results, num_participants, iterations=500):
+    """
+    Rate participants by fitting a Luce choice model to the game winners: a participant holding `c` of the seats
+    in a game wins it with probability c * strength / (sum of the strengths of all seats).
+
+    The strengths are fitted with the minorization-maximization algorithm, with one virtual win and one virtual
+    loss against a reference of strength 1 per participant so that winless participants keep a finite rating.
+
+    Parameters:
+    - results (dict): Sorted lineup -> [games, draws, wins per participant], as merged from play_chunk.
+    - num_participants (int): Number of participants.
+
+    Returns:
+    - (ratings, half_widths): Elo-scale ratings averaging 1500, and the half-widths of their 95% intervals.
+    """
+    lineups = []
+    wins = np.ones(num_participants)  # Virtual win against the reference
+    for key, (games, draws, lineup_wins) in results.items():
+        counts = np.bincount(key, minlength=num_participants)
+        lineups.append((counts, games - draws))
+        wins += lineup_wins
+
+    strength = np.ones(num_participants)
+    for _ in range(iterations):
+        expected = 2 / (strength + 1)  # The virtual games against the reference
+        for counts, decided in lineups:
+            expected += decided * counts / (counts @ strength)
+        updated = wins / expected
+        converged = np.max(np.abs(np.log(updated / strength))) < 1e-10
+        strength = updated
+        if converged:
+            break
+
+    # Observed information of the log-strengths, ignoring the off-diagonal terms
+    reference = strength / (strength + 1)
+    information = 2 * reference * (1 - reference)
+    for counts, decided in lineups:
+        share = counts * strength / (counts @ strength)
+        information += decided * share * (1 - share)
+    log_strength = np.log(strength)
+    ratings = 1500 + ELO_SCALE * (log_strength - log_strength.mean())
+    return ratings, Z * ELO_SCALE / np.sqrt(information)
+
+
+class Standings:
+    """
+    Running totals of a tournament, merged from the results of play_chunk.
+    """
+
+    def __init__(self, participants):
+        self.participants = participants
+        self.games = 0
+        self.draws = 0
+        self.seat_wins = np.zeros(NUM_SEATS, dtype=np.int64)
+        self.results = {}  # Sorted lineup -> [games, draws, wins per participant]
+
+    def merge(self, chunk):
+        """
+        Add the results of one play_chunk call.
+        """
+        self.games += chunk["games"]
+        self.draws += chunk["draws"]
+        self.seat_wins += chunk["seat_wins"]
+        for key, games, draws, wins in chunk["results"]:
+            entry = self.results.setdefault(tuple(key), [0, 0, np.zeros(len(self.participants), dtype=np.int64)])
+            entry[0] += games
+            entry[1] += draws
+            entry[2] += wins
+
+    def table(self):
+        """
+        Compute each participant's seats played, wins, win rate interval, rating and rating interval half-width.
+        """
+        seats = np.zeros(len(self.participants), dtype=np.int64)
+        wins = np.zeros(len(self.participants), dtype=np.int64)
+        for key, (games, _, lineup_wins) in self.results.items():
+            seats += games * np.bincount(key, minlength=len(self.participants))
+            wins += lineup_wins
+        ratings, half_widths = luce_ratings(self.results, len(self.participants))
+        return [(name, seats[i], wins[i], wilson_interval(wins[i], seats[i]), ratings[i], half_widths[i])
+                for i, name in enumerate(self.participants)]
+
+    def report(self, elapsed):
+        """
+        Print the standings.
+        """
+        rows = sorted(self.table(), key=lambda row: -row[4])
+        print(f"\n{self.games} games ({self.draws} draws) in {elapsed:.0f}s, {self.games / elapsed:.0f} games/s")
+        print(f"{'participant':>30} {'seats':>10} {'win rate':>8} {'95% CI':>17} {'rating':>16}")
+        for name, seats, wins, (low, high), rating, half_width in rows:
+            rate = wins / seats if seats else 0.0
+            print(f"{name:>30} {seats:>10} {rate:>8.3f} [{low:.3f}, {high:.3f}] {rating:>8.0f} ± {half_width:<5.0f}")
+        decided = self.games - self.draws
+        if decided:
+            print("win rate by seat: " + "  ".join(f"{seat}: {wins / decided:.3f}"
+                                                   for seat, wins in enumerate(self.seat_wins)))
+
+
+def run_tournament(participants, games=100000, workers=None, chunk=250, tolerance=10.0, min_games=10000,
+                   results_path=None, seed=0, dice="d6", extra_turns=False, time_budget=0.05, simulations=None,
+                   concurrency=1, max_wait=0.002, report_every=10.0, start_method=None, record=None,
+                   roll_first=False):
+    """
+    Play a tournament in a process pool until `games` games are played or the ratings have converged.
+
+    Parameters:
+    - participants (list of str): Strategies ("random", "aggressive", "defensive", "expectimax", "mcts") and
+      checkpoints ("ppo:<path>", "dqn:<path>", "maskable:<path>", "numpy:<path>"). The same spec can't be listed twice.
+    - games (int): Maximum number of games.
+    - workers (int): Number of worker processes; defaults to the number of CPUs.
+    - chunk (int): Lineups per worker task; each is played in all four seat rotations.
+    - tolerance (float): Stop once every rating's 95% interval is narrower than ± this many Elo points.
+    - min_games (int): Number of games to play before stopping early.
+    - results_path (str): JSON lines file receiving every finished chunk as it comes in.
+    - seed (int): Seed for the lineups and for every chunk's dice.
+    - dice (str): Dice distribution, one of dice.DICE.
+    - extra_turns (bool): Give a player another turn after rolling a 4 or 8 or capturing a pawn.
+    - time_budget (float): Seconds per move for "expectimax" and "mcts" players.
+    - simulations (int): Rollouts per move for "mcts" players, instead of the time budget.
+    - concurrency (int): Games each worker plays at once in threads, batching the checkpoints' forward passes.
+    - max_wait (float): Seconds a checkpoint waits for more positions to fill a batch.
+    - report_every (float): Seconds between progress reports.
+    - start_method (str): multiprocessing start method; defaults to "fork" where available, else "spawn".
+    - record (str): Directory to record every game to (see game_records.py).
+    - roll_first (bool): The checkpoints were trained with roll_first, seeing the roll they move with.
+
+    Returns:
+    - Standings with the merged results.
+    """
+    if len(set(participants)) != len(participants):
+        raise ValueError(f"Participants must be unique, got {participants}")
+    workers = workers or os.cpu_count()
+    if start_method is None:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+    rng = np.random.default_rng(seed)
+    standings = Standings(participants)
+    results_file = open(results_path, "a") if results_path else None
+    if results_file:
+        results_file.write(json.dumps({"participants": participants, "seed": seed, "dice": dice,
+                                       "extra_turns": extra_turns, "roll_first": roll_first}) + "\n")
+
+    start = last_report = time.perf_counter()
+    submitted = 0
+    pending = set()
+    try:
+        with ProcessPoolExecutor(workers, mp_context=mp.get_context(start_method)) as pool:
+            while True:
+                # Keep two chunks per worker in flight, so that an early stop wastes little work
+                while len(pending) < 2 * workers and submitted < games:
+                    count = min(chunk, math.ceil((games - submitted) / NUM_SEATS))
+                    lineups = [tuple(int(i) for i in rng.choice(len(participants), size=NUM_SEATS,
+                                                                 replace=len(participants) < NUM_SEATS))
+                               for _ in range(count)]
+                    chunk_seed = int(rng.integers(2 ** 63))
+                    pending.add(pool.submit(play_chunk, participants, lineups, chunk_seed, dice, extra_turns,
+                                             time_budget, simulations, concurrency, max_wait, record, roll_first))
+                    submitted += count * NUM_SEATS
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    standings.merge(result)
+                    if results_file:
+                        results_file.write(json.dumps(result) + "\n")
+                        results_file.flush()
+
+                now = time.perf_counter()
+                if now - last_report >= report_every:
+                    standings.report(now - start)
+                    last_report = now
+                if standings.games >= min_games and max(row[5] for row in standings.table()) < tolerance:
+                    print(f"\nRatings converged to within ±{tolerance} Elo, stopping early")
+                    for future in pending:
+                        future.cancel()
+                    break
+    finally:
+        if results_file:
+            results_file.close()
+
+    standings.report(time.perf_counter() - start)
+    return standings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Ashta Chamma tournament with ratings")
+    parser.add_argument("participants", nargs="+",
+                        help="Strategies (random, aggressive, defensive, expectimax, mcts) and checkpoints "
+                             "(ppo:PATH, dqn:PATH, maskable:PATH, numpy:PATH)")
+    parser.add_argument("--games", type=int, default=1000000, help="Maximum number of games to play")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--chunk", type=int, default=250, help="Lineups per worker task, each played 4 times")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="Stop once all 95%% rating intervals are within ± this many Elo points")
+    parser.add_argument("--min-games", type=int, default=10000, help="Games to play before stopping early")
+    parser.add_argument("--results", default=None, help="Append every finished chunk to this JSON lines file")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the lineups and the dice")
+    parser.add_argument("--dice", choices=DICE, default="d6", help="Dice outcome distribution")
+    parser.add_argument("--extra-turns", action="store_true",
+                        help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+    parser.add_argument("--time-budget", type=float, default=0.05,
+                        help="Seconds per move for expectimax and mcts players")
+    parser.add_argument("--simulations", type=int, default=None,
+                        help="Rollouts per move for mcts players, instead of the time budget")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Games each worker plays at once, batching the checkpoints' forward passes")
+    parser.add_argument("--max-wait", type=float, default=0.002,
+                        help="Seconds a checkpoint waits for more positions to fill a batch")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--record", default=None, help="Record every game to chunk files in this directory")
+    parser.add_argument("--roll-first", action="store_true",
+                        help="The checkpoints were trained with --roll-first: show them the roll they move with")
+    args = parser.parse_args()
+
+    for spec in args.participants:
+        if spec not in STRATEGIES and ":" not in spec:
+            parser.error(f"Unknown participant {spec!r}: expected one of {STRATEGIES} or <algorithm>:<path>")
+    run_tournament(args.participants, games=args.games, workers=args.workers, chunk=args.chunk,
+                   tolerance=args.tolerance, min_games=args.min_games, results_path=args.results, seed=args.seed,
+                   dice=args.dice, extra_turns=args.extra_turns, time_budget=args.time_budget,
+                   simulations=args.simulations, concurrency=args.concurrency, max_wait=args.max_wait,
+                   report_every=args.report_every, record=args.record, roll_first=args.roll_first)
+
+
+if __name__ == "__main__":
+    main()
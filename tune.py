@@ -0,0 +1,334 @@
+"""
+Hyperparameter search for the PPO, MaskablePPO and DQN agents, with Optuna.
+
+Each trial trains a model with sampled hyperparameters on its own AshtachammaVecEnv, and every --eval-every
+timesteps plays it against the heuristic strategies (see evaluate.evaluate_policy) and reports the win rate to
+Optuna. The median pruner stops trials whose win rate falls below the median of the earlier trials at the same
+timestep. Trials run in parallel worker processes, one trial per process at a time, sharing a study stored in a
+local SQLite file, so a search can be stopped and resumed, and rerun under a new --study-name after the rules or the
+reward change: resuming a study with another algorithm or other environment options is refused.
+
+Usage:
+    python tune.py ppo|maskable|dqn [--trials N] [--workers N] [--timesteps N] [--eval-every N]
+        [--eval-episodes N] [--prune-after N] [--num-envs N] [--storage URL] [--study-name NAME] [--seed N]
+        [--timeout SECONDS] [--obs-format FORMAT] [--roll-first] [--fast-forward] [--extra-turns]
+        [--dice d6|cowries|shells]
+
+Requires optuna (pip install optuna). The best hyperparameters found so far are printed at the end, ready to paste
+into ashtachamma_ppo.py or ashtachamma_dqn.py; `optuna-dashboard sqlite:///tuning.db` shows every trial.
+"""
+import argparse
+import math
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import optuna
+
+from ashtachamma_obs import OBS_FORMATS
+from dice import DICE
+
+ALGORITHMS = ("ppo", "maskable", "dqn")
+SQLITE_TIMEOUT = 60  # Seconds a worker waits for another one's write to the SQLite file before failing
+
+
+def sample_ppo_params(trial, num_envs):
+    """
+    Sample PPO (or MaskablePPO) hyperparameters, in the ranges the hard-coded ones of ashtachamma_ppo.py came from.
+
+    Parameters:
+    - trial (optuna.Trial): Trial to sample from.
+    - num_envs (int): Games played at once, which n_steps is divided by.
+
+    Returns:
+    - dict of keyword arguments of the model.
+    """
+    rollout = trial.suggest_categorical("rollout_steps", [2048, 4096, 6144, 8192])  # Steps per update, all envs
+    return dict(
+        learning_rate=trial.suggest_float("learning_rate", 1e-6, 1e-3, log=True),
+        n_steps=max(rollout // num_envs, 1),
+        batch_size=trial.suggest_categorical("batch_size", [64, 128, 256, 512]),
+        n_epochs=trial.suggest_categorical("n_epochs", [3, 5, 10, 20]),
+        gamma=trial.suggest_categorical("gamma", [0.9, 0.95, 0.96, 0.98, 0.99, 0.995]),
+        gae_lambda=trial.suggest_float("gae_lambda", 0.8, 1.0, step=0.05),
+        clip_range=trial.suggest_float("clip_range", 0.1, 0.4, step=0.05),
+        ent_coef=trial.suggest_float("ent_coef", 1e-8, 0.1, log=True),
+    )
+
+
+def sample_dqn_params(trial, num_envs):
+    """
+    Sample DQN hyperparameters, in the ranges the hard-coded ones of ashtachamma_dqn.py came from.
+
+    Parameters:
+    - trial (optuna.Trial): Trial to sample from.
+    - num_envs (int): Games played at once (unused, the DQN options count timesteps of all envs).
+
+    Returns:
+    - dict of keyword arguments of the model.
+    """
+    return dict(
+        learning_rate=trial.suggest_float("learning_rate", 1e-6, 1e-3, log=True),
+        buffer_size=trial.suggest_categorical("buffer_size", [100000, 300000, 1000000]),
+        learning_starts=trial.suggest_categorical("learning_starts", [1000, 10000, 50000]),
+        batch_size=trial.suggest_categorical("batch_size", [64, 128, 256, 512]),
+        gamma=trial.suggest_categorical("gamma", [0.9, 0.95, 0.96, 0.98, 0.99, 0.995]),
+        train_freq=trial.suggest_categorical("train_freq", [1, 4, 8, 16]),
+        target_update_interval=trial.suggest_categorical("target_update_interval", [1000, 5000, 10000, 20000]),
+        exploration_fraction=trial.suggest_float("exploration_fraction", 0.0, 0.5),
+        exploration_final_eps=trial.suggest_float("exploration_final_eps", 0.0, 0.2),
+    )
+
+
+SAMPLERS = {"ppo": sample_ppo_params, "maskable": sample_ppo_params, "dqn": sample_dqn_params}
+
+
+def model_class(algorithm):
+    """
+    Stable-Baselines3 (or sb3-contrib) class of an algorithm name.
+    """
+    if algorithm == "maskable":
+        from sb3_contrib import MaskablePPO
+        return MaskablePPO
+    from stable_baselines3 import DQN, PPO
+    return {"ppo": PPO, "dqn": DQN}[algorithm]
+
+
+def objective(trial, algorithm, timesteps=500000, eval_every=100000, eval_episodes=512, num_envs=64, seed=0,
+              env_kwargs=None):
+    """
+    Train one trial's model, reporting its win rate every eval_every timesteps.
+
+    Parameters:
+    - trial (optuna.Trial): Trial whose hyperparameters are sampled and whose progress is reported.
+    - algorithm (str): "ppo", "maskable" or "dqn".
+    - timesteps (int): Training timesteps of a trial that isn't pruned.
+    - eval_every (int): Timesteps between two evaluations.
+    - eval_episodes (int): Games of each evaluation.
+    - num_envs (int): Games played at once during training.
+    - seed (int): Seed of the evaluations, the same for every trial so that all of them play the same dice; training
+      is seeded with seed + the trial number.
+    - env_kwargs (dict): Environment options (obs_format, roll_first, fast_forward, extra_turns, dice).
+
+    Returns:
+    - float: Win rate at the end of training.
+    """
+    from stable_baselines3.common.callbacks import BaseCallback
+
+    from ashtachamma_vec_env import AshtachammaVecEnv
+    from evaluate import evaluate_policy
+
+    env_kwargs = dict(env_kwargs or {})
+    eval_kwargs = {name: env_kwargs[name] for name in ("roll_first", "fast_forward", "extra_turns", "dice")
+                   if name in env_kwargs}
+
+    class TrialEvalCallback(BaseCallback):
+        """
+        Report the win rate to the trial every eval_every timesteps, and stop training once the trial is pruned.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.next_eval = eval_every
+            self.evaluated_at = None  # Timesteps of the latest evaluation
+            self.win_rate = None
+            self.pruned = False
+
+        def evaluate(self, prune=True):
+            self.win_rate = evaluate_policy(self.model, episodes=eval_episodes, num_envs=min(64, eval_episodes),
+                                            min_episodes=eval_episodes, seed=seed, **eval_kwargs)["win_rate"]
+            self.evaluated_at = self.model.num_timesteps
+            trial.report(self.win_rate, self.evaluated_at)
+            self.pruned = prune and trial.should_prune()
+
+        def _on_step(self):
+            if self.num_timesteps < self.next_eval:
+                return True
+            self.next_eval += eval_every
+            self.evaluate()
+            return not self.pruned  # False stops learn()
+
+    params = SAMPLERS[algorithm](trial, num_envs)
+    env = AshtachammaVecEnv(num_envs=num_envs, seed=seed + trial.number, **env_kwargs)
+    callback = TrialEvalCallback()
+    try:
+        model = model_class(algorithm)("MlpPolicy", env, seed=seed + trial.number, verbose=0, **params)
+        model.learn(total_timesteps=timesteps, callback=callback)
+        if not callback.pruned and callback.evaluated_at != model.num_timesteps:
+            callback.evaluate(prune=False)  # The last timesteps weren't evaluated yet; the trial is complete anyway
+    finally:
+        env.close()
+    if callback.pruned:
+        raise optuna.TrialPruned()
+    return callback.win_rate
+
+
+def create_study(study_name, storage, algorithm, seed=0, prune_after=100000, env_kwargs=None):
+    """
+    Create the study in the storage, or load it if it exists, in which case it must have been created for the same
+    algorithm and environment options; a ValueError is raised otherwise, as its trials couldn't be compared.
+
+    Parameters:
+    - study_name (str): Name of the study in the storage.
+    - storage (str): SQLAlchemy URL of the storage, e.g. "sqlite:///tuning.db".
+    - algorithm (str): Algorithm being tuned, recorded with the study.
+    - seed (int): Seed of the sampler.
+    - prune_after (int): Timesteps a trial trains before it can be pruned.
+    - env_kwargs (dict): Environment options, recorded with the study.
+
+    Returns:
+    - optuna.Study
+    """
+    if storage.startswith("sqlite"):
+        # Several workers write to the same file: wait for the lock rather than failing at once
+        storage = optuna.storages.RDBStorage(storage, engine_kwargs={"connect_args": {"timeout": SQLITE_TIMEOUT}})
+    study = optuna.create_study(
+        study_name=study_name, storage=storage, load_if_exists=True, direction="maximize",
+        sampler=optuna.samplers.TPESampler(seed=seed, constant_liar=True),  # Spreads out trials running at once
+        pruner=optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=prune_after))
+    attrs = {"algorithm": algorithm, **(env_kwargs or {})}
+    stored = study.user_attrs
+    if stored:
+        mismatches = [f"{name}={stored.get(name)!r} (requested {attrs.get(name)!r})"
+                      for name in sorted(set(stored) | set(attrs)) if stored.get(name) != attrs.get(name)]
+        if mismatches:
+            raise ValueError(f"Study {study_name!r} was created with " + ", ".join(mismatches)
+                             + "; rerun under a new --study-name")
+        return study
+    for name, value in attrs.items():
+        study.set_user_attr(name, value)
+    return study
+
+
+def run_worker(worker, study_name, storage, algorithm, trials, timeout=None, seed=0, prune_after=100000,
+               threads=1, **kwargs):
+    """
+    Run trials of a study until it has `trials` trials (counting those of every worker) or timeout expires.
+
+    Parameters:
+    - worker (int): Index of the worker, which offsets the sampler's seed.
+    - study_name, storage, algorithm, seed, prune_after: See create_study().
+    - trials (int): Trials of the whole study, including those of earlier runs.
+    - timeout (float): Seconds after which no new trial is started.
+    - threads (int): Threads used by torch in this process.
+    - kwargs: Options of objective().
+
+    Returns:
+    - int: Number of trials this worker ran.
+    """
+    import torch
+    torch.set_num_threads(threads)  # One core per worker rather than every worker using all of them
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = create_study(study_name, storage, algorithm, seed=seed + worker, prune_after=prune_after,
+                         env_kwargs=kwargs.get("env_kwargs"))
+    count = len(study.trials)
+    stop = optuna.study.MaxTrialsCallback(trials, states=None)  # Trials still running in other workers count too
+    study.optimize(lambda trial: objective(trial, algorithm, seed=seed, **kwargs), n_trials=trials,
+                   timeout=timeout, callbacks=[stop], gc_after_trial=True)
+    return len([trial for trial in study.trials if trial.number >= count])
+
+
+def run_search(study_name, storage, algorithm, trials=50, workers=1, start_method=None, **kwargs):
+    """
+    Run a search in worker processes.
+
+    Parameters:
+    - study_name, storage, algorithm, trials: See run_worker().
+    - workers (int): Worker processes, each running one trial at a time; 1 runs the trials in this process.
+    - start_method (str): multiprocessing start method; defaults to "fork" where available, else "spawn".
+    - kwargs: Options of run_worker() and objective().
+
+    Returns:
+    - optuna.Study
+    """
+    # Create the tables before the workers race to do it
+    study = create_study(study_name, storage, algorithm, seed=kwargs.get("seed", 0),
+                         prune_after=kwargs.get("prune_after", 100000), env_kwargs=kwargs.get("env_kwargs"))
+    if workers <= 1:
+        run_worker(0, study_name, storage, algorithm, trials, **kwargs)
+        return study
+    if start_method is None:
+        start_method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context(start_method)) as pool:
+        futures = [pool.submit(run_worker, worker, study_name, storage, algorithm, trials, **kwargs)
+                   for worker in range(workers)]
+        for future in futures:
+            future.result()  # Raise a worker's exception here
+    return study
+
+
+def format_params(params):
+    """
+    Format a trial's hyperparameters as keyword arguments of the model, as written in the training scripts.
+    """
+    lines = []
+    for name, value in params.items():
+        if name == "rollout_steps":
+            lines.append(f"n_steps=max({value} // train_env.num_envs, 1)")
+        else:
+            lines.append(f"{name}={value!r}")
+    return ",\n".join("    " + line for line in lines)
+
+
+def report(study):
+    """
+    Print the study's trial counts and its best trial.
+    """
+    states = [trial.state for trial in study.trials]
+    counts = {state.name.lower(): states.count(state) for state in optuna.trial.TrialState if states.count(state)}
+    print("Trials: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    if not counts.get("complete"):
+        return
+    best = study.best_trial
+    duration = best.duration.total_seconds() if best.duration else math.nan
+    print(f"Best trial #{best.number}: win rate {best.value:.3f} ({duration:.0f}s)")
+    print(format_params(best.params))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the hyperparameters of the Ashta Chamma agents")
+    parser.add_argument("algorithm", choices=ALGORITHMS, help="Algorithm to tune")
+    parser.add_argument("--trials", type=int, default=50, help="Trials of the study, counting those of earlier runs")
+    parser.add_argument("--workers", type=int, default=1, help="Trials run at once in worker processes")
+    parser.add_argument("--timesteps", type=int, default=500000, help="Training timesteps of each trial")
+    parser.add_argument("--eval-every", type=int, default=100000, help="Timesteps between two evaluations of a trial")
+    parser.add_argument("--eval-episodes", type=int, default=512, help="Games of each evaluation")
+    parser.add_argument("--prune-after", type=int, default=100000,
+                        help="Timesteps a trial trains before it can be pruned")
+    parser.add_argument("--num-envs", type=int, default=64, help="Games played at once by each trial")
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads of each worker")
+    parser.add_argument("--storage", default="sqlite:///tuning.db", help="Optuna storage URL")
+    parser.add_argument("--study-name", default=None, help="Study to create or resume (default: the algorithm)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the sampler, training and evaluations")
+    parser.add_argument("--timeout", type=float, default=None, help="Start no new trial after this many seconds")
+    parser.add_argument("--obs-format", choices=OBS_FORMATS, default="padded",
+                        help="Observation layout (see ashtachamma_obs.py)")
+    parser.add_argument("--roll-first", action="store_true",
+                        help="Roll the die before the agent picks a pawn, and show the roll in the observation")
+    parser.add_argument("--fast-forward", action="store_true", help="Play the opponents' turns inside each step")
+    parser.add_argument("--extra-turns", action="store_true",
+                        help="Give a player another turn after rolling a 4 or 8 or capturing a pawn")
+    parser.add_argument("--dice", choices=DICE, default="d6", help="Dice outcome distribution")
+    args = parser.parse_args()
+    if args.roll_first:
+        args.obs_format = "features"  # The only observation format that includes the dice roll
+
+    env_kwargs = dict(obs_format=args.obs_format, roll_first=args.roll_first, fast_forward=args.fast_forward,
+                      extra_turns=args.extra_turns, dice=args.dice)
+    try:
+        create_study(args.study_name or args.algorithm, args.storage, args.algorithm, seed=args.seed,
+                     prune_after=args.prune_after, env_kwargs=env_kwargs)
+    except ValueError as error:
+        parser.error(str(error))
+    start = time.perf_counter()
+    study = run_search(args.study_name or args.algorithm, args.storage, args.algorithm, trials=args.trials,
+                       workers=args.workers, timeout=args.timeout, seed=args.seed, prune_after=args.prune_after,
+                       threads=args.threads, timesteps=args.timesteps, eval_every=args.eval_every,
+                       eval_episodes=args.eval_episodes, num_envs=args.num_envs, env_kwargs=env_kwargs)
+    print(f"Search took {time.perf_counter() - start:.0f}s")
+    report(study)
+
+
+if __name__ == "__main__":
+    main()